@@ -0,0 +1,132 @@
+import argparse
+
+import psycopg2
+from connection import conexion
+from instrumentacion import medido
+
+# Puestos que se muestran por defecto en cada ranking
+LIMITE_RANKING = 10
+
+# Los rankings se leen de las tablas ventas_por_disco, ventas_por_genero y
+# ventas_por_artista, que mantienen los triggers de crear_bbdd al insertar,
+# modificar o borrar ventas: leerlos cuesta lo que el resultado, no lo que las ventas.
+
+def _consultar_ranking(query, params, descripcion):
+    """ Ejecuta la consulta de un ranking y devuelve sus filas (lista vacía si falla). """
+    resultados = []
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            resultados = cur.fetchall()
+            cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al consultar {descripcion}: {error}")
+    return resultados
+
+@medido
+def discos_mas_vendidos(limite=LIMITE_RANKING):
+    """
+    Discos con más unidades vendidas.
+
+    Args:
+        limite (int): Número de puestos del ranking.
+
+    Returns:
+        list: Tuplas (id_disco, titulo, unidades) de más a menos vendido.
+    """
+    query = """
+        SELECT c.id_disco, d.titulo, c.unidades
+        FROM ventas_por_disco c
+        JOIN discos d ON d.id_disco = c.id_disco
+        WHERE c.unidades > 0
+        ORDER BY c.unidades DESC, c.id_disco
+        LIMIT %s;
+    """
+    return _consultar_ranking(query, (limite,), "los discos más vendidos")
+
+@medido
+def ventas_por_genero(limite=None):
+    """
+    Unidades vendidas de cada género.
+
+    Args:
+        limite (int): Número de puestos del ranking (None para todos los géneros).
+
+    Returns:
+        list: Tuplas (genero, unidades) de más a menos vendido.
+    """
+    query = """
+        SELECT genero, unidades FROM ventas_por_genero
+        WHERE unidades > 0
+        ORDER BY unidades DESC, genero
+        LIMIT %s;
+    """
+    return _consultar_ranking(query, (limite,), "las ventas por género")
+
+@medido
+def ventas_por_artista(limite=LIMITE_RANKING):
+    """
+    Artistas con más unidades vendidas (un disco con varios artistas cuenta para todos).
+
+    Args:
+        limite (int): Número de puestos del ranking.
+
+    Returns:
+        list: Tuplas (id_artista, nombre, apellido, unidades) de más a menos vendido.
+    """
+    query = """
+        SELECT c.id_artista, (a.datos_artista).nombre, (a.datos_artista).apellido, c.unidades
+        FROM ventas_por_artista c
+        JOIN artistas a ON a.id_artista = c.id_artista
+        WHERE c.unidades > 0
+        ORDER BY c.unidades DESC, c.id_artista
+        LIMIT %s;
+    """
+    return _consultar_ranking(query, (limite,), "las ventas por artista")
+
+@medido
+def reconstruir():
+    """
+    Recalcula todos los contadores desde las ventas (p. ej. tras cargar datos con
+    los triggers desactivados o si se sospecha que se han desajustado).
+
+    Returns:
+        bool: True si se reconstruyeron, False si hubo un error.
+    """
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT reconstruir_contadores_ventas();")
+            conn.commit()
+            cur.close()
+            return True
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al reconstruir los contadores de ventas: {error}")
+        return False
+
+def imprimir_rankings(limite=LIMITE_RANKING):
+    """ Muestra por pantalla los tres rankings de ventas. """
+    print("\n🏆 Discos más vendidos:")
+    for id_disco, titulo, unidades in discos_mas_vendidos(limite):
+        print(f"  {unidades:>8} | {titulo} (ID {id_disco})")
+    print("\n🎸 Ventas por género:")
+    for genero, unidades in ventas_por_genero(limite):
+        print(f"  {unidades:>8} | {genero}")
+    print("\n👤 Ventas por artista:")
+    for id_artista, nombre, apellido, unidades in ventas_por_artista(limite):
+        print(f"  {unidades:>8} | {nombre} {apellido}".rstrip() + f" (ID {id_artista})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rankings de ventas servidos desde contadores.")
+    sub = parser.add_subparsers(dest="comando")
+    p_ranking = sub.add_parser("rankings", help="Muestra los discos, géneros y artistas más vendidos.")
+    p_ranking.add_argument("--limite", type=int, default=LIMITE_RANKING)
+    sub.add_parser("reconstruir", help="Recalcula los contadores desde las ventas.")
+    args = parser.parse_args()
+
+    if args.comando == "reconstruir":
+        if reconstruir():
+            print("✅ Contadores de ventas reconstruidos.")
+    else:
+        imprimir_rankings(getattr(args, "limite", LIMITE_RANKING))
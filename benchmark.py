@@ -0,0 +1,205 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import analitica
+import carga_masiva
+import consultas
+import crear_bbdd
+import transacciones
+
+# Margen sobre el p95 de la referencia a partir del cual se considera una regresión
+UMBRAL_REGRESION = 0.20
+
+def percentil(valores, p):
+    """
+    Percentil por el método del rango más cercano.
+
+    Args:
+        valores (list): Muestras (no hace falta que estén ordenadas).
+        p (float): Percentil entre 0 y 100.
+
+    Returns:
+        float: El valor del percentil (0.0 si no hay muestras).
+    """
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    rango = max(1, -(-len(ordenados) * p // 100))
+    return ordenados[int(rango) - 1]
+
+def _resumir(latencias, segundos):
+    """ Resume las latencias (en segundos) de una operación en milisegundos y ops/s. """
+    return {
+        "repeticiones": len(latencias),
+        "p50_ms": round(percentil(latencias, 50) * 1000, 4),
+        "p95_ms": round(percentil(latencias, 95) * 1000, 4),
+        "p99_ms": round(percentil(latencias, 99) * 1000, 4),
+        "media_ms": round(sum(latencias) / len(latencias) * 1000, 4),
+        "ops_por_segundo": round(len(latencias) / segundos, 2) if segundos > 0 else 0.0,
+    }
+
+def _medir(operacion, repeticiones):
+    """ Ejecuta 'operacion(i)' para i en 0..repeticiones-1 y devuelve su resumen. """
+    latencias = []
+    # Las funciones del proyecto informan de errores por pantalla; no se mezclan con el informe
+    with contextlib.redirect_stdout(io.StringIO()):
+        inicio = time.perf_counter()
+        for i in range(repeticiones):
+            t0 = time.perf_counter()
+            operacion(i)
+            latencias.append(time.perf_counter() - t0)
+        total = time.perf_counter() - inicio
+    return _resumir(latencias, total)
+
+def _operaciones(filas, semilla):
+    """
+    Define las operaciones a medir con parámetros deterministas sacados del
+    conjunto de datos generado ('filas' = filas generadas por tabla).
+
+    Returns:
+        list: Tuplas (nombre, función(i), fracción de las repeticiones a usar).
+    """
+    rnd = random.Random(semilla)
+    n_discos, n_ventas = filas["discos"], filas["ventas"]
+    n_clientes = max(10, n_ventas // 5)
+    generos = list(carga_masiva.GENEROS)
+    clientes = [f"Cliente {rnd.randint(1, n_clientes)}" for _ in range(1000)]
+    titulos = [f"Disco {rnd.randint(1, n_discos)}" for _ in range(1000)]
+    ids_discos = [rnd.randint(1, n_discos) for _ in range(1000)]
+    ids_ventas = rnd.sample(range(1, n_ventas + 1), min(n_ventas, 1000))
+
+    def al_azar(lista):
+        return lambda i: lista[i % len(lista)]
+
+    genero, cliente, titulo = al_azar(generos), al_azar(clientes), al_azar(titulos)
+    id_disco, id_venta = al_azar(ids_discos), al_azar(ids_ventas)
+
+    return [
+        # Consultas puntuales
+        ("consulta_generos", lambda i: consultas.consulta_generos(genero(i)), 1.0),
+        ("consulta_cliente", lambda i: consultas.consulta_cliente(cliente(i)), 1.0),
+        ("consulta_colaboradores", lambda i: consultas.consulta_colaboradores(titulo(i)), 1.0),
+        ("buscar_disco_por_id", lambda i: consultas.buscar_disco_por_id(id_disco(i)), 1.0),
+        ("buscar_titulos", lambda i: consultas.buscar_titulos(titulo(i)[:-1]), 1.0),
+        ("buscar_clientes", lambda i: consultas.buscar_clientes(cliente(i)[:-1]), 1.0),
+        ("pagina_clientes", lambda i: consultas.pagina_clientes(cliente(i)), 1.0),
+        ("pagina_titulos_discos", lambda i: consultas.pagina_titulos_discos((titulo(i), 0)), 1.0),
+        ("pagina_ventas", lambda i: consultas.pagina_ventas(id_venta(i)), 1.0),
+        # Rankings servidos desde los contadores
+        ("discos_mas_vendidos", lambda i: analitica.discos_mas_vendidos(), 1.0),
+        ("ventas_por_genero", lambda i: analitica.ventas_por_genero(), 1.0),
+        ("ventas_por_artista", lambda i: analitica.ventas_por_artista(), 1.0),
+        # Listados completos: recorren tablas enteras, se repiten menos
+        ("obtener_lista_generos", lambda i: consultas.obtener_lista_generos(), 0.05),
+        ("obtener_lista_clientes", lambda i: consultas.obtener_lista_clientes(), 0.05),
+        ("obtener_lista_titulos_discos", lambda i: consultas.obtener_lista_titulos_discos(), 0.05),
+        ("listar_todos_artistas", lambda i: consultas.listar_todos_artistas(), 0.05),
+        ("listar_todos_discos", lambda i: consultas.listar_todos_discos(), 0.05),
+        ("listar_todas_ventas", lambda i: consultas.listar_todas_ventas(), 0.02),
+        # Transacciones (modifican los datos: van al final)
+        ("insertar_artista_y_disco", lambda i: transacciones.insertar_artista_y_disco(
+            f"Bench {i}", "", "Española", f"Bench {i}", 2026, [genero(i)]), 1.0),
+        ("insertar_artistas_y_discos_x100", lambda i: transacciones.insertar_artistas_y_discos(
+            [(f"Lote {i}-{j}", "", "Española", f"Lote {i}-{j}", 2026, [genero(j)]) for j in range(100)]), 0.1),
+        ("actualizar_discos_venta", lambda i: transacciones.actualizar_discos_venta(
+            id_venta(i), [id_disco(i), id_disco(i + 1)]), 1.0),
+        ("eliminar_venta", lambda i: transacciones.eliminar_venta(id_venta(i)), 1.0),
+    ]
+
+def ejecutar_benchmark(tamanos, repeticiones=200, semilla=42):
+    """
+    Carga un conjunto de datos sintético por cada tamaño y mide todas las operaciones.
+
+    Args:
+        tamanos (list): Números de ventas de cada conjunto (p. ej. [10_000, 100_000]).
+        repeticiones (int): Repeticiones de las operaciones puntuales.
+        semilla (int): Semilla del generador de datos y parámetros.
+
+    Returns:
+        dict: Informe con metadatos y los resúmenes por tamaño y operación.
+    """
+    informe = {
+        "commit": _commit_actual(),
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "repeticiones": repeticiones,
+        "semilla": semilla,
+        "resultados": {},
+    }
+    for n_ventas in tamanos:
+        with tempfile.TemporaryDirectory() as directorio:
+            print(f"\n📦 Preparando {n_ventas} ventas...")
+            filas = carga_masiva.generar_dataset(directorio, n_ventas, semilla)
+            crear_bbdd.crear_estructura(con_datos=False)
+            carga_masiva.cargar_directorio(directorio)
+
+        resultados = informe["resultados"][str(n_ventas)] = {}
+        for nombre, operacion, fraccion in _operaciones(filas, semilla):
+            n = max(3, int(repeticiones * fraccion))
+            resultados[nombre] = resumen = _medir(operacion, n)
+            print(f"  {nombre:<34} p50 {resumen['p50_ms']:>9.3f} ms | p95 {resumen['p95_ms']:>9.3f} ms"
+                  f" | p99 {resumen['p99_ms']:>9.3f} ms | {resumen['ops_por_segundo']:>10.1f} ops/s")
+    return informe
+
+def comparar(actual, referencia, umbral=UMBRAL_REGRESION):
+    """
+    Compara dos informes y devuelve las operaciones cuyo p95 ha empeorado más que 'umbral'.
+
+    Args:
+        actual (dict): Informe de esta ejecución.
+        referencia (dict): Informe anterior con el que comparar.
+        umbral (float): Empeoramiento relativo tolerado (0.20 = 20 %).
+
+    Returns:
+        list: Tuplas (tamaño, operación, p95 referencia, p95 actual).
+    """
+    regresiones = []
+    for tamano, operaciones in actual["resultados"].items():
+        base = referencia.get("resultados", {}).get(tamano, {})
+        for nombre, resumen in operaciones.items():
+            anterior = base.get(nombre)
+            if anterior and resumen["p95_ms"] > anterior["p95_ms"] * (1 + umbral):
+                regresiones.append((tamano, nombre, anterior["p95_ms"], resumen["p95_ms"]))
+    return regresiones
+
+def _commit_actual():
+    try:
+        salida = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True)
+        return salida.stdout.strip() or None
+    except OSError:
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de consultas y transacciones a distintas escalas.")
+    parser.add_argument("--ventas", type=int, nargs="+", default=[10_000, 100_000],
+                        help="Tamaños del conjunto de datos (número de ventas).")
+    parser.add_argument("--repeticiones", type=int, default=200)
+    parser.add_argument("--semilla", type=int, default=42)
+    parser.add_argument("--salida", default="resultados_benchmark.json", help="Fichero JSON del informe.")
+    parser.add_argument("--comparar", help="Informe JSON de referencia para detectar regresiones.")
+    parser.add_argument("--umbral", type=float, default=UMBRAL_REGRESION)
+    args = parser.parse_args()
+
+    informe = ejecutar_benchmark(args.ventas, args.repeticiones, args.semilla)
+    with open(args.salida, "w", encoding="utf-8") as fichero:
+        json.dump(informe, fichero, indent=2)
+    print(f"\n💾 Informe guardado en {args.salida}")
+
+    # La base de datos queda con los datos sintéticos: se restauran los iniciales
+    crear_bbdd.crear_estructura()
+
+    if args.comparar:
+        with open(args.comparar, encoding="utf-8") as fichero:
+            regresiones = comparar(informe, json.load(fichero), args.umbral)
+        for tamano, nombre, antes, ahora in regresiones:
+            print(f"❌ Regresión en {nombre} ({tamano} ventas): p95 {antes:.3f} ms -> {ahora:.3f} ms")
+        if regresiones:
+            sys.exit(1)
+        print("✅ Sin regresiones respecto a la referencia.")
@@ -0,0 +1,216 @@
+import functools
+import select
+import threading
+import time
+from collections import OrderedDict
+
+import psycopg2
+import consultas
+import transacciones
+from connection import get_connection
+
+# Canal por el que los triggers de crear_bbdd avisan de cambios (payload = nombre de la tabla)
+CANAL_CAMBIOS = "bdor_cambios"
+
+# Configuración por defecto de la caché
+MAX_ENTRADAS = 256
+TTL_SEGUNDOS = 300
+
+class CacheTTL:
+    """
+    Caché en memoria con caducidad (TTL), tamaño máximo y expulsión LRU.
+
+    Cada entrada recuerda de qué tablas depende, para poder invalidar solo
+    las afectadas cuando cambia una tabla concreta.
+    """
+
+    def __init__(self, max_entradas=MAX_ENTRADAS, ttl=TTL_SEGUNDOS):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self._entradas = OrderedDict()
+        # Generación de cada tabla (y de toda la caché): sube con cada invalidación
+        self._generaciones = {}
+        self._generacion_global = 0
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+        self.expulsiones = 0
+        self.invalidaciones = 0
+
+    def obtener(self, clave, tablas, calcular):
+        """
+        Devuelve el valor guardado para 'clave' o lo calcula y lo guarda.
+
+        Args:
+            clave (tuple): Identificador de la entrada.
+            tablas (tuple): Tablas de las que depende el valor.
+            calcular (callable): Función que obtiene el valor si no está en caché.
+
+        Returns:
+            object: El valor de la caché o el recién calculado.
+        """
+        ahora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] > ahora:
+                self._entradas.move_to_end(clave)
+                self.aciertos += 1
+                return entrada[2]
+            self.fallos += 1
+            generacion = self._generacion(tablas)
+
+        valor = calcular()
+        # Las funciones de consultas devuelven [] también cuando fallan: no se guarda
+        if valor:
+            with self._lock:
+                # Si se invalidó alguna de sus tablas mientras se calculaba, el valor
+                # puede ser anterior al cambio: se devuelve pero no se guarda
+                if self._generacion(tablas) != generacion:
+                    return valor
+                self._entradas[clave] = (ahora + self.ttl, frozenset(tablas), valor)
+                self._entradas.move_to_end(clave)
+                while len(self._entradas) > self.max_entradas:
+                    self._entradas.popitem(last=False)
+                    self.expulsiones += 1
+        return valor
+
+    def _generacion(self, tablas):
+        return (self._generacion_global,) + tuple(self._generaciones.get(t, 0) for t in tablas)
+
+    def invalidar(self, tabla=None):
+        """
+        Elimina las entradas que dependen de 'tabla' (o todas si no se indica).
+
+        Args:
+            tabla (str): Nombre de la tabla que ha cambiado.
+        """
+        with self._lock:
+            if tabla is None:
+                self._generacion_global += 1
+                claves = list(self._entradas)
+            else:
+                self._generaciones[tabla] = self._generaciones.get(tabla, 0) + 1
+                claves = [c for c, e in self._entradas.items() if tabla in e[1]]
+            for clave in claves:
+                del self._entradas[clave]
+            self.invalidaciones += len(claves)
+
+    def estadisticas(self):
+        """ Devuelve los contadores de uso de la caché. """
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "aciertos": self.aciertos,
+                "fallos": self.fallos,
+                "expulsiones": self.expulsiones,
+                "invalidaciones": self.invalidaciones,
+            }
+
+    def vaciar(self):
+        """ Elimina todas las entradas y pone los contadores a cero. """
+        with self._lock:
+            self._entradas.clear()
+            self._generacion_global += 1
+            self.aciertos = self.fallos = self.expulsiones = self.invalidaciones = 0
+
+cache = CacheTTL()
+
+def _cacheada(*tablas):
+    """ Decorador que sirve una función de consultas a través de la caché global. """
+    def decorador(funcion):
+        @functools.wraps(funcion)
+        def envoltorio(*args):
+            return cache.obtener((funcion.__name__,) + args, tablas, lambda: funcion(*args))
+        return envoltorio
+    return decorador
+
+# --- LISTADOS CACHEADOS ---
+
+obtener_lista_generos = _cacheada("discos")(consultas.obtener_lista_generos)
+obtener_lista_clientes = _cacheada("ventas")(consultas.obtener_lista_clientes)
+obtener_lista_titulos_discos = _cacheada("discos")(consultas.obtener_lista_titulos_discos)
+obtener_discos_id_y_titulo = _cacheada("discos")(consultas.obtener_discos_id_y_titulo)
+pagina_generos = _cacheada("discos")(consultas.pagina_generos)
+pagina_clientes = _cacheada("ventas")(consultas.pagina_clientes)
+pagina_titulos_discos = _cacheada("discos")(consultas.pagina_titulos_discos)
+pagina_discos_por_id = _cacheada("discos")(consultas.pagina_discos_por_id)
+pagina_ventas = _cacheada("ventas")(consultas.pagina_ventas)
+
+def estadisticas():
+    """ Devuelve los contadores de aciertos, fallos, expulsiones e invalidaciones. """
+    return cache.estadisticas()
+
+# Los commits hechos desde este mismo proceso invalidan la caché en el momento,
+# sin esperar a que llegue la notificación del trigger
+transacciones.registrar_oyente_commit(cache.invalidar)
+
+# --- ESCUCHA DE NOTIFICACIONES (LISTEN/NOTIFY) ---
+
+class EscuchaCambios(threading.Thread):
+    """
+    Hilo que escucha el canal de cambios de PostgreSQL e invalida la caché.
+
+    Recibe los avisos de cualquier proceso que modifique las tablas (los triggers
+    hacen NOTIFY al confirmar la transacción). Si la conexión se pierde, vacía la
+    caché por completo, ya que pudo perderse algún aviso, y vuelve a conectar.
+    """
+
+    def __init__(self, destino=cache, intervalo=1.0):
+        super().__init__(name="escucha-cambios", daemon=True)
+        self.destino = destino
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self.escuchando = threading.Event()
+
+    def run(self):
+        while not self._parar.is_set():
+            conn = get_connection()
+            if conn is None:
+                self._parar.wait(self.intervalo)
+                continue
+            try:
+                conn.autocommit = True
+                cur = conn.cursor()
+                cur.execute(f"LISTEN {CANAL_CAMBIOS};")
+                cur.close()
+                self.escuchando.set()
+                while not self._parar.is_set():
+                    if select.select([conn], [], [], self.intervalo) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        aviso = conn.notifies.pop(0)
+                        self.destino.invalidar(aviso.payload or None)
+            except (Exception, psycopg2.DatabaseError) as error:
+                print(f"⚠️  Escucha de cambios interrumpida: {error}")
+                self.destino.invalidar()
+            finally:
+                self.escuchando.clear()
+                conn.close()
+
+    def detener(self):
+        """ Pide al hilo que termine y espera a que lo haga. """
+        self._parar.set()
+        self.join()
+
+_escucha = None
+
+def iniciar_escucha():
+    """
+    Arranca (una sola vez) el hilo que invalida la caché con las notificaciones.
+
+    Returns:
+        EscuchaCambios: El hilo de escucha en ejecución.
+    """
+    global _escucha
+    if _escucha is None or not _escucha.is_alive():
+        _escucha = EscuchaCambios()
+        _escucha.start()
+    return _escucha
+
+def detener_escucha():
+    """ Detiene el hilo de escucha si está en marcha. """
+    global _escucha
+    if _escucha is not None:
+        _escucha.detener()
+        _escucha = None
@@ -0,0 +1,339 @@
+import argparse
+import csv
+import datetime
+import gzip
+import json
+import os
+import random
+import time
+
+import psycopg2
+import crear_bbdd
+import transacciones
+from connection import conexion
+
+# Columnas de cada fichero de entrada (CSV con cabecera o JSONL con estas claves)
+COLUMNAS = {
+    "artistas": ("id_artista", "nombre", "apellido", "nacionalidad"),
+    "discos": ("id_disco", "titulo", "anio_lanzamiento", "generos", "artistas_ids"),
+    "ventas": ("id_venta", "customer_name", "sale_date", "discos_comprados"),
+}
+
+# Columnas de las tablas que rellena el COPY
+COLUMNAS_COPY = {
+    "artistas": "id_artista, datos_artista",
+    "discos": "id_disco, titulo, anio_lanzamiento, generos, artistas_ids",
+    "ventas": "id_venta, detalles_venta",
+}
+
+# En los CSV los arrays se escriben como valores separados por este carácter
+SEPARADOR_ARRAY = "|"
+
+# Marca de NULL en los CSV (la que escribe exportar.py), también para los elementos de
+# los arrays. En las columnas que no son texto ni arrays un campo vacío también es NULL;
+# en las de texto un campo vacío es la cadena vacía.
+NULO_CSV = "\\N"
+_COLUMNAS_TEXTO = {"nombre", "apellido", "nacionalidad", "titulo", "customer_name"}
+_COLUMNAS_ARRAY = {"generos", "artistas_ids", "discos_comprados"}
+
+# Orden de carga: los discos referencian artistas y las ventas referencian discos
+TABLAS = ("artistas", "discos", "ventas")
+
+# --- FORMATO DE TEXTO DE COPY ---
+
+def _escapar_elemento(valor):
+    """ Entrecomilla un valor dentro de un literal de tipo compuesto o de array. """
+    return '"' + str(valor).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+def _literal_array(valores, entrecomillar=True):
+    """ Construye el literal de PostgreSQL para un array, p. ej. {"Rock","Pop"} o {1,NULL} (None si es NULL). """
+    if valores is None:
+        return None
+    elementos = ("NULL" if v is None or v == NULO_CSV else _escapar_elemento(v) if entrecomillar else str(int(v))
+                 for v in valores)
+    return "{" + ",".join(elementos) + "}"
+
+def _literal_compuesto(campos):
+    """ Construye el literal de un tipo compuesto, p. ej. ("Connor","Kauffman","Estadounidense"). """
+    return "(" + ",".join("" if c is None else _escapar_elemento(c) for c in campos) + ")"
+
+def _campo_copy(valor):
+    """ Escapa un valor para el formato de texto de COPY (tabuladores, saltos y barras). """
+    if valor is None:
+        return "\\N"
+    return (str(valor).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def _linea_copy(valores):
+    return "\t".join(_campo_copy(v) for v in valores) + "\n"
+
+class _FlujoCopy:
+    """
+    Adapta un generador de líneas al objeto tipo fichero que espera 'copy_expert',
+    de forma que las filas se envían a PostgreSQL sin acumularse en memoria.
+    """
+
+    def __init__(self, lineas):
+        self._lineas = lineas
+        self._pendiente = b""
+        self.filas = 0
+
+    def read(self, size=-1):
+        partes = [self._pendiente]
+        total = len(self._pendiente)
+        while size < 0 or total < size:
+            linea = next(self._lineas, None)
+            if linea is None:
+                break
+            datos = linea.encode("utf-8")
+            partes.append(datos)
+            total += len(datos)
+            self.filas += 1
+        bloque = b"".join(partes)
+        if size < 0:
+            self._pendiente = b""
+            return bloque
+        self._pendiente = bloque[size:]
+        return bloque[:size]
+
+# --- LECTURA DE FICHEROS ---
+
+def _leer_registros(ruta):
+    """ Lee un fichero CSV o JSONL (comprimido o no con gzip) fila a fila, devolviendo diccionarios. """
+    abrir = gzip.open if ruta.endswith(".gz") else open
+    with abrir(ruta, "rt", encoding="utf-8", newline="") as fichero:
+        if ruta.endswith((".jsonl", ".jsonl.gz")):
+            for linea in fichero:
+                if linea.strip():
+                    yield json.loads(linea)
+        else:
+            for fila in csv.DictReader(fichero):
+                yield fila
+
+def _campo(registro, columna):
+    """
+    Valor de una columna de un registro leído de CSV o JSONL: None si falta, si es
+    la marca NULO_CSV o si está vacío en una columna que no es de texto ni array.
+    """
+    valor = registro.get(columna)
+    if valor == NULO_CSV or (valor == "" and columna not in _COLUMNAS_TEXTO | _COLUMNAS_ARRAY):
+        return None
+    return valor
+
+def _lista(valor):
+    """ Normaliza un array leído de CSV ('a|b') o de JSON (lista) a lista de Python (None si es NULL). """
+    if valor is None or isinstance(valor, list):
+        return valor
+    if valor == "":
+        return []
+    return valor.split(SEPARADOR_ARRAY)
+
+def _lineas_tabla(tabla, registros):
+    """ Convierte los registros de un fichero en líneas COPY con los tipos compuestos y arrays montados. """
+    for registro in registros:
+        r = {columna: _campo(registro, columna) for columna in COLUMNAS[tabla]}
+        if tabla == "artistas":
+            fila = (r["id_artista"], _literal_compuesto((r["nombre"], r["apellido"], r["nacionalidad"])))
+        elif tabla == "discos":
+            fila = (r["id_disco"], r["titulo"], r["anio_lanzamiento"],
+                    _literal_array(_lista(r["generos"])),
+                    _literal_array(_lista(r["artistas_ids"]), entrecomillar=False))
+        else:
+            fila = (r["id_venta"], _literal_compuesto((
+                r["customer_name"], r["sale_date"],
+                _literal_array(_lista(r["discos_comprados"]), entrecomillar=False))))
+        yield _linea_copy(fila)
+
+def _buscar_fichero(directorio, tabla):
+    for extension in (".csv", ".jsonl", ".csv.gz", ".jsonl.gz"):
+        ruta = os.path.join(directorio, tabla + extension)
+        if os.path.exists(ruta):
+            return ruta
+    return None
+
+# --- CARGA MASIVA ---
+
+def cargar_directorio(directorio, vaciar=True):
+    """
+    Carga artistas, discos y ventas desde 'artistas.csv|jsonl', 'discos.csv|jsonl'
+    y 'ventas.csv|jsonl' (también con '.gz', como los que genera exportar.py) mediante
+    COPY FROM STDIN, en una única transacción.
+
+    Los índices secundarios se eliminan antes del COPY y se reconstruyen al final,
+    que es mucho más rápido que mantenerlos fila a fila.
+
+    Args:
+        directorio (str): Carpeta con los ficheros de datos.
+        vaciar (bool): Si es True se vacían las tablas antes de cargar.
+
+    Returns:
+        dict: Filas cargadas por tabla (vacío si la carga falló).
+    """
+    cargadas = {}
+    inicio = time.perf_counter()
+
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+
+            if vaciar:
+                cur.execute("TRUNCATE ventas, discos, artistas RESTART IDENTITY;")
+
+            # Se guardan las definiciones de los índices secundarios para recrearlos después
+            # (las claves primarias y los índices de restricciones se mantienen)
+            cur.execute("""
+                SELECT c.relname, pg_get_indexdef(x.indexrelid)
+                FROM pg_index x
+                JOIN pg_class c ON c.oid = x.indexrelid
+                WHERE x.indrelid IN ('artistas'::regclass, 'discos'::regclass, 'ventas'::regclass)
+                  AND NOT EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conindid = x.indexrelid);
+            """)
+            indices = cur.fetchall()
+            for nombre, _ in indices:
+                cur.execute(f'DROP INDEX "{nombre}";')
+
+            # Los triggers por fila (tablas derivadas) se desactivan durante el COPY;
+            # las tablas derivadas se recalculan de una vez al final
+            for tabla in TABLAS:
+                cur.execute(f"ALTER TABLE {tabla} DISABLE TRIGGER USER;")
+
+            for tabla in TABLAS:
+                ruta = _buscar_fichero(directorio, tabla)
+                if ruta is None:
+                    continue
+                flujo = _FlujoCopy(_lineas_tabla(tabla, _leer_registros(ruta)))
+                cur.copy_expert(f"COPY {tabla} ({COLUMNAS_COPY[tabla]}) FROM STDIN;", flujo)
+                cargadas[tabla] = flujo.filas
+
+            for tabla in TABLAS:
+                cur.execute(f"ALTER TABLE {tabla} ENABLE TRIGGER USER;")
+
+            # Si ventas está particionada, las ventas de meses sin partición (que el COPY
+            # dejó en la partición por defecto) se reparten antes de recrear los índices
+            cur.execute("SELECT asegurar_particiones_ventas(%s);", (crear_bbdd.MESES_FUTUROS,))
+
+            for _, definicion in indices:
+                # En una tabla particionada pg_get_indexdef da 'ON ONLY': se recrea en todas las particiones
+                cur.execute(definicion.replace(" ON ONLY ", " ON ", 1) + ";")
+
+            for sentencia in crear_bbdd.RECONSTRUIR_DERIVADAS:
+                cur.execute(sentencia)
+
+            # Con los triggers desactivados no hubo avisos: se envían a mano para las cachés
+            for tabla in TABLAS:
+                cur.execute("SELECT pg_notify('bdor_cambios', %s);", (tabla,))
+
+            # Los ids vienen en los ficheros: las secuencias continúan tras el máximo cargado
+            for tabla, id_col in (("artistas", "id_artista"), ("discos", "id_disco"), ("ventas", "id_venta")):
+                cur.execute(
+                    f"SELECT setval(pg_get_serial_sequence('{tabla}', '{id_col}'), "
+                    f"COALESCE(MAX({id_col}), 0) + 1, false) FROM {tabla};"
+                )
+
+            conn.commit()
+            transacciones.notificar_reinicio()
+            cur.execute("ANALYZE artistas, discos, ventas;")
+            conn.commit()
+            cur.close()
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"❌ Error en la carga masiva: {error}")
+        return {}
+
+    segundos = time.perf_counter() - inicio
+    total = sum(cargadas.values())
+    for tabla, filas in cargadas.items():
+        print(f"  {tabla}: {filas} filas")
+    print(f"✅ {total} filas cargadas en {segundos:.2f} s ({total / max(segundos, 1e-9):,.0f} filas/s)")
+    return cargadas
+
+# --- GENERADOR DE DATOS SINTÉTICOS ---
+
+NOMBRES = ("Ana", "Luis", "Carmen", "José", "Lucía", "Mario", "Inés", "Pedro", "Sofía", "Andrés")
+APELLIDOS = ("Pérez", "García", "López", "Martínez", "Sánchez", "Romero", "Díaz", "Castañas", "")
+NACIONALIDADES = ("Española", "Venezolana", "Estadounidense", "Mexicana", "Argentina", "Colombiana")
+GENEROS = ("Rock", "Pop", "Reggae", "Indie", "Alternative", "Rap", "Reggaeton", "Jazz", "Salsa", "Metal")
+
+def generar_dataset(directorio, n_ventas, semilla=42, formato="csv"):
+    """
+    Genera un conjunto de datos sintético y reproducible para pruebas de carga.
+
+    Con la misma semilla y tamaño siempre se obtienen los mismos ficheros. El número
+    de artistas, discos y clientes se escala a partir del número de ventas.
+
+    Args:
+        directorio (str): Carpeta donde se escriben los ficheros.
+        n_ventas (int): Número de ventas a generar.
+        semilla (int): Semilla del generador aleatorio.
+        formato (str): 'csv' o 'jsonl'.
+
+    Returns:
+        dict: Filas generadas por tabla.
+    """
+    rnd = random.Random(semilla)
+    n_artistas = max(10, n_ventas // 50)
+    n_discos = max(10, n_ventas // 10)
+    n_clientes = max(10, n_ventas // 5)
+    os.makedirs(directorio, exist_ok=True)
+
+    def filas_artistas():
+        for i in range(1, n_artistas + 1):
+            yield (i, f"{rnd.choice(NOMBRES)} {i}", rnd.choice(APELLIDOS), rnd.choice(NACIONALIDADES))
+
+    def filas_discos():
+        for i in range(1, n_discos + 1):
+            generos = rnd.sample(GENEROS, rnd.randint(1, 3))
+            artistas = sorted({rnd.randint(1, n_artistas) for _ in range(rnd.randint(1, 3))})
+            yield (i, f"Disco {i}", rnd.randint(1960, 2025), generos, artistas)
+
+    def filas_ventas():
+        origen = datetime.date(2020, 1, 1)
+        for i in range(1, n_ventas + 1):
+            cliente = f"Cliente {rnd.randint(1, n_clientes)}"
+            fecha = (origen + datetime.timedelta(days=rnd.randint(0, 6 * 365))).isoformat()
+            discos = [rnd.randint(1, n_discos) for _ in range(rnd.randint(1, 5))]
+            yield (i, cliente, fecha, discos)
+
+    generadas = {}
+    for tabla, filas in (("artistas", filas_artistas()), ("discos", filas_discos()), ("ventas", filas_ventas())):
+        columnas = COLUMNAS[tabla]
+        ruta = os.path.join(directorio, f"{tabla}.{formato}")
+        n = 0
+        with open(ruta, "w", encoding="utf-8", newline="") as fichero:
+            if formato == "jsonl":
+                for fila in filas:
+                    fichero.write(json.dumps(dict(zip(columnas, fila)), ensure_ascii=False) + "\n")
+                    n += 1
+            else:
+                escritor = csv.writer(fichero)
+                escritor.writerow(columnas)
+                for fila in filas:
+                    escritor.writerow([SEPARADOR_ARRAY.join(map(str, v)) if isinstance(v, list) else v
+                                       for v in fila])
+                    n += 1
+        generadas[tabla] = n
+    return generadas
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga masiva y generación de datos de prueba.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_gen = sub.add_parser("generar", help="Genera un conjunto de datos sintético.")
+    p_gen.add_argument("directorio")
+    p_gen.add_argument("--ventas", type=int, default=10_000)
+    p_gen.add_argument("--semilla", type=int, default=42)
+    p_gen.add_argument("--formato", choices=("csv", "jsonl"), default="csv")
+
+    p_car = sub.add_parser("cargar", help="Carga los ficheros de un directorio con COPY.")
+    p_car.add_argument("directorio")
+    p_car.add_argument("--sin-vaciar", action="store_true", help="No vacía las tablas antes de cargar.")
+
+    args = parser.parse_args()
+    if args.comando == "generar":
+        inicio = time.perf_counter()
+        filas = generar_dataset(args.directorio, args.ventas, args.semilla, args.formato)
+        segundos = time.perf_counter() - inicio
+        total = sum(filas.values())
+        print(f"✅ {filas} generadas en {segundos:.2f} s ({total / max(segundos, 1e-9):,.0f} filas/s)")
+    else:
+        cargar_directorio(args.directorio, vaciar=not args.sin_vaciar)
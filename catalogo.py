@@ -0,0 +1,302 @@
+import itertools
+import threading
+import time
+from array import array
+
+import psycopg2
+import consultas
+import transacciones
+from connection import conexion
+
+# Segundos que se da por buena la instantánea antes de volver a leerla entera. Los
+# commits de este proceso se aplican al momento; el TTL acota lo que tardan en verse
+# los cambios hechos desde otros procesos.
+TTL_CATALOGO = 300
+
+# Filas que trae cada viaje al servidor al leer el catálogo
+ITERSIZE_CATALOGO = 5000
+
+# Valor con el que se guarda un año de lanzamiento NULL en el array de años
+_SIN_ANIO = -(2 ** 31)
+
+_contador_cursores = itertools.count(1)
+
+class _Instantanea:
+    """
+    Copia compacta de discos y artistas con sus índices invertidos.
+
+    Cada disco ocupa una posición en arrays paralelos (id, año, título). Los
+    artistas de todos los discos van seguidos en un único array de enteros y
+    'inicio_artistas[p]' marca dónde empiezan los del disco p. Los índices
+    invertidos guardan, para cada género, título y artista, un array con las
+    posiciones de sus discos.
+    """
+
+    def __init__(self):
+        self.ids = array("i")
+        self.anios = array("i")
+        self.titulos = []
+        self.inicio_artistas = array("i", [0])
+        self.artistas_discos = array("i")
+        self.por_genero = {}
+        self.por_titulo = {}
+        self.por_artista = {}
+        self.artistas = {}
+        self.max_disco = 0
+        self.max_artista = 0
+        self.cargada = time.monotonic()
+
+    def anadir_disco(self, id_disco, titulo, anio, generos, artistas_ids):
+        pos = len(self.ids)
+        self.ids.append(id_disco)
+        self.anios.append(_SIN_ANIO if anio is None else anio)
+        self.titulos.append(titulo)
+        # Un disco aparece una sola vez en cada lista aunque repita género o artista
+        artistas_ids = [a for a in dict.fromkeys(artistas_ids or ()) if a is not None]
+        self.artistas_discos.extend(artistas_ids)
+        self.inicio_artistas.append(len(self.artistas_discos))
+
+        for genero in dict.fromkeys(generos or ()):
+            self.por_genero.setdefault(genero, array("i")).append(pos)
+        self.por_titulo.setdefault(titulo, array("i")).append(pos)
+        for id_artista in artistas_ids:
+            self.por_artista.setdefault(id_artista, array("i")).append(pos)
+        self.max_disco = max(self.max_disco, id_disco)
+
+    def anadir_artista(self, id_artista, nombre, apellido):
+        self.artistas[id_artista] = (nombre, apellido)
+        self.max_artista = max(self.max_artista, id_artista)
+
+    def anio(self, pos):
+        anio = self.anios[pos]
+        return None if anio == _SIN_ANIO else anio
+
+    def artistas_de(self, pos):
+        return self.artistas_discos[self.inicio_artistas[pos]:self.inicio_artistas[pos + 1]]
+
+def _filas(conn, query, params):
+    """ Recorre una consulta con un cursor con nombre, 'ITERSIZE_CATALOGO' filas por viaje. """
+    with conn.cursor(name=f"catalogo_{next(_contador_cursores)}") as cur:
+        cur.itersize = ITERSIZE_CATALOGO
+        cur.execute(query, params)
+        yield from cur
+
+_QUERY_DISCOS = """
+    SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids
+    FROM discos WHERE id_disco > %s ORDER BY id_disco;
+"""
+
+_QUERY_ARTISTAS = """
+    SELECT id_artista, (datos_artista).nombre, (datos_artista).apellido
+    FROM artistas WHERE id_artista > %s ORDER BY id_artista;
+"""
+
+class CatalogoMemoria:
+    """
+    Catálogo de discos y artistas en memoria para responder sin ir a la BD.
+
+    Se carga entero la primera vez que se consulta (o cuando caduca el TTL). Los
+    commits de 'transacciones' solo insertan artistas y discos, así que cuando
+    avisan de un cambio basta con leer las filas con ID mayor que el último
+    conocido y añadirlas a los índices. Los reinicios, cargas masivas y
+    reparaciones avisan con 'notificar_reinicio' y provocan una recarga completa.
+    """
+
+    def __init__(self, ttl=TTL_CATALOGO):
+        self.ttl = ttl
+        self.activo = False
+        self._instantanea = None
+        self._lock = threading.RLock()
+        # Sube con cada aviso de cambios: una recarga que empezó antes no se guarda
+        self._generacion = 0
+        self.recargas = 0
+        self.incrementales = 0
+
+    def activar(self):
+        """
+        Activa el catálogo y lo carga.
+
+        Returns:
+            bool: True si se cargó, False si hubo un error o los datos cambiaron mientras
+                se leían (las consultas irán a la BD hasta la siguiente carga).
+        """
+        self.activo = True
+        return self.recargar()
+
+    def desactivar(self):
+        """ Desactiva el catálogo y libera la memoria de la instantánea. """
+        with self._lock:
+            self.activo = False
+            self._instantanea = None
+
+    def recargar(self):
+        """
+        Lee de nuevo discos y artistas completos. Mientras se lee, las consultas
+        siguen respondiendo con la instantánea anterior. Si durante la lectura llega
+        un aviso de cambios, lo leído puede ser anterior a ellos y no se guarda.
+
+        Returns:
+            bool: True si se cargó, False si hubo un error o llegó un aviso entretanto.
+        """
+        with self._lock:
+            generacion = self._generacion
+        nueva = _Instantanea()
+        try:
+            with conexion() as conn:
+                for fila in _filas(conn, _QUERY_DISCOS, (0,)):
+                    nueva.anadir_disco(*fila)
+                for fila in _filas(conn, _QUERY_ARTISTAS, (0,)):
+                    nueva.anadir_artista(*fila)
+        except (Exception, psycopg2.DatabaseError) as error:
+            print(f"Error al cargar el catálogo en memoria: {error}")
+            return False
+
+        with self._lock:
+            if self._generacion != generacion:
+                return False
+            self._instantanea = nueva
+            self.recargas += 1
+        return True
+
+    def actualizar(self, tabla):
+        """
+        Añade a la instantánea las filas nuevas de 'tabla' (oyente de los commits).
+
+        Args:
+            tabla (str): Tabla modificada; solo importan 'discos' y 'artistas'. None
+                indica que los datos se han reemplazado (p. ej. 'reiniciar_datos'): los
+                IDs pueden haber vuelto a empezar y la siguiente consulta recarga todo.
+        """
+        if tabla is None:
+            with self._lock:
+                self._generacion += 1
+                self._instantanea = None
+            return
+        if tabla not in ("discos", "artistas"):
+            return
+        with self._lock:
+            self._generacion += 1
+            inst, generacion = self._instantanea, self._generacion
+            if inst is None:
+                return
+            desde = inst.max_disco if tabla == "discos" else inst.max_artista
+
+        # Las filas se leen sin el bloqueo: las consultas siguen respondiendo mientras tanto
+        try:
+            with conexion() as conn:
+                query = _QUERY_DISCOS if tabla == "discos" else _QUERY_ARTISTAS
+                filas = list(_filas(conn, query, (desde,)))
+        except (Exception, psycopg2.DatabaseError) as error:
+            filas = None
+            print(f"Error al actualizar el catálogo en memoria: {error}")
+
+        with self._lock:
+            if self._instantanea is not inst:
+                return
+            if filas is None or self._generacion != generacion:
+                # Si no se pudo leer, o llegó otro aviso mientras tanto, puede faltar algún
+                # cambio: la siguiente consulta recarga todo
+                self._instantanea = None
+                return
+            for fila in filas:
+                if tabla == "discos":
+                    inst.anadir_disco(*fila)
+                else:
+                    inst.anadir_artista(*fila)
+            self.incrementales += 1
+
+    def _vigente(self):
+        """ Devuelve la instantánea, recargándola si falta o ha caducado (None si no se pudo). """
+        with self._lock:
+            inst = self._instantanea
+            if inst is not None and time.monotonic() - inst.cargada < self.ttl:
+                return inst
+        if self.recargar():
+            return self._instantanea
+        return None
+
+    def consulta_generos(self, genero):
+        """
+        Versión en memoria de 'consultas.consulta_generos'.
+
+        Returns:
+            list: Tuplas (titulo, anio_lanzamiento), o None si el catálogo no está disponible.
+        """
+        inst = self._vigente()
+        if inst is None:
+            return None
+        with self._lock:
+            return [(inst.titulos[p], inst.anio(p)) for p in inst.por_genero.get(genero, ())]
+
+    def consulta_colaboradores(self, titulo_disco):
+        """
+        Versión en memoria de 'consultas.consulta_colaboradores'.
+
+        Returns:
+            list: Tuplas (nombre, apellido), o None si el catálogo no está disponible.
+        """
+        inst = self._vigente()
+        if inst is None:
+            return None
+        with self._lock:
+            return [inst.artistas[a]
+                    for p in inst.por_titulo.get(titulo_disco, ())
+                    for a in inst.artistas_de(p) if a in inst.artistas]
+
+    def discos_de_artista(self, id_artista):
+        """
+        Discos en los que participa un artista.
+
+        Returns:
+            list: Tuplas (id_disco, titulo), o None si el catálogo no está disponible.
+        """
+        inst = self._vigente()
+        if inst is None:
+            return None
+        with self._lock:
+            return [(inst.ids[p], inst.titulos[p]) for p in inst.por_artista.get(id_artista, ())]
+
+    def estadisticas(self):
+        """ Devuelve el tamaño de la instantánea y cuántas veces se ha recargado o actualizado. """
+        with self._lock:
+            inst = self._instantanea
+            return {
+                "activo": self.activo,
+                "discos": len(inst.ids) if inst else 0,
+                "artistas": len(inst.artistas) if inst else 0,
+                "generos": len(inst.por_genero) if inst else 0,
+                "recargas": self.recargas,
+                "incrementales": self.incrementales,
+            }
+
+catalogo = CatalogoMemoria()
+
+# Los commits de este proceso añaden al momento los artistas y discos nuevos
+transacciones.registrar_oyente_commit(catalogo.actualizar)
+
+def activar():
+    """ Activa el catálogo en memoria global (ver CatalogoMemoria.activar). """
+    return catalogo.activar()
+
+def desactivar():
+    """ Desactiva el catálogo en memoria global: las consultas vuelven a ir a la BD. """
+    catalogo.desactivar()
+
+# --- CONSULTAS SERVIDAS DESDE EL CATÁLOGO ---
+# Con el catálogo desactivado, o si no se pudo cargar, se consulta la BD como siempre.
+
+def consulta_generos(genero):
+    """ 'consultas.consulta_generos' servida desde memoria si el catálogo está activo. """
+    if catalogo.activo:
+        resultados = catalogo.consulta_generos(genero)
+        if resultados is not None:
+            return resultados
+    return consultas.consulta_generos(genero)
+
+def consulta_colaboradores(titulo_disco):
+    """ 'consultas.consulta_colaboradores' servida desde memoria si el catálogo está activo. """
+    if catalogo.activo:
+        resultados = catalogo.consulta_colaboradores(titulo_disco)
+        if resultados is not None:
+            return resultados
+    return consultas.consulta_colaboradores(titulo_disco)
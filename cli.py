@@ -0,0 +1,232 @@
+import argparse
+import contextlib
+import csv
+import datetime
+import json
+import shlex
+import sys
+
+import connection
+import consultas
+import transacciones
+
+# Formatos de salida: una línea JSON por fila o CSV
+FORMATOS = ("jsonl", "csv")
+
+# En CSV los arrays se escriben separados por '|', igual que en los ficheros de carga masiva
+SEPARADOR_ARRAY = "|"
+
+class _Salida:
+    """
+    Escribe las filas de cada operación según llegan, sin acumularlas en memoria.
+
+    Cada fila lleva el nombre de la operación en la columna 'operacion'. En CSV se
+    escribe una cabecera cada vez que cambian las columnas (p. ej. en un lote que
+    mezcla operaciones distintas).
+    """
+
+    def __init__(self, fichero, formato):
+        self.fichero = fichero
+        self.formato = formato
+        self._csv = csv.writer(fichero) if formato == "csv" else None
+        self._cabecera = None
+
+    def escribir(self, operacion, columnas, fila):
+        if self._csv is None:
+            registro = {"operacion": operacion, **dict(zip(columnas, fila))}
+            self.fichero.write(json.dumps(registro, ensure_ascii=False, default=_a_texto) + "\n")
+            return
+        cabecera = ("operacion",) + tuple(columnas)
+        if cabecera != self._cabecera:
+            self._csv.writerow(cabecera)
+            self._cabecera = cabecera
+        self._csv.writerow([operacion] + [_valor_csv(v) for v in fila])
+
+def _a_texto(valor):
+    if isinstance(valor, (datetime.date, datetime.datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+def _valor_csv(valor):
+    if isinstance(valor, (list, tuple)):
+        return SEPARADOR_ARRAY.join(_a_texto(v) for v in valor)
+    if valor is None:
+        return ""
+    return _a_texto(valor)
+
+def _lista_enteros(texto):
+    return [int(x) for x in texto.replace(",", " ").split()]
+
+# --- OPERACIONES ---
+# Cada operación recibe los argumentos ya interpretados y devuelve un iterable de filas
+# con las columnas que declara en 'set_defaults(columnas=...)'.
+
+def _generos(args):
+    return consultas.consulta_generos(args.genero)
+
+def _compras(args):
+    return consultas.consulta_cliente(args.cliente)
+
+def _colaboradores(args):
+    return consultas.consulta_colaboradores(args.titulo)
+
+def _alta_artista(args):
+    generos = [g.strip() for g in args.generos.split(",") if g.strip()]
+    ok = transacciones.insertar_artista_y_disco(args.nombre, args.apellido, args.nacionalidad,
+                                                args.titulo, args.anio, generos)
+    return [(args.nombre, args.titulo, ok)]
+
+def _actualizar_venta(args):
+    ok = transacciones.actualizar_discos_venta(args.id_venta, args.discos, version=args.version)
+    return [(args.id_venta, args.discos, ok)]
+
+def _editar_venta(args):
+    ok = transacciones.editar_ventas([(args.id_venta, args.anadir, args.quitar, args.version)]) == [args.id_venta]
+    return [(args.id_venta, args.anadir, args.quitar, ok)]
+
+def _registrar_venta(args):
+    id_venta = transacciones.registrar_venta(args.cliente, args.fecha, args.discos)
+    return [(id_venta, args.cliente, args.discos, id_venta is not None)]
+
+def _eliminar_venta(args):
+    return [(args.id_venta, transacciones.eliminar_venta(args.id_venta))]
+
+_LISTADOS = {
+    "artistas": (consultas.iterar_artistas, ("id_artista", "nombre", "apellido", "nacionalidad")),
+    "discos": (consultas.iterar_discos, ("id_disco", "titulo", "anio_lanzamiento", "generos", "artistas_ids")),
+    "ventas": (consultas.iterar_ventas, ("id_venta", "cliente", "fecha", "discos_comprados")),
+}
+
+def _listar(args):
+    # Cursor de servidor: las filas se escriben según llegan, sea cual sea el tamaño de la tabla
+    return _LISTADOS[args.tabla][0]()
+
+def crear_parser():
+    """ Construye el parser de la línea de comandos (también se usa para cada línea de un lote). """
+    parser = argparse.ArgumentParser(
+        prog="main.py",
+        description="Operaciones del sistema musical sin menú interactivo. Sin argumentos se abre el menú.")
+    parser.add_argument("--formato", choices=FORMATOS, default="jsonl", help="Formato de salida (por defecto jsonl).")
+    parser.add_argument("--salida", help="Fichero de salida (por defecto la salida estándar).")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p = sub.add_parser("generos", help="Discos de un género.")
+    p.add_argument("genero")
+    p.set_defaults(ejecutar=_generos, columnas=("titulo", "anio_lanzamiento"))
+
+    p = sub.add_parser("compras", help="Discos comprados por un cliente.")
+    p.add_argument("cliente")
+    p.set_defaults(ejecutar=_compras, columnas=("titulo",))
+
+    p = sub.add_parser("colaboradores", help="Artistas de un disco.")
+    p.add_argument("titulo")
+    p.set_defaults(ejecutar=_colaboradores, columnas=("nombre", "apellido"))
+
+    p = sub.add_parser("alta-artista", help="Añade un artista con su disco (una transacción).")
+    p.add_argument("--nombre", required=True)
+    p.add_argument("--apellido", default="")
+    p.add_argument("--nacionalidad", default="")
+    p.add_argument("--titulo", required=True)
+    p.add_argument("--anio", type=int, required=True)
+    p.add_argument("--generos", default="", help="Géneros separados por comas.")
+    p.set_defaults(ejecutar=_alta_artista, columnas=("nombre", "titulo", "ok"))
+
+    p = sub.add_parser("actualizar-venta", help="Sustituye los discos de una venta.")
+    p.add_argument("id_venta", type=int)
+    p.add_argument("discos", type=_lista_enteros, help="IDs de los discos separados por comas.")
+    p.add_argument("--version", type=int, help="Solo actualiza si el pedido sigue en esta versión.")
+    p.set_defaults(ejecutar=_actualizar_venta, columnas=("id_venta", "discos_comprados", "ok"))
+
+    p = sub.add_parser("editar-venta", help="Añade o quita discos de una venta sin reescribir la lista.")
+    p.add_argument("id_venta", type=int)
+    p.add_argument("--anadir", type=_lista_enteros, default=[], help="IDs a añadir al final, separados por comas.")
+    p.add_argument("--quitar", type=_lista_enteros, default=[], help="IDs a quitar (todas sus apariciones).")
+    p.add_argument("--version", type=int, help="Solo edita si el pedido sigue en esta versión.")
+    p.set_defaults(ejecutar=_editar_venta, columnas=("id_venta", "anadidos", "quitados", "ok"))
+
+    p = sub.add_parser("registrar-venta", help="Registra una venta nueva.")
+    p.add_argument("cliente")
+    p.add_argument("discos", type=_lista_enteros, help="IDs de los discos separados por comas.")
+    p.add_argument("--fecha", help="Fecha AAAA-MM-DD (por defecto hoy).")
+    p.set_defaults(ejecutar=_registrar_venta, columnas=("id_venta", "cliente", "discos_comprados", "ok"))
+
+    p = sub.add_parser("eliminar-venta", help="Borra una venta.")
+    p.add_argument("id_venta", type=int)
+    p.set_defaults(ejecutar=_eliminar_venta, columnas=("id_venta", "ok"))
+
+    p = sub.add_parser("listar", help="Recorre una tabla completa en streaming.")
+    p.add_argument("tabla", choices=tuple(_LISTADOS))
+    p.set_defaults(ejecutar=_listar, columnas=None)
+
+    p = sub.add_parser("lote", help="Ejecuta las operaciones de un fichero, una por línea ('-' = entrada estándar).")
+    p.add_argument("fichero")
+    p.set_defaults(ejecutar=None, columnas=None)
+
+    return parser
+
+def _ejecutar(args, salida):
+    """ Ejecuta una operación y escribe sus filas. Devuelve False si alguna escritura falló. """
+    columnas = args.columnas or _LISTADOS[args.tabla][1]
+    correcto = True
+    # Las funciones del proyecto informan de errores con print: van a stderr para no
+    # mezclarse con los datos de la salida
+    with contextlib.redirect_stdout(sys.stderr):
+        for fila in args.ejecutar(args):
+            if columnas[-1] == "ok" and not fila[-1]:
+                correcto = False
+            salida.escribir(args.comando, columnas, fila)
+    return correcto
+
+def _ejecutar_lote(parser, lineas, salida):
+    """ Ejecuta cada línea del lote con la misma sintaxis que la línea de comandos. """
+    correcto = True
+    for numero, linea in enumerate(lineas, 1):
+        linea = linea.strip()
+        if not linea or linea.startswith("#"):
+            continue
+        try:
+            args = parser.parse_args(shlex.split(linea))
+        except SystemExit:
+            print(f"❌ Línea {numero} del lote no válida: {linea}", file=sys.stderr)
+            correcto = False
+            continue
+        if args.comando == "lote":
+            print(f"❌ Línea {numero}: no se pueden anidar lotes.", file=sys.stderr)
+            correcto = False
+            continue
+        correcto = _ejecutar(args, salida) and correcto
+    return correcto
+
+def main(argv=None):
+    """
+    Punto de entrada de la línea de comandos.
+
+    Todas las operaciones del proceso (incluidas las de un lote) usan una única
+    conexión: el pool se configura con una sola conexión que se reutiliza.
+
+    Args:
+        argv (list): Argumentos (por defecto los de sys.argv).
+
+    Returns:
+        int: 0 si todo fue bien, 1 si alguna operación o línea del lote falló.
+    """
+    parser = crear_parser()
+    args = parser.parse_args(argv)
+    connection.configurar_pool(minconn=1, maxconn=1)
+
+    fichero = open(args.salida, "w", encoding="utf-8", newline="") if args.salida else sys.stdout
+    try:
+        salida = _Salida(fichero, args.formato)
+        if args.comando == "lote":
+            if args.fichero == "-":
+                correcto = _ejecutar_lote(parser, sys.stdin, salida)
+            else:
+                with open(args.fichero, encoding="utf-8") as lote:
+                    correcto = _ejecutar_lote(parser, lote, salida)
+        else:
+            correcto = _ejecutar(args, salida)
+    finally:
+        if fichero is not sys.stdout:
+            fichero.close()
+        connection.cerrar_pool()
+    return 0 if correcto else 1
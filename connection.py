@@ -1,16 +1,373 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
 import psycopg2
-from psycopg2 import Error
+from psycopg2 import Error, pool
+import instrumentacion
+
+# Parámetros de conexión compartidos por las conexiones sueltas y el pool
+PARAMETROS_CONEXION = {
+    "user": "aed_user",
+    "password": "aed_pass",
+    "host": "localhost",
+    "port": "5432",
+    "database": "aed_db",
+}
+
+# Esquema donde viven las tablas (None = el search_path por defecto del servidor).
+# Se fija con la variable de entorno BDOR_ESQUEMA o con 'configurar_esquema'.
+ESQUEMA = None
+
+# Tamaño del pool y tiempos de espera (en segundos)
+POOL_MIN = 1
+POOL_MAX = 10
+TIEMPO_ESPERA_CHECKOUT = 30
+# Una conexión inactiva más tiempo que este se verifica con 'SELECT 1' al pedirla
+VERIFICAR_TRAS_INACTIVIDAD = 30
+
+class ConexionBDOR(psycopg2.extensions.connection):
+    """
+    Conexión de psycopg2 que recuerda qué sentencias tiene ya preparadas en el servidor.
+
+    Dentro de 'transaccion_de_prueba' cada bloque 'conexion()' abre un SAVEPOINT y
+    'commit'/'rollback' actúan sobre él en lugar de sobre la transacción real.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.preparadas = set()
+        self.savepoints = []
+
+    def _sentencia_interna(self, sql):
+        # Cursor normal: los savepoints no cuentan en las métricas de consultas
+        cur = self.cursor(cursor_factory=psycopg2.extensions.cursor)
+        cur.execute(sql)
+        cur.close()
+
+    def commit(self):
+        if not self.savepoints:
+            return super().commit()
+        # Se confirma el bloque y se abre otro savepoint para lo que venga después
+        savepoint = self.savepoints[-1]
+        self._sentencia_interna(f"RELEASE SAVEPOINT {savepoint}; SAVEPOINT {savepoint};")
+
+    def rollback(self):
+        if not self.savepoints:
+            return super().rollback()
+        self._sentencia_interna(f"ROLLBACK TO SAVEPOINT {self.savepoints[-1]};")
 
 def get_connection():
     try:
-        connection = psycopg2.connect(
-            user="aed_user",
-            password="aed_pass",
-            host="localhost",
-            port="5432",
-            database="aed_db"
-        )
+        connection = psycopg2.connect(connection_factory=ConexionBDOR, **PARAMETROS_CONEXION)
         return connection
     except (Exception, Error) as error:
         print(f"Error conectando a la BD: {error}")
-        return None
\ No newline at end of file
+        return None
+
+class PoolConexiones:
+    """
+    Pool de conexiones seguro entre hilos.
+
+    Las conexiones devueltas se guardan inactivas (hasta 'maxconn') en lugar de
+    cerrarse, así que con varios hilos no se vuelve a conectar ni a preparar las
+    sentencias. Cuando se alcanza el máximo de conexiones el hilo espera (hasta
+    'tiempo_espera') en lugar de fallar, y cada conexión se comprueba antes de
+    entregarse para no devolver conexiones rotas.
+    """
+
+    def __init__(self, minconn=POOL_MIN, maxconn=POOL_MAX, tiempo_espera=TIEMPO_ESPERA_CHECKOUT, **parametros):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.tiempo_espera = tiempo_espera
+        self._parametros = parametros or dict(PARAMETROS_CONEXION)
+        # Todos los cursores de las conexiones del pool miden sus consultas
+        self._parametros.setdefault("cursor_factory", instrumentacion.CursorInstrumentado)
+        self._parametros.setdefault("connection_factory", ConexionBDOR)
+        # El semáforo limita las conexiones prestadas; como solo se guardan inactivas las
+        # devueltas, nunca hay más de 'maxconn' abiertas
+        self._huecos = threading.BoundedSemaphore(maxconn)
+        self._libres = []
+        self._ultimo_uso = {}
+        self._lock = threading.Lock()
+        self.conexiones_creadas = 0
+        self._cerrado = False
+        self._libres.extend(self._nueva() for _ in range(minconn))
+
+    def _nueva(self):
+        conn = psycopg2.connect(**self._parametros)
+        with self._lock:
+            self.conexiones_creadas += 1
+        return conn
+
+    def _conexion_valida(self, conn):
+        """ Comprueba que la conexión sigue abierta y, si lleva tiempo inactiva, que responde. """
+        if conn.closed:
+            return False
+        with self._lock:
+            inactiva = time.monotonic() - self._ultimo_uso.get(id(conn), 0)
+        if inactiva < VERIFICAR_TRAS_INACTIVIDAD:
+            return True
+        try:
+            # Cursor normal: la comprobación no debe contar en las métricas de consultas
+            cur = conn.cursor(cursor_factory=psycopg2.extensions.cursor)
+            cur.execute("SELECT 1;")
+            cur.close()
+            conn.rollback()
+            return True
+        except (Exception, Error):
+            return False
+
+    def obtener(self):
+        """
+        Saca una conexión sana del pool, esperando si todas están ocupadas.
+
+        Returns:
+            connection: Conexión de psycopg2 lista para usarse.
+        """
+        inicio = time.perf_counter()
+        if not self._huecos.acquire(timeout=self.tiempo_espera):
+            raise pool.PoolError("Tiempo de espera agotado: no hay conexiones libres en el pool")
+        try:
+            with self._lock:
+                # La última devuelta es la que tiene más probabilidades de seguir viva
+                conn = self._libres.pop() if self._libres else None
+            if conn is None:
+                conn = self._nueva()
+            elif not self._conexion_valida(conn):
+                # La conexión está rota: se descarta y se abre una nueva en su lugar
+                self._descartar(conn)
+                conn = self._nueva()
+            instrumentacion.registrar_checkout(time.perf_counter() - inicio)
+            return conn
+        except Exception:
+            self._huecos.release()
+            raise
+
+    def _descartar(self, conn):
+        with self._lock:
+            self._ultimo_uso.pop(id(conn), None)
+        try:
+            conn.close()
+        except (Exception, Error):
+            pass
+
+    def devolver(self, conn):
+        """
+        Devuelve una conexión al pool, deshaciendo cualquier transacción pendiente.
+
+        Args:
+            conn (connection): Conexión obtenida con 'obtener'.
+        """
+        try:
+            cerrar = bool(conn.closed) or self._cerrado
+            if not cerrar and conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except (Exception, Error):
+                    cerrar = True
+            if cerrar:
+                self._descartar(conn)
+            else:
+                with self._lock:
+                    self._ultimo_uso[id(conn)] = time.monotonic()
+                    self._libres.append(conn)
+        finally:
+            self._huecos.release()
+
+    @contextmanager
+    def conexion(self):
+        """ Context manager que presta una conexión del pool y la devuelve al salir. """
+        conn = self.obtener()
+        try:
+            yield conn
+        finally:
+            self.devolver(conn)
+
+    def cerrar(self):
+        """ Cierra las conexiones inactivas del pool (las prestadas se cierran al devolverse). """
+        with self._lock:
+            self._cerrado = True
+            libres, self._libres = self._libres, []
+        for conn in libres:
+            self._descartar(conn)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Conexión que comparten todos los bloques 'conexion()' durante 'transaccion_de_prueba'
+_conexion_fijada = None
+
+# --- SENTENCIAS PREPARADAS ---
+
+# Registro de sentencias: nombre -> (tipos de los parámetros, SQL con $1, $2, ...)
+SENTENCIAS_PREPARADAS = {}
+
+def registrar_sentencia(nombre, tipos, sql):
+    """
+    Añade una sentencia al registro para ejecutarla después con 'ejecutar_preparada'.
+
+    Args:
+        nombre (str): Identificador de la sentencia en PostgreSQL.
+        tipos (tuple): Tipos SQL de los parámetros, p. ej. ('TEXT', 'INTEGER').
+        sql (str): Sentencia con los parámetros escritos como $1, $2...
+    """
+    SENTENCIAS_PREPARADAS[nombre] = (tuple(tipos), sql)
+
+def ejecutar_preparada(cur, nombre, params=()):
+    """
+    Ejecuta una sentencia registrada con EXECUTE. La primera vez que se usa en una
+    conexión se envía su PREPARE, de modo que PostgreSQL la analiza y planifica una
+    sola vez por conexión del pool en lugar de en cada llamada.
+
+    Args:
+        cur (cursor): Cursor de una conexión ConexionBDOR.
+        nombre (str): Nombre con el que se registró la sentencia.
+        params (tuple): Valores de los parámetros.
+    """
+    conn = cur.connection
+    if nombre not in conn.preparadas:
+        tipos, sql = SENTENCIAS_PREPARADAS[nombre]
+        firma = f" ({', '.join(tipos)})" if tipos else ""
+        cur.execute(f"PREPARE {nombre}{firma} AS {sql};")
+        # PREPARE no es transaccional: sigue existiendo aunque la transacción se deshaga
+        conn.preparadas.add(nombre)
+    if params:
+        cur.execute(f"EXECUTE {nombre} ({', '.join(['%s'] * len(params))});", params)
+    else:
+        cur.execute(f"EXECUTE {nombre};")
+
+def configurar_pool(minconn=POOL_MIN, maxconn=POOL_MAX, tiempo_espera=TIEMPO_ESPERA_CHECKOUT):
+    """
+    Crea (o recrea) el pool global con el tamaño indicado.
+
+    Args:
+        minconn (int): Conexiones que se mantienen abiertas como mínimo.
+        maxconn (int): Máximo de conexiones simultáneas contra PostgreSQL.
+        tiempo_espera (float): Segundos que se espera por una conexión libre.
+
+    Returns:
+        PoolConexiones: El nuevo pool global.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.cerrar()
+        _pool = PoolConexiones(minconn, maxconn, tiempo_espera)
+        return _pool
+
+def configurar_esquema(esquema):
+    """
+    Hace que todas las conexiones nuevas trabajen en 'esquema' (search_path
+    'esquema, public': las extensiones instaladas en public siguen visibles).
+    Cierra el pool global para que las conexiones abiertas no sigan en el anterior.
+
+    Args:
+        esquema (str): Nombre del esquema (minúsculas, dígitos y '_'), o None
+            para volver al search_path por defecto.
+    """
+    global ESQUEMA
+    if esquema and not re.fullmatch(r"[a-z_][a-z0-9_]*", esquema):
+        raise ValueError(f"Nombre de esquema no válido: {esquema!r}")
+    ESQUEMA = esquema or None
+    if ESQUEMA is None:
+        PARAMETROS_CONEXION.pop("options", None)
+    else:
+        PARAMETROS_CONEXION["options"] = f"-c search_path={ESQUEMA},public"
+    cerrar_pool()
+
+def obtener_pool():
+    """ Devuelve el pool global, creándolo con la configuración por defecto si aún no existe. """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolConexiones()
+    return _pool
+
+def cerrar_pool():
+    """ Cierra el pool global y todas sus conexiones. """
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.cerrar()
+            _pool = None
+
+@contextmanager
+def conexion(nombre=None):
+    """
+    Presta una conexión del pool global para un bloque 'with'.
+
+    Al salir del bloque la conexión vuelve al pool; si quedó una transacción
+    abierta sin COMMIT se deshace con ROLLBACK.
+
+    Args:
+        nombre (str): Operación a la que se atribuye la espera por la conexión en
+            las métricas (por defecto, la de la función decorada con 'medido').
+    """
+    if _conexion_fijada is not None:
+        # El préstamo es inmediato, pero se anota en las métricas igual que los del pool
+        if nombre is None:
+            instrumentacion.registrar_checkout(0.0)
+        else:
+            with instrumentacion.nombre_consulta(nombre):
+                instrumentacion.registrar_checkout(0.0)
+        with _bloque_de_prueba(_conexion_fijada) as conn:
+            yield conn
+        return
+
+    pool_global = obtener_pool()
+    if nombre is None:
+        conn = pool_global.obtener()
+    else:
+        with instrumentacion.nombre_consulta(nombre):
+            conn = pool_global.obtener()
+    try:
+        yield conn
+    finally:
+        pool_global.devolver(conn)
+
+@contextmanager
+def _bloque_de_prueba(conn):
+    """ Equivalente de un préstamo del pool sobre la conexión fijada: un SAVEPOINT por bloque. """
+    savepoint = f"bdor_bloque_{len(conn.savepoints) + 1}"
+    conn._sentencia_interna(f"SAVEPOINT {savepoint};")
+    conn.savepoints.append(savepoint)
+    try:
+        yield conn
+    finally:
+        # Como al devolver una conexión al pool: se deshace lo que no se confirmó
+        conn.savepoints.pop()
+        conn._sentencia_interna(f"ROLLBACK TO SAVEPOINT {savepoint}; RELEASE SAVEPOINT {savepoint};")
+
+@contextmanager
+def transaccion_de_prueba():
+    """
+    Ejecuta un bloque (normalmente un test) dentro de una transacción que se deshace
+    al salir, de modo que sus cambios no llegan a la base de datos aunque las funciones
+    llamadas hagan COMMIT.
+
+    Mientras dura, todos los bloques 'conexion()' usan la misma conexión y sus COMMIT
+    y ROLLBACK se convierten en operaciones sobre savepoints. Solo afecta a 'conexion()':
+    las conexiones de 'get_connection', las asíncronas y las de otros procesos no ven
+    los cambios. Está pensado para usarse desde un solo hilo.
+
+    Yields:
+        connection: La conexión fijada.
+    """
+    global _conexion_fijada
+    if _conexion_fijada is not None:
+        raise RuntimeError("Ya hay una transacción de prueba en curso")
+    pool_global = obtener_pool()
+    conn = pool_global.obtener()
+    _conexion_fijada = conn
+    try:
+        yield conn
+    finally:
+        _conexion_fijada = None
+        conn.savepoints.clear()
+        pool_global.devolver(conn)
+
+configurar_esquema(os.environ.get("BDOR_ESQUEMA"))
@@ -1,8 +1,53 @@
+import itertools
+import weakref
+
 import psycopg2
-from connection import get_connection
+import transacciones
+from connection import conexion, ejecutar_preparada, registrar_sentencia
+from instrumentacion import medido, nombre_consulta
+
+# Filas que trae cada viaje al servidor cuando se recorre una tabla con un cursor con nombre
+ITERSIZE_POR_DEFECTO = 2000
+
+# Tamaño de página por defecto de los listados paginados
+TAM_PAGINA_POR_DEFECTO = 20
+
+_contador_cursores = itertools.count(1)
+
+# --- SENTENCIAS PREPARADAS ---
+# Las búsquedas puntuales más frecuentes se preparan una vez por conexión del pool
+# (PREPARE) y después solo se ejecutan (EXECUTE), sin volver a analizarlas ni planificarlas.
+
+# '@>' (contiene) puede usar el índice GIN de generos; '$1 = ANY(generos)' no
+registrar_sentencia("consulta_generos", ("TEXT",), """
+    SELECT titulo, anio_lanzamiento FROM discos WHERE generos @> ARRAY[$1]::TEXT[]
+""")
+
+# Se lee de 'compras_cliente', que los triggers de ventas mantienen al día: las compras
+# de un cliente son un tramo contiguo de su clave primaria
+registrar_sentencia("consulta_cliente", ("VARCHAR",), """
+    SELECT d.titulo 
+    FROM compras_cliente c
+    JOIN discos d ON d.id_disco = c.id_disco
+    WHERE c.customer_name = $1
+    ORDER BY c.id_venta, c.id_disco
+""")
+
+registrar_sentencia("consulta_colaboradores", ("VARCHAR",), """
+    SELECT (a.datos_artista).nombre, (a.datos_artista).apellido
+    FROM artistas a
+    JOIN discos d ON a.id_artista = ANY(d.artistas_ids)
+    WHERE d.titulo = $1
+""")
+
+# Columnas explícitas: un plan guardado con 'SELECT *' falla si cambian las columnas de la tabla
+registrar_sentencia("buscar_disco_por_id", ("INTEGER",), """
+    SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids FROM discos WHERE id_disco = $1
+""")
 
 # --- CONSULTAS DE BÚSQUEDA GENERAL ---
 
+@medido
 def listar_todos_artistas():
     """ 
     Recupera la lista completa de artistas desglosando el tipo compuesto 'artist_type'.
@@ -13,30 +58,28 @@ def listar_todos_artistas():
     Returns:
         list: Lista de tuplas con (id_artista, nombre, apellido, nacionalidad).
     """
-    conn = get_connection()
     resultados = []
 
     try:
-        cur = conn.cursor()
-        query = """
-            SELECT id_artista, 
-                (datos_artista).nombre, 
-                (datos_artista).apellido, 
-                (datos_artista).nacionalidad 
-            FROM artistas ORDER BY id_artista;
-        """
-        cur.execute(query)
-        resultados = cur.fetchall()
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT id_artista, 
+                    (datos_artista).nombre, 
+                    (datos_artista).apellido, 
+                    (datos_artista).nacionalidad 
+                FROM artistas ORDER BY id_artista;
+            """
+            cur.execute(query)
+            resultados = cur.fetchall()
+            cur.close()
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al listar artistas: {error}")
 
-    finally:
-        if conn: conn.close()
-
     return resultados
 
+@medido
 def listar_todos_discos():
     """ 
     Recupera todos los discos almacenados, incluyendo sus arrays de géneros y artistas.
@@ -48,24 +91,22 @@ def listar_todos_discos():
         list: Lista de tuplas con (id_disco, titulo, anio, generos, artistas_ids).
     """
 
-    conn = get_connection()
     resultados = []
 
     try:
-        cur = conn.cursor()
-        query = "SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids FROM discos ORDER BY id_disco;"
-        cur.execute(query)
-        resultados = cur.fetchall()
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = "SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids FROM discos ORDER BY id_disco;"
+            cur.execute(query)
+            resultados = cur.fetchall()
+            cur.close()
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al listar discos: {error}")
 
-    finally:
-        if conn: conn.close()
-
     return resultados
 
+@medido
 def listar_todas_ventas():
     """ 
     Recupera el historial de ventas desglosando el tipo compuesto 'sale_info'.
@@ -76,32 +117,115 @@ def listar_todas_ventas():
     Returns:
         list: Lista de tuplas con (id_venta, cliente, fecha, discos_ids).
     """
-    conn = get_connection()
     resultados = []
 
     try:
-        cur = conn.cursor()
-        query = """
-            SELECT id_venta, 
-                (detalles_venta).customer_name, 
-                (detalles_venta).sale_date, 
-                (detalles_venta).discos_comprados 
-            FROM ventas ORDER BY id_venta;
-        """
-        cur.execute(query)
-        resultados = cur.fetchall()
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT id_venta, 
+                    (detalles_venta).customer_name, 
+                    (detalles_venta).sale_date, 
+                    (detalles_venta).discos_comprados 
+                FROM ventas ORDER BY id_venta;
+            """
+            cur.execute(query)
+            resultados = cur.fetchall()
+            cur.close()
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al listar ventas: {error}")
 
-    finally:
-        if conn: conn.close()
-
     return resultados
 
+# --- RECORRIDOS EN STREAMING (CURSORES DE SERVIDOR) ---
+
+def _iterar_consulta(query, itersize, descripcion):
+    """ 
+    Recorre el resultado de una consulta con un cursor con nombre (server-side).
+    
+    PostgreSQL mantiene el resultado en el servidor y solo se descargan 'itersize'
+    filas por viaje, por lo que la memoria usada no depende del tamaño de la tabla.
+    La conexión permanece prestada hasta que el generador se agota o se cierra.
+    
+    Args:
+        query (str): Consulta SELECT a recorrer.
+        itersize (int): Filas que se piden al servidor en cada viaje.
+        descripcion (str): Nombre de lo que se recorre, para el mensaje de error.
+        
+    Yields:
+        tuple: Cada fila del resultado.
+    """
+    # El generador se consume fuera de la función que lo creó: el nombre de la
+    # operación para las métricas se indica explícitamente
+    nombre = f"iterar_{descripcion}"
+    try:
+        with conexion(nombre) as conn:
+            nombre_cursor = f"{nombre}_{next(_contador_cursores)}"
+            with conn.cursor(name=nombre_cursor) as cur:
+                cur.itersize = itersize
+                with nombre_consulta(nombre):
+                    cur.execute(query)
+                for fila in cur:
+                    yield fila
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al recorrer {descripcion}: {error}")
+
+def iterar_artistas(itersize=ITERSIZE_POR_DEFECTO):
+    """ 
+    Versión en streaming de 'listar_todos_artistas' para tablas de cualquier tamaño.
+    
+    Args:
+        itersize (int): Filas que se piden al servidor en cada viaje.
+        
+    Yields:
+        tuple: (id_artista, nombre, apellido, nacionalidad).
+    """
+    query = """
+        SELECT id_artista, 
+            (datos_artista).nombre, 
+            (datos_artista).apellido, 
+            (datos_artista).nacionalidad 
+        FROM artistas ORDER BY id_artista;
+    """
+    return _iterar_consulta(query, itersize, "artistas")
+
+def iterar_discos(itersize=ITERSIZE_POR_DEFECTO):
+    """ 
+    Versión en streaming de 'listar_todos_discos' para tablas de cualquier tamaño.
+    
+    Args:
+        itersize (int): Filas que se piden al servidor en cada viaje.
+        
+    Yields:
+        tuple: (id_disco, titulo, anio, generos, artistas_ids).
+    """
+    query = "SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids FROM discos ORDER BY id_disco;"
+    return _iterar_consulta(query, itersize, "discos")
+
+def iterar_ventas(itersize=ITERSIZE_POR_DEFECTO):
+    """ 
+    Versión en streaming de 'listar_todas_ventas' para tablas de cualquier tamaño.
+    
+    Args:
+        itersize (int): Filas que se piden al servidor en cada viaje.
+        
+    Yields:
+        tuple: (id_venta, cliente, fecha, discos_ids).
+    """
+    query = """
+        SELECT id_venta, 
+            (detalles_venta).customer_name, 
+            (detalles_venta).sale_date, 
+            (detalles_venta).discos_comprados 
+        FROM ventas ORDER BY id_venta;
+    """
+    return _iterar_consulta(query, itersize, "ventas")
+
 # --- CONSULTAS DE BÚSQUEDA ESPECÍFICA ---
 
+@medido
 def consulta_generos(genero):
     """ 
     Busca los discos de un género específico y devuelve sus datos.
@@ -112,27 +236,25 @@ def consulta_generos(genero):
     Returns:
         list: Lista de tuplas con (titulo, anio_lanzamiento).
     """
-    conn = get_connection()
     resultados = []
 
     try:
-        cur = conn.cursor()
-        query = "SELECT titulo, anio_lanzamiento FROM discos WHERE %s = ANY(generos);"
-        cur.execute(query, (genero,))
-        resultados = cur.fetchall()
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            ejecutar_preparada(cur, "consulta_generos", (genero,))
+            resultados = cur.fetchall()
+            cur.close()
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al consultar géneros: {error}")
 
-    finally:
-        if conn: conn.close()
-
     return resultados
 
+@medido
 def consulta_cliente(nombre_cliente):
     """ 
-    Obtiene los discos comprados por un cliente desde el tipo compuesto 'sale_info'.
+    Obtiene los discos comprados por un cliente desde la tabla 'compras_cliente',
+    que los triggers mantienen sincronizada con el tipo compuesto 'sale_info' de ventas.
     
     Args:
         nombre_cliente (str): Nombre del cliente.
@@ -140,29 +262,21 @@ def consulta_cliente(nombre_cliente):
     Returns:
         list: Lista de tuplas con los títulos de los discos.
     """
-    conn = get_connection()
     resultados = []
 
     try:
-        cur = conn.cursor()
-        query = """
-            SELECT d.titulo 
-            FROM discos d
-            JOIN ventas v ON d.id_disco = ANY((v.detalles_venta).discos_comprados)
-            WHERE (v.detalles_venta).customer_name = %s;
-        """
-        cur.execute(query, (nombre_cliente,))
-        resultados = cur.fetchall()
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            ejecutar_preparada(cur, "consulta_cliente", (nombre_cliente,))
+            resultados = cur.fetchall()
+            cur.close()
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al consultar cliente: {error}")
 
-    finally:
-        if conn: conn.close()
-
     return resultados
 
+@medido
 def consulta_colaboradores(titulo_disco):
     """ 
     Devuelve los artistas de un disco extrayendo datos del tipo compuesto 'artist_type'.
@@ -173,29 +287,21 @@ def consulta_colaboradores(titulo_disco):
     Returns:
         list: Lista de tuplas con (nombre, apellido) de los artistas.
     """
-    conn = get_connection()
     resultados = []
 
     try:
-        cur = conn.cursor()
-        query = """
-            SELECT (a.datos_artista).nombre, (a.datos_artista).apellido
-            FROM artistas a
-            JOIN discos d ON a.id_artista = ANY(d.artistas_ids)
-            WHERE d.titulo = %s;
-        """
-        cur.execute(query, (titulo_disco,))
-        resultados = cur.fetchall()
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            ejecutar_preparada(cur, "consulta_colaboradores", (titulo_disco,))
+            resultados = cur.fetchall()
+            cur.close()
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al consultar colaboradores: {error}")
 
-    finally:
-        if conn: conn.close()
-
     return resultados
 
+@medido
 def buscar_disco_por_id(id_disco):
     """ 
     Busca la información detallada de un disco por su ID.
@@ -206,24 +312,54 @@ def buscar_disco_por_id(id_disco):
     Returns:
         tuple: Tupla con los datos del disco o None si no existe.
     """
-    conn = get_connection()
     resultado = None
 
     try:
-        cur = conn.cursor()
-        query = "SELECT * FROM discos WHERE id_disco = %s;"
-        cur.execute(query, (id_disco,))
-        resultado = cur.fetchone()
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            ejecutar_preparada(cur, "buscar_disco_por_id", (id_disco,))
+            resultado = cur.fetchone()
+            cur.close()
 
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al buscar disco por ID: {error}")
 
-    finally:
-        if conn: conn.close()
+    return resultado
+
+@medido
+def obtener_venta(id_venta):
+    """ 
+    Lee un pedido con su versión actual, para editarlo después con bloqueo optimista.
+    
+    Args:
+        id_venta (int): ID de la venta.
+        
+    Returns:
+        tuple: (id_venta, cliente, fecha, discos_ids, version) o None si no existe.
+    """
+    resultado = None
+
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT id_venta, 
+                    (detalles_venta).customer_name, 
+                    (detalles_venta).sale_date, 
+                    (detalles_venta).discos_comprados,
+                    version
+                FROM ventas WHERE id_venta = %s;
+            """
+            cur.execute(query, (id_venta,))
+            resultado = cur.fetchone()
+            cur.close()
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al leer la venta: {error}")
 
     return resultado
 
+@medido
 def obtener_lista_generos():
     """ 
     Extrae todos los géneros únicos almacenados en los arrays de la tabla discos.
@@ -231,22 +367,21 @@ def obtener_lista_generos():
     Returns:
         list: Lista de strings con los géneros únicos.
     """
-    conn = get_connection()
     resultados = []
     try:
-        cur = conn.cursor()
-        # unnest expande el array en filas para poder usar DISTINCT
-        query = "SELECT DISTINCT unnest(generos) FROM discos ORDER BY 1;"
-        cur.execute(query)
-        # Convertimos la lista de tuplas en una lista simple de strings
-        resultados = [r[0] for r in cur.fetchall()]
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            # unnest expande el array en filas para poder usar DISTINCT
+            query = "SELECT DISTINCT unnest(generos) FROM discos ORDER BY 1;"
+            cur.execute(query)
+            # Convertimos la lista de tuplas en una lista simple de strings
+            resultados = [r[0] for r in cur.fetchall()]
+            cur.close()
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al obtener géneros: {error}")
-    finally:
-        if conn: conn.close()
     return resultados
 
+@medido
 def obtener_lista_clientes():
     """ 
     Extrae los nombres únicos de los clientes desde el tipo compuesto de ventas.
@@ -254,20 +389,19 @@ def obtener_lista_clientes():
     Returns:
         list: Lista de nombres de clientes.
     """
-    conn = get_connection()
     resultados = []
     try:
-        cur = conn.cursor()
-        query = "SELECT DISTINCT (detalles_venta).customer_name FROM ventas ORDER BY 1;"
-        cur.execute(query)
-        resultados = [r[0] for r in cur.fetchall()]
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = "SELECT DISTINCT (detalles_venta).customer_name FROM ventas ORDER BY 1;"
+            cur.execute(query)
+            resultados = [r[0] for r in cur.fetchall()]
+            cur.close()
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al obtener clientes: {error}")
-    finally:
-        if conn: conn.close()
     return resultados
 
+@medido
 def obtener_lista_titulos_discos():
     """ 
     Obtiene todos los títulos de los discos disponibles en el catálogo.
@@ -275,20 +409,19 @@ def obtener_lista_titulos_discos():
     Returns:
         list: Lista de títulos de discos.
     """
-    conn = get_connection()
     resultados = []
     try:
-        cur = conn.cursor()
-        query = "SELECT titulo FROM discos ORDER BY titulo;"
-        cur.execute(query)
-        resultados = [r[0] for r in cur.fetchall()]
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = "SELECT titulo FROM discos ORDER BY titulo;"
+            cur.execute(query)
+            resultados = [r[0] for r in cur.fetchall()]
+            cur.close()
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"Error al obtener títulos: {error}")
-    finally:
-        if conn: conn.close()
     return resultados
 
+@medido
 def obtener_discos_id_y_titulo():
     """ 
     Obtiene el ID y el título de todos los discos para permitir la selección por ID.
@@ -296,19 +429,474 @@ def obtener_discos_id_y_titulo():
     Returns:
         list: Lista de tuplas (id_disco, titulo).
     """
-    conn = get_connection()
     resultados = []
     try:
-        cur = conn.cursor()
-        cur.execute("SELECT id_disco, titulo FROM discos ORDER BY id_disco;")
-        resultados = cur.fetchall()
-        cur.close()
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT id_disco, titulo FROM discos ORDER BY id_disco;")
+            resultados = cur.fetchall()
+            cur.close()
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"❌ Error al obtener catálogo: {error}")
-    finally:
-        if conn: conn.close()
     return resultados
 
+# --- BÚSQUEDAS POR LOTES ---
+# Resuelven muchas claves en una sola consulta con '= ANY(%s)' (psycopg2 envía la lista
+# de Python como array) y devuelven un diccionario con una entrada por cada clave pedida.
+
+@medido
+def colaboradores_por_titulos(titulos):
+    """ 
+    Versión por lotes de 'consulta_colaboradores'.
+    
+    Args:
+        titulos (list): Títulos de los discos.
+        
+    Returns:
+        dict: {titulo: lista de tuplas (nombre, apellido)}; [] si el título no existe.
+    """
+    resultados = {t: [] for t in titulos}
+    if not resultados:
+        return resultados
+
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT d.titulo, (a.datos_artista).nombre, (a.datos_artista).apellido
+                FROM discos d
+                JOIN artistas a ON a.id_artista = ANY(d.artistas_ids)
+                WHERE d.titulo = ANY(%s);
+            """
+            cur.execute(query, (list(resultados),))
+            for titulo, nombre, apellido in cur.fetchall():
+                resultados[titulo].append((nombre, apellido))
+            cur.close()
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al consultar colaboradores por lotes: {error}")
+
+    return resultados
+
+@medido
+def discos_por_ids(ids_discos):
+    """ 
+    Versión por lotes de 'buscar_disco_por_id', p. ej. para los discos de una venta.
+    
+    Args:
+        ids_discos (list): IDs de los discos.
+        
+    Returns:
+        dict: {id_disco: tupla con los datos del disco o None si no existe}.
+    """
+    resultados = {i: None for i in ids_discos}
+    if not resultados:
+        return resultados
+
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids
+                FROM discos WHERE id_disco = ANY(%s);
+            """
+            cur.execute(query, (list(resultados),))
+            for fila in cur.fetchall():
+                resultados[fila[0]] = fila
+            cur.close()
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al buscar discos por lotes: {error}")
+
+    return resultados
+
+@medido
+def compras_por_clientes(nombres_clientes):
+    """ 
+    Versión por lotes de 'consulta_cliente'.
+    
+    Args:
+        nombres_clientes (list): Nombres de los clientes.
+        
+    Returns:
+        dict: {cliente: lista de tuplas con los títulos comprados}.
+    """
+    resultados = {n: [] for n in nombres_clientes}
+    if not resultados:
+        return resultados
+
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT c.customer_name, d.titulo
+                FROM compras_cliente c
+                JOIN discos d ON d.id_disco = c.id_disco
+                WHERE c.customer_name = ANY(%s)
+                ORDER BY c.customer_name, c.id_venta, c.id_disco;
+            """
+            cur.execute(query, (list(resultados),))
+            for cliente, titulo in cur.fetchall():
+                resultados[cliente].append((titulo,))
+            cur.close()
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al consultar compras por lotes: {error}")
+
+    return resultados
+
+# --- BÚSQUEDA POR PREFIJO Y DIFUSA ---
+# Primero se devuelven, en orden alfabético, los valores que empiezan por el texto
+# (índices B-tree de expresión con COLLATE "C"); si no llegan al límite se completan
+# con coincidencias difusas: por similitud de trigramas si está instalada pg_trgm,
+# o por subcadena si no lo está.
+
+# Límite por defecto de resultados de una búsqueda (pensado para autocompletar)
+LIMITE_BUSQUEDA = 10
+
+# Si pg_trgm está instalada, recordado por conexión: cada conexión ve la base de datos y
+# el esquema con los que se abrió. Un reinicio de la estructura ('crear_estructura'
+# intenta instalar la extensión) olvida lo recordado.
+_trigramas_por_conexion = weakref.WeakKeyDictionary()
+
+def _trigramas_disponibles(cur):
+    """ Comprueba (una vez por conexión) si la extensión pg_trgm está instalada. """
+    hay = _trigramas_por_conexion.get(cur.connection)
+    if hay is None:
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm');")
+        hay = _trigramas_por_conexion[cur.connection] = cur.fetchone()[0]
+    return hay
+
+def _olvidar_trigramas(tabla):
+    """ Oyente de commits: tras un reinicio se vuelve a comprobar si hay pg_trgm. """
+    if tabla is None:
+        _trigramas_por_conexion.clear()
+
+transacciones.registrar_oyente_commit(_olvidar_trigramas)
+
+def _patron_prefijo(texto):
+    """ Patrón LIKE 'texto%' con los comodines del propio texto escapados. """
+    return texto.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+
+def _buscar(sql_prefijo, sql_trigramas, sql_subcadena, texto, limite, descripcion):
+    """
+    Ejecuta una búsqueda por prefijo y la completa con la búsqueda difusa.
+
+    Las tres consultas reciben los parámetros 'patron', 'texto' y 'limite' y deben
+    devolver filas con la misma forma.
+
+    Returns:
+        list: Filas encontradas, las de prefijo primero (lista vacía si falla).
+    """
+    texto = (texto or "").strip().lower()
+    resultados = []
+    if not texto or limite <= 0:
+        return resultados
+
+    params = {"patron": _patron_prefijo(texto), "texto": texto, "limite": limite}
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(sql_prefijo, params)
+            resultados = cur.fetchall()
+            if len(resultados) < limite:
+                cur.execute(sql_trigramas if _trigramas_disponibles(cur) else sql_subcadena, params)
+                vistos = set(resultados)
+                resultados += [f for f in cur.fetchall() if f not in vistos][:limite - len(resultados)]
+            cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al buscar {descripcion}: {error}")
+    return resultados
+
+@medido
+def buscar_titulos(texto, limite=LIMITE_BUSQUEDA):
+    """ 
+    Busca discos por título, sin distinguir mayúsculas.
+    
+    Args:
+        texto (str): Texto escrito por el usuario.
+        limite (int): Máximo de resultados.
+        
+    Returns:
+        list: Tuplas (titulo, id_disco), primero las que empiezan por el texto.
+    """
+    return _buscar(
+        """
+        SELECT titulo, id_disco FROM discos
+        WHERE lower(titulo) COLLATE "C" LIKE %(patron)s
+        ORDER BY lower(titulo) COLLATE "C", id_disco LIMIT %(limite)s;
+        """,
+        """
+        SELECT titulo, id_disco FROM discos
+        WHERE lower(titulo) %% %(texto)s
+        ORDER BY similarity(lower(titulo), %(texto)s) DESC, titulo, id_disco LIMIT %(limite)s;
+        """,
+        """
+        SELECT titulo, id_disco FROM discos
+        WHERE strpos(lower(titulo), %(texto)s) > 0
+        ORDER BY strpos(lower(titulo), %(texto)s), titulo, id_disco LIMIT %(limite)s;
+        """,
+        texto, limite, "títulos")
+
+@medido
+def buscar_clientes(texto, limite=LIMITE_BUSQUEDA):
+    """ 
+    Busca clientes por nombre, sin distinguir mayúsculas.
+    
+    Args:
+        texto (str): Texto escrito por el usuario.
+        limite (int): Máximo de resultados.
+        
+    Returns:
+        list: Nombres de clientes, primero los que empiezan por el texto.
+    """
+    filas = _buscar(
+        # DISTINCT ON sigue el orden del índice: se detiene en cuanto tiene 'limite' clientes
+        """
+        SELECT DISTINCT ON (lower((detalles_venta).customer_name) COLLATE "C") (detalles_venta).customer_name
+        FROM ventas
+        WHERE lower((detalles_venta).customer_name) COLLATE "C" LIKE %(patron)s
+        ORDER BY lower((detalles_venta).customer_name) COLLATE "C" LIMIT %(limite)s;
+        """,
+        """
+        SELECT nombre FROM (
+            SELECT DISTINCT (detalles_venta).customer_name AS nombre FROM ventas
+            WHERE lower((detalles_venta).customer_name) %% %(texto)s
+        ) c
+        ORDER BY similarity(lower(nombre), %(texto)s) DESC, nombre LIMIT %(limite)s;
+        """,
+        """
+        SELECT nombre FROM (
+            SELECT DISTINCT (detalles_venta).customer_name AS nombre FROM ventas
+            WHERE strpos(lower((detalles_venta).customer_name), %(texto)s) > 0
+        ) c
+        ORDER BY strpos(lower(nombre), %(texto)s), nombre LIMIT %(limite)s;
+        """,
+        texto, limite, "clientes")
+    return [f[0] for f in filas]
+
+@medido
+def buscar_artistas(texto, limite=LIMITE_BUSQUEDA):
+    """ 
+    Busca artistas por nombre y apellido dentro del tipo compuesto 'artist_type'.
+    
+    Args:
+        texto (str): Texto escrito por el usuario.
+        limite (int): Máximo de resultados.
+        
+    Returns:
+        list: Tuplas (id_artista, nombre, apellido), primero las que empiezan por el texto.
+    """
+    return _buscar(
+        """
+        SELECT id_artista, (datos_artista).nombre, (datos_artista).apellido FROM artistas
+        WHERE lower(coalesce((datos_artista).nombre, '') || ' ' || coalesce((datos_artista).apellido, ''))
+            COLLATE "C" LIKE %(patron)s
+        ORDER BY lower(coalesce((datos_artista).nombre, '') || ' ' || coalesce((datos_artista).apellido, ''))
+            COLLATE "C", id_artista
+        LIMIT %(limite)s;
+        """,
+        """
+        SELECT id_artista, (datos_artista).nombre, (datos_artista).apellido FROM artistas
+        WHERE lower(coalesce((datos_artista).nombre, '') || ' ' || coalesce((datos_artista).apellido, '')) %% %(texto)s
+        ORDER BY similarity(lower(coalesce((datos_artista).nombre, '') || ' '
+            || coalesce((datos_artista).apellido, '')), %(texto)s) DESC, id_artista
+        LIMIT %(limite)s;
+        """,
+        """
+        SELECT id_artista, (datos_artista).nombre, (datos_artista).apellido FROM artistas
+        WHERE strpos(lower(coalesce((datos_artista).nombre, '') || ' ' || coalesce((datos_artista).apellido, '')),
+            %(texto)s) > 0
+        ORDER BY id_artista LIMIT %(limite)s;
+        """,
+        texto, limite, "artistas")
+
+# --- CONSULTAS POR RANGO DE FECHAS ---
+# El filtro se escribe sobre la misma expresión que la clave de partición
+# ((detalles_venta).sale_date): con ventas particionada por meses PostgreSQL solo
+# recorre las particiones del rango; sin particionar usa el índice idx_ventas_fecha.
+
+@medido
+def ventas_entre_fechas(desde, hasta):
+    """ 
+    Obtiene las ventas realizadas entre dos fechas (ambas incluidas).
+    
+    Args:
+        desde (date): Primera fecha del rango.
+        hasta (date): Última fecha del rango.
+        
+    Returns:
+        list: Tuplas (id_venta, cliente, fecha, discos_ids) ordenadas por fecha.
+    """
+    resultados = []
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT id_venta, 
+                    (detalles_venta).customer_name, 
+                    (detalles_venta).sale_date, 
+                    (detalles_venta).discos_comprados
+                FROM ventas
+                WHERE (detalles_venta).sale_date >= %s AND (detalles_venta).sale_date <= %s
+                ORDER BY (detalles_venta).sale_date, id_venta;
+            """
+            cur.execute(query, (desde, hasta))
+            resultados = cur.fetchall()
+            cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al consultar ventas por fechas: {error}")
+    return resultados
+
+@medido
+def resumen_ventas_por_mes(desde, hasta):
+    """ 
+    Cuenta las ventas y las unidades vendidas de cada mes entre dos fechas (ambas incluidas).
+    
+    Args:
+        desde (date): Primera fecha del rango.
+        hasta (date): Última fecha del rango.
+        
+    Returns:
+        list: Tuplas (primer día del mes, ventas, unidades) ordenadas por mes.
+    """
+    resultados = []
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = """
+                SELECT date_trunc('month', (detalles_venta).sale_date)::DATE AS mes,
+                    count(*),
+                    sum(coalesce(cardinality((detalles_venta).discos_comprados), 0))
+                FROM ventas
+                WHERE (detalles_venta).sale_date >= %s AND (detalles_venta).sale_date <= %s
+                GROUP BY mes ORDER BY mes;
+            """
+            cur.execute(query, (desde, hasta))
+            resultados = cur.fetchall()
+            cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al resumir ventas por mes: {error}")
+    return resultados
+
+# --- LISTADOS PAGINADOS (KEYSET) ---
+# En lugar de OFFSET, cada página continúa a partir de la última clave vista
+# ('despues'), de modo que pedir una página cuesta lo mismo sea cual sea su posición.
+
+def _consultar_pagina(query, params, descripcion):
+    """ Ejecuta la consulta de una página y devuelve sus filas (lista vacía si falla). """
+    resultados = []
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(query, params)
+            resultados = cur.fetchall()
+            cur.close()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al paginar {descripcion}: {error}")
+    return resultados
+
+@medido
+def pagina_generos(despues=None, tam_pagina=TAM_PAGINA_POR_DEFECTO):
+    """ 
+    Devuelve una página de géneros únicos en orden alfabético.
+    Recorre la clave primaria de 'generos_discos' (mantenida por triggers sobre discos)
+    a partir de 'despues'.
+    
+    Args:
+        despues (str): Último género de la página anterior (None para la primera).
+        tam_pagina (int): Número máximo de géneros de la página.
+        
+    Returns:
+        list: Lista de strings con los géneros.
+    """
+    filtro = "WHERE genero > %s" if despues is not None else ""
+    query = f"""
+        SELECT genero FROM generos_discos
+        {filtro} ORDER BY genero LIMIT %s;
+    """
+    params = (despues, tam_pagina) if despues is not None else (tam_pagina,)
+    return [r[0] for r in _consultar_pagina(query, params, "géneros")]
+
+@medido
+def pagina_clientes(despues=None, tam_pagina=TAM_PAGINA_POR_DEFECTO):
+    """ 
+    Devuelve una página de nombres de clientes en orden alfabético.
+    Recorre el índice sobre (detalles_venta).customer_name a partir de 'despues'.
+    
+    Args:
+        despues (str): Último cliente de la página anterior (None para la primera).
+        tam_pagina (int): Número máximo de clientes de la página.
+        
+    Returns:
+        list: Lista de nombres de clientes.
+    """
+    filtro = "WHERE (detalles_venta).customer_name > %s" if despues is not None else ""
+    query = f"""
+        SELECT DISTINCT (detalles_venta).customer_name FROM ventas
+        {filtro} ORDER BY 1 LIMIT %s;
+    """
+    params = (despues, tam_pagina) if despues is not None else (tam_pagina,)
+    return [r[0] for r in _consultar_pagina(query, params, "clientes")]
+
+@medido
+def pagina_titulos_discos(despues=None, tam_pagina=TAM_PAGINA_POR_DEFECTO):
+    """ 
+    Devuelve una página de discos ordenada por título.
+    Como puede haber títulos repetidos, la clave de la página es (titulo, id_disco).
+    
+    Args:
+        despues (tuple): (titulo, id_disco) del último disco de la página anterior.
+        tam_pagina (int): Número máximo de discos de la página.
+        
+    Returns:
+        list: Lista de tuplas (titulo, id_disco).
+    """
+    filtro = "WHERE (titulo, id_disco) > (%s, %s)" if despues is not None else ""
+    query = f"SELECT titulo, id_disco FROM discos {filtro} ORDER BY titulo, id_disco LIMIT %s;"
+    params = (*despues, tam_pagina) if despues is not None else (tam_pagina,)
+    return _consultar_pagina(query, params, "discos")
+
+@medido
+def pagina_discos_por_id(despues=None, tam_pagina=TAM_PAGINA_POR_DEFECTO):
+    """ 
+    Devuelve una página de (id_disco, titulo) ordenada por ID.
+    
+    Args:
+        despues (int): Último ID de la página anterior (None para la primera).
+        tam_pagina (int): Número máximo de discos de la página.
+        
+    Returns:
+        list: Lista de tuplas (id_disco, titulo).
+    """
+    filtro = "WHERE id_disco > %s" if despues is not None else ""
+    query = f"SELECT id_disco, titulo FROM discos {filtro} ORDER BY id_disco LIMIT %s;"
+    params = (despues, tam_pagina) if despues is not None else (tam_pagina,)
+    return _consultar_pagina(query, params, "catálogo")
+
+@medido
+def pagina_ventas(despues=None, tam_pagina=TAM_PAGINA_POR_DEFECTO):
+    """ 
+    Devuelve una página del historial de ventas ordenada por ID.
+    
+    Args:
+        despues (int): Último id_venta de la página anterior (None para la primera).
+        tam_pagina (int): Número máximo de ventas de la página.
+        
+    Returns:
+        list: Lista de tuplas con (id_venta, cliente, fecha, discos_ids).
+    """
+    filtro = "WHERE id_venta > %s" if despues is not None else ""
+    query = f"""
+        SELECT id_venta, 
+            (detalles_venta).customer_name, 
+            (detalles_venta).sale_date, 
+            (detalles_venta).discos_comprados 
+        FROM ventas {filtro} ORDER BY id_venta LIMIT %s;
+    """
+    params = (despues, tam_pagina) if despues is not None else (tam_pagina,)
+    return _consultar_pagina(query, params, "ventas")
+
 if __name__ == "__main__":
     print("--- LISTADO DE ARTISTAS (ID, Nombre, Apellido, Nacionalidad) ---")
     artistas = listar_todos_artistas()
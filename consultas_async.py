@@ -0,0 +1,423 @@
+import asyncio
+import time
+import weakref
+
+import psycopg2
+from psycopg2 import extensions
+import transacciones
+from connection import PARAMETROS_CONEXION, POOL_MAX
+
+# Segundos que puede tardar una operación (incluida la espera por conexión)
+TIMEOUT_POR_DEFECTO = 10
+
+class PoolAsync:
+    """
+    Pool de conexiones asíncronas de psycopg2 para usar desde asyncio.
+
+    Las conexiones se abren en modo asíncrono y se esperan registrando su socket
+    en el bucle de eventos, de forma que cientos de consultas pueden estar en
+    curso a la vez sin hilos. 'maxconn' limita las consultas simultáneas contra
+    PostgreSQL; el resto de tareas esperan su turno.
+    """
+
+    def __init__(self, maxconn=POOL_MAX, **parametros):
+        self.maxconn = maxconn
+        self._parametros = parametros or dict(PARAMETROS_CONEXION)
+        self._huecos = asyncio.Semaphore(maxconn)
+        self._libres = []
+        # Referencia débil: el pool no debe mantener vivo un bucle que ya terminó
+        self._bucle = weakref.ref(asyncio.get_running_loop())
+
+    @property
+    def bucle(self):
+        """ Bucle de eventos al que pertenecen las conexiones (None si ya no existe). """
+        return self._bucle()
+
+    async def _esperar(self, conn):
+        """ Avanza la conexión con poll() hasta que termina la operación en curso. """
+        bucle = asyncio.get_running_loop()
+        while True:
+            estado = conn.poll()
+            if estado == extensions.POLL_OK:
+                return
+            futuro = bucle.create_future()
+            descriptor = conn.fileno()
+            if estado == extensions.POLL_READ:
+                bucle.add_reader(descriptor, futuro.set_result, None)
+                quitar = bucle.remove_reader
+            elif estado == extensions.POLL_WRITE:
+                bucle.add_writer(descriptor, futuro.set_result, None)
+                quitar = bucle.remove_writer
+            else:
+                raise psycopg2.OperationalError(f"Estado de poll() inesperado: {estado}")
+            try:
+                await futuro
+            finally:
+                quitar(descriptor)
+
+    async def _cancelar(self, conn):
+        """
+        Pide al servidor que cancele la consulta en curso. 'cancel()' bloquea (abre otra
+        conexión con el servidor), así que se ejecuta en un hilo y no en el bucle.
+        """
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, conn.cancel)
+        except (Exception, psycopg2.DatabaseError) as error:
+            # La conexión se descarta igualmente: basta con avisar
+            print(f"No se pudo cancelar la consulta: {error}")
+
+    async def _abrir(self):
+        conn = psycopg2.connect(async_=1, **self._parametros)
+        await self._esperar(conn)
+        return conn
+
+    async def obtener(self):
+        """ Espera un hueco libre y devuelve una conexión abierta. """
+        await self._huecos.acquire()
+        try:
+            while self._libres:
+                conn = self._libres.pop()
+                if not conn.closed:
+                    return conn
+            return await self._abrir()
+        except BaseException:
+            self._huecos.release()
+            raise
+
+    def devolver(self, conn, descartar=False):
+        """ Devuelve la conexión al pool; si quedó en mal estado se cierra. """
+        try:
+            if descartar or conn.closed or conn.isexecuting():
+                if not conn.closed:
+                    conn.close()
+            else:
+                self._libres.append(conn)
+        finally:
+            self._huecos.release()
+
+    async def ejecutar(self, comandos, timeout=TIMEOUT_POR_DEFECTO):
+        """
+        Ejecuta una lista de (query, params) en una misma conexión y devuelve las filas
+        del último comando que produzca resultados.
+
+        Si se supera 'timeout' la consulta se cancela en el servidor y la conexión
+        se descarta.
+
+        Args:
+            comandos (list): Lista de tuplas (query, params).
+            timeout (float): Segundos máximos para toda la operación.
+
+        Returns:
+            list: Filas devueltas por el último comando con resultados.
+        """
+        limite = time.monotonic() + timeout
+        conn = await asyncio.wait_for(self.obtener(), timeout)
+        descartar = False
+        try:
+            filas = []
+            cur = conn.cursor()
+            for query, params in comandos:
+                cur.execute(query, params)
+                await asyncio.wait_for(self._esperar(conn), max(limite - time.monotonic(), 0))
+                if cur.description is not None:
+                    filas = cur.fetchall()
+            cur.close()
+            return filas
+        except BaseException:
+            descartar = True
+            if conn.isexecuting():
+                await self._cancelar(conn)
+            raise
+        finally:
+            self.devolver(conn, descartar)
+
+    async def ejecutar_transaccion(self, comandos, timeout=TIMEOUT_POR_DEFECTO):
+        """
+        Como 'ejecutar', pero dentro de BEGIN/COMMIT (las conexiones asíncronas están
+        en autocommit). Cada elemento de 'comandos' es una tupla (query, params) o un
+        callable que recibe el cursor tras el comando anterior y devuelve la siguiente
+        tupla, None para no ejecutar nada o False para hacer ROLLBACK.
+
+        Returns:
+            bool: True si se hizo COMMIT, False si se hizo ROLLBACK.
+        """
+        limite = time.monotonic() + timeout
+        conn = await asyncio.wait_for(self.obtener(), timeout)
+        descartar = False
+        cur = conn.cursor()
+
+        async def enviar(query, params=None):
+            cur.execute(query, params)
+            await asyncio.wait_for(self._esperar(conn), max(limite - time.monotonic(), 0))
+            return cur
+
+        try:
+            await enviar("BEGIN;")
+            anterior = None
+            for comando in comandos:
+                if callable(comando):
+                    comando = comando(anterior)
+                    if comando is False:
+                        await enviar("ROLLBACK;")
+                        return False
+                    if comando is None:
+                        continue
+                query, params = comando
+                anterior = await enviar(query, params)
+            await enviar("COMMIT;")
+            return True
+        except BaseException:
+            # Si la conexión sigue sana se deshace la transacción; si no, se descarta
+            if conn.closed or conn.isexecuting():
+                descartar = True
+                if not conn.closed:
+                    await self._cancelar(conn)
+            else:
+                try:
+                    await enviar("ROLLBACK;")
+                except BaseException:
+                    descartar = True
+            raise
+        finally:
+            cur.close()
+            self.devolver(conn, descartar)
+
+    def cerrar(self):
+        """ Cierra las conexiones libres del pool. """
+        while self._libres:
+            self._libres.pop().close()
+
+# Un pool por bucle de eventos: las conexiones quedan ligadas al bucle que las creó.
+# Se indexa por id(bucle) con una referencia débil al bucle para comprobar que el ID
+# no es de uno anterior. Un WeakKeyDictionary no serviría: el semáforo del pool
+# guarda una referencia fuerte a su bucle y la entrada no se borraría nunca.
+_pools = {}
+
+def _purgar_pools():
+    """ Cierra y olvida los pools de bucles que ya se cerraron o desaparecieron. """
+    for clave, (ref_bucle, pool) in list(_pools.items()):
+        bucle = ref_bucle()
+        if bucle is None or bucle.is_closed():
+            del _pools[clave]
+            pool.cerrar()
+
+def obtener_pool(maxconn=POOL_MAX):
+    """ Devuelve el pool del bucle de eventos actual, creándolo si no existe. """
+    bucle = asyncio.get_running_loop()
+    entrada = _pools.get(id(bucle))
+    if entrada is not None and entrada[0]() is bucle:
+        return entrada[1]
+    _purgar_pools()
+    pool = PoolAsync(maxconn)
+    _pools[id(bucle)] = (weakref.ref(bucle), pool)
+    return pool
+
+async def cerrar_pool():
+    """ Cierra el pool del bucle de eventos actual. """
+    bucle = asyncio.get_running_loop()
+    entrada = _pools.get(id(bucle))
+    if entrada is not None and entrada[0]() is bucle:
+        del _pools[id(bucle)]
+        entrada[1].cerrar()
+
+async def _consultar(query, params, descripcion, timeout):
+    try:
+        return await obtener_pool().ejecutar([(query, params)], timeout)
+    except (Exception, psycopg2.DatabaseError, asyncio.TimeoutError) as error:
+        print(f"Error al {descripcion}: {str(error) or 'tiempo de espera agotado'}")
+        return []
+
+# --- CONSULTAS DE BÚSQUEDA GENERAL ---
+
+async def listar_todos_artistas(timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'consultas.listar_todos_artistas'.
+
+    Returns:
+        list: Lista de tuplas con (id_artista, nombre, apellido, nacionalidad).
+    """
+    query = """
+        SELECT id_artista,
+            (datos_artista).nombre,
+            (datos_artista).apellido,
+            (datos_artista).nacionalidad
+        FROM artistas ORDER BY id_artista;
+    """
+    return await _consultar(query, None, "listar artistas", timeout)
+
+async def listar_todos_discos(timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'consultas.listar_todos_discos'.
+
+    Returns:
+        list: Lista de tuplas con (id_disco, titulo, anio, generos, artistas_ids).
+    """
+    query = "SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids FROM discos ORDER BY id_disco;"
+    return await _consultar(query, None, "listar discos", timeout)
+
+async def listar_todas_ventas(timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'consultas.listar_todas_ventas'.
+
+    Returns:
+        list: Lista de tuplas con (id_venta, cliente, fecha, discos_ids).
+    """
+    query = """
+        SELECT id_venta,
+            (detalles_venta).customer_name,
+            (detalles_venta).sale_date,
+            (detalles_venta).discos_comprados
+        FROM ventas ORDER BY id_venta;
+    """
+    return await _consultar(query, None, "listar ventas", timeout)
+
+# --- CONSULTAS DE BÚSQUEDA ESPECÍFICA ---
+
+async def consulta_generos(genero, timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'consultas.consulta_generos'.
+
+    Args:
+        genero (str): Nombre del género musical.
+
+    Returns:
+        list: Lista de tuplas con (titulo, anio_lanzamiento).
+    """
+    query = "SELECT titulo, anio_lanzamiento FROM discos WHERE generos @> ARRAY[%s]::TEXT[];"
+    return await _consultar(query, (genero,), "consultar géneros", timeout)
+
+async def consulta_cliente(nombre_cliente, timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'consultas.consulta_cliente'.
+
+    Args:
+        nombre_cliente (str): Nombre del cliente.
+
+    Returns:
+        list: Lista de tuplas con los títulos de los discos.
+    """
+    # Misma consulta que la versión síncrona: 'compras_cliente' en lugar de recorrer ventas
+    query = """
+        SELECT d.titulo
+        FROM compras_cliente c
+        JOIN discos d ON d.id_disco = c.id_disco
+        WHERE c.customer_name = %s
+        ORDER BY c.id_venta, c.id_disco;
+    """
+    return await _consultar(query, (nombre_cliente,), "consultar cliente", timeout)
+
+async def consulta_colaboradores(titulo_disco, timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'consultas.consulta_colaboradores'.
+
+    Args:
+        titulo_disco (str): Título del disco.
+
+    Returns:
+        list: Lista de tuplas con (nombre, apellido) de los artistas.
+    """
+    query = """
+        SELECT (a.datos_artista).nombre, (a.datos_artista).apellido
+        FROM artistas a
+        JOIN discos d ON a.id_artista = ANY(d.artistas_ids)
+        WHERE d.titulo = %s;
+    """
+    return await _consultar(query, (titulo_disco,), "consultar colaboradores", timeout)
+
+async def buscar_disco_por_id(id_disco, timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'consultas.buscar_disco_por_id'.
+
+    Args:
+        id_disco (int): ID único del disco.
+
+    Returns:
+        tuple: Tupla con los datos del disco o None si no existe.
+    """
+    query = "SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids FROM discos WHERE id_disco = %s;"
+    filas = await _consultar(query, (id_disco,), "buscar disco por ID", timeout)
+    return filas[0] if filas else None
+
+# --- TRANSACCIONES ---
+
+async def insertar_artista_y_disco(nombre, apellido, nacionalidad, titulo, anio, generos,
+                                   timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'transacciones.insertar_artista_y_disco'.
+
+    Returns:
+        bool: True si la transacción se guardó (COMMIT), False si falló (ROLLBACK).
+    """
+    comandos = [
+        ("INSERT INTO artistas (datos_artista) VALUES ((%s, %s, %s)) RETURNING id_artista;",
+         (nombre, apellido, nacionalidad)),
+        lambda cur: ("INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES (%s, %s, %s, %s);",
+                     (titulo, anio, generos, [cur.fetchone()[0]])),
+    ]
+    try:
+        exito = await obtener_pool().ejecutar_transaccion(comandos, timeout)
+    except (Exception, psycopg2.DatabaseError, asyncio.TimeoutError) as error:
+        print(f"ERROR EN TRANSACCIÓN: {str(error) or 'tiempo de espera agotado'}. Ejecutando ROLLBACK...")
+        return False
+    if exito:
+        transacciones.notificar_commit("artistas", "discos")
+    return exito
+
+async def actualizar_discos_venta(id_venta, nuevos_ids_discos, version=None, timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'transacciones.actualizar_discos_venta'.
+
+    Returns:
+        bool: True si se realizó el COMMIT, False si hubo ROLLBACK.
+    """
+    query = "UPDATE ventas SET detalles_venta.discos_comprados = %s, version = version + 1 WHERE id_venta = %s"
+    params = [nuevos_ids_discos, id_venta]
+    if version is not None:
+        query += " AND version = %s"
+        params.append(version)
+    comandos = [
+        (query + ";", params),
+        lambda cur: None if cur.rowcount > 0 else False,
+    ]
+    try:
+        exito = await obtener_pool().ejecutar_transaccion(comandos, timeout)
+    except (Exception, psycopg2.DatabaseError, asyncio.TimeoutError) as error:
+        print(f"❌ Error en la actualización de discos: {str(error) or 'tiempo de espera agotado'}")
+        return False
+    if exito:
+        transacciones.notificar_commit("ventas")
+    elif version is not None:
+        print(f"⚠️  La venta {id_venta} no existe o la ha modificado otro usuario.")
+    return exito
+
+async def eliminar_venta(id_venta, timeout=TIMEOUT_POR_DEFECTO):
+    """
+    Versión asíncrona de 'transacciones.eliminar_venta'.
+
+    Returns:
+        bool: True si la eliminación fue exitosa, False en caso contrario.
+    """
+    comandos = [
+        ("DELETE FROM ventas WHERE id_venta = %s;", (id_venta,)),
+        lambda cur: None if cur.rowcount > 0 else False,
+    ]
+    try:
+        exito = await obtener_pool().ejecutar_transaccion(comandos, timeout)
+    except (Exception, psycopg2.DatabaseError, asyncio.TimeoutError) as error:
+        print(f"❌ Error al eliminar: {str(error) or 'tiempo de espera agotado'}")
+        return False
+    if exito:
+        transacciones.notificar_commit("ventas")
+    else:
+        print(f"⚠️  No existe la venta con ID {id_venta}.")
+    return exito
+
+if __name__ == "__main__":
+    async def demo():
+        # Cien búsquedas concurrentes multiplexadas en un solo bucle de eventos
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(consulta_generos('Rock') for _ in range(100)))
+        print(f"100 consultas en {time.perf_counter() - inicio:.3f} s -> {resultados[0]}")
+        await cerrar_pool()
+
+    asyncio.run(demo())
@@ -1,18 +1,98 @@
 import psycopg2
+from psycopg2 import sql
+import connection
+import transacciones
 from connection import get_connection
 
-def crear_estructura():
+# Sentencias que recalculan desde cero las tablas mantenidas por triggers
+# (se usan tras cargas masivas hechas con los triggers desactivados)
+RECONSTRUIR_DERIVADAS = (
+    "SELECT reconstruir_compras_cliente();",
+    "SELECT reconstruir_generos_discos();",
+    "SELECT reconstruir_contadores_ventas();",
+)
+
+# Meses por delante del actual para los que se mantienen creadas las particiones de ventas
+MESES_FUTUROS = 3
+
+# Datos de ejemplo con los que se crea la base de datos (y a los que vuelve 'reiniciar_datos')
+DATOS_INICIALES = (
+    # Inserción de los artistas solicitados
+    "INSERT INTO artistas (datos_artista) VALUES (('Connor', 'Kauffman', 'Estadounidense'));",
+    "INSERT INTO artistas (datos_artista) VALUES (('Rawayana', '', 'Venezolana'));",
+    "INSERT INTO artistas (datos_artista) VALUES (('Neomai', '', 'Venezolana'));",
+
+    # Inserción de discos de Connor Kauffman (ID 1)
+    "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Leavin You', 2023, ARRAY['Rock', 'Pop'], ARRAY[1]);",
+
+    # Inserción de discos de Rawayana (ID 2)
+    "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Malportada', 2013, ARRAY['Reggae', 'Rock'], ARRAY[2]);",
+    "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Hora Loca', 2023, ARRAY['Reggae', 'Pop'], ARRAY[2]);",
+
+    # Inserción de discos de Neomai (ID 3)
+    "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Carmesí', 2024, ARRAY['Indie', 'Rock'], ARRAY[3]);",
+    "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Síndrome de Stendhal', 2024, ARRAY['Indie', 'Alternative'], ARRAY[3]);",
+
+    # Registro de una venta de prueba para los clientes que compra discos de Neomai y Rawayana
+    "INSERT INTO ventas (detalles_venta) VALUES (('José Joselito', '2024-05-20', ARRAY[2, 4]));"
+    "INSERT INTO ventas (detalles_venta) VALUES (('Mario el Castañas', '2025-01-23', ARRAY[1, 4, 5]));"
+    "INSERT INTO ventas (detalles_venta) VALUES (('Inés Pérez', '2024-12-24', ARRAY[3]));"
+)
+
+# Tablas que vacía 'reiniciar_datos' (los contadores de ventas los vacía su trigger de TRUNCATE)
+TABLAS_DATOS = ("ventas", "discos", "artistas", "compras_cliente", "generos_discos")
+
+def crear_estructura(con_datos=True, particionada=False):
     """
     Crea la estructura objeto-relacional e inserta los datos
+
+    Args:
+        con_datos (bool): Si es False solo se crean los tipos, tablas e índices,
+            dejando las tablas vacías para una carga masiva posterior.
+        particionada (bool): Si es True la tabla de ventas se particiona por meses
+            según la fecha de venta del tipo compuesto.
     """
-    commands = (
-        # Borrado de tablas y tipos para limpiar la base de datos
+    if particionada:
+        # La clave de partición es la fecha dentro de 'sale_info'. Una clave primaria de una
+        # tabla particionada no puede contener expresiones: 'id_venta' sigue siendo único por
+        # la secuencia y se indexa con un índice normal. Las fechas sin partición mensual
+        # (o nulas) van a 'ventas_default' hasta que 'asegurar_particiones_ventas' las reparte.
+        tabla_ventas = (
+            "CREATE TABLE ventas (id_venta SERIAL NOT NULL, detalles_venta sale_info, version INTEGER NOT NULL DEFAULT 1) PARTITION BY RANGE (((detalles_venta).sale_date));",
+            "CREATE INDEX idx_ventas_id ON ventas (id_venta);",
+            "CREATE TABLE ventas_default PARTITION OF ventas DEFAULT;",
+        )
+    else:
+        tabla_ventas = (
+            "CREATE TABLE ventas (id_venta SERIAL PRIMARY KEY, detalles_venta sale_info, version INTEGER NOT NULL DEFAULT 1);",
+        )
+
+    # Borrado de tablas y tipos para limpiar la base de datos
+    borrados = (
+        "DROP TABLE IF EXISTS compras_cliente CASCADE;",
         "DROP TABLE IF EXISTS ventas CASCADE;",
         "DROP TABLE IF EXISTS discos CASCADE;",
         "DROP TABLE IF EXISTS artistas CASCADE;",
         "DROP TYPE IF EXISTS sale_info CASCADE;",
         "DROP TYPE IF EXISTS artist_type CASCADE;",
+        "DROP FUNCTION IF EXISTS notificar_cambio() CASCADE;",
+        "DROP FUNCTION IF EXISTS mantener_compras_cliente() CASCADE;",
+        "DROP FUNCTION IF EXISTS reconstruir_compras_cliente() CASCADE;",
+        "DROP TABLE IF EXISTS generos_discos CASCADE;",
+        "DROP FUNCTION IF EXISTS mantener_generos_discos() CASCADE;",
+        "DROP FUNCTION IF EXISTS reconstruir_generos_discos() CASCADE;",
+        "DROP TABLE IF EXISTS ventas_por_disco, ventas_por_genero, ventas_por_artista CASCADE;",
+        "DROP FUNCTION IF EXISTS sumar_unidades_vendidas(INTEGER[], BIGINT[]) CASCADE;",
+        "DROP FUNCTION IF EXISTS sumar_unidades_disco(TEXT[], INTEGER[], BIGINT) CASCADE;",
+        "DROP FUNCTION IF EXISTS mantener_contadores_ventas() CASCADE;",
+        "DROP FUNCTION IF EXISTS mantener_contadores_discos() CASCADE;",
+        "DROP FUNCTION IF EXISTS vaciar_contadores_ventas() CASCADE;",
+        "DROP FUNCTION IF EXISTS reconstruir_contadores_ventas() CASCADE;",
+        "DROP FUNCTION IF EXISTS crear_particion_ventas(DATE) CASCADE;",
+        "DROP FUNCTION IF EXISTS asegurar_particiones_ventas(INTEGER) CASCADE;",
+    )
 
+    commands = (
         # Definición del tipo para artistas (nombre, apellido, nacionalidad)
         "CREATE TYPE artist_type AS (nombre VARCHAR(100), apellido VARCHAR(100), nacionalidad VARCHAR(100));",
         
@@ -25,29 +105,360 @@ def crear_estructura():
         # Creación de la tabla de discos con arrays para géneros y artistas
         "CREATE TABLE discos (id_disco SERIAL PRIMARY KEY, titulo VARCHAR(255), anio_lanzamiento INTEGER, generos TEXT[], artistas_ids INTEGER[]);",
         
-        # Creación de la tabla de ventas usando el tipo compuesto
-        "CREATE TABLE ventas (id_venta SERIAL PRIMARY KEY, detalles_venta sale_info);",
+        # Creación de la tabla de ventas usando el tipo compuesto. 'version' se incrementa en
+        # cada modificación del pedido para detectar ediciones concurrentes (bloqueo optimista)
+        *tabla_ventas,
+
+        # Índices GIN sobre los arrays para búsquedas por contenido (operador @>)
+        "CREATE INDEX idx_discos_generos ON discos USING GIN (generos);",
+        "CREATE INDEX idx_discos_artistas_ids ON discos USING GIN (artistas_ids);",
+
+        # Índice de expresión sobre el array dentro del tipo compuesto de ventas
+        "CREATE INDEX idx_ventas_discos_comprados ON ventas USING GIN (((detalles_venta).discos_comprados));",
 
-        # Inserción de los artistas solicitados
-        "INSERT INTO artistas (datos_artista) VALUES (('Connor', 'Kauffman', 'Estadounidense'));",
-        "INSERT INTO artistas (datos_artista) VALUES (('Rawayana', '', 'Venezolana'));",
-        "INSERT INTO artistas (datos_artista) VALUES (('Neomai', '', 'Venezolana'));",
+        # Índice de expresión para filtrar las ventas por cliente sin recorrer la tabla
+        "CREATE INDEX idx_ventas_cliente ON ventas (((detalles_venta).customer_name));",
 
-        # Inserción de discos de Connor Kauffman (ID 1)
-        "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Leavin You', 2023, ARRAY['Rock', 'Pop'], ARRAY[1]);",
+        # Índice para las consultas por rango de fechas (dentro de cada partición si la hay)
+        "CREATE INDEX idx_ventas_fecha ON ventas (((detalles_venta).sale_date));",
 
-        # Inserción de discos de Rawayana (ID 2)
-        "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Malportada', 2013, ARRAY['Reggae', 'Rock'], ARRAY[2]);",
-        "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Hora Loca', 2023, ARRAY['Reggae', 'Pop'], ARRAY[2]);",
+        # Índice para recorrer el catálogo por título página a página
+        "CREATE INDEX idx_discos_titulo ON discos (titulo, id_disco);",
 
-        # Inserción de discos de Neomai (ID 3)
-        "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Carmesí', 2024, ARRAY['Indie', 'Rock'], ARRAY[3]);",
-        "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES ('Síndrome de Stendhal', 2024, ARRAY['Indie', 'Alternative'], ARRAY[3]);",
+        # Índices de expresión para la búsqueda por prefijo sin distinguir mayúsculas.
+        # Con COLLATE "C" el B-tree sirve tanto para LIKE 'texto%' como para ORDER BY.
+        """CREATE INDEX idx_discos_titulo_prefijo ON discos ((lower(titulo) COLLATE "C"), id_disco);""",
+        """CREATE INDEX idx_ventas_cliente_prefijo ON ventas ((lower((detalles_venta).customer_name) COLLATE "C"));""",
+        """
+        CREATE INDEX idx_artistas_nombre_prefijo ON artistas ((lower(coalesce((datos_artista).nombre, '') || ' '
+            || coalesce((datos_artista).apellido, '')) COLLATE "C"), id_artista);
+        """,
 
-        # Registro de una venta de prueba para los clientes que compra discos de Neomai y Rawayana
-        "INSERT INTO ventas (detalles_venta) VALUES (('José Joselito', '2024-05-20', ARRAY[2, 4]));"
-        "INSERT INTO ventas (detalles_venta) VALUES (('Mario el Castañas', '2025-01-23', ARRAY[1, 4, 5]));"
-        "INSERT INTO ventas (detalles_venta) VALUES (('Inés Pérez', '2024-12-24', ARRAY[3]));"
+        # Aviso por el canal 'bdor_cambios' (con el nombre de la tabla) al confirmar cambios,
+        # para que las cachés de la aplicación invaliden solo lo que depende de esa tabla
+        """
+        CREATE FUNCTION notificar_cambio() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('bdor_cambios', TG_TABLE_NAME);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "CREATE TRIGGER trg_artistas_cambios AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON artistas FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio();",
+        "CREATE TRIGGER trg_discos_cambios AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON discos FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio();",
+        "CREATE TRIGGER trg_ventas_cambios AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ventas FOR EACH STATEMENT EXECUTE FUNCTION notificar_cambio();",
+
+        # Tabla desnormalizada cliente -> discos comprados, mantenida por triggers sobre ventas.
+        # La clave empieza por customer_name: las compras de un cliente se leen con el índice
+        # de la clave primaria sin recorrer ventas ni desanidar arrays.
+        """
+        CREATE TABLE compras_cliente (
+            customer_name VARCHAR(100) NOT NULL,
+            id_venta INTEGER NOT NULL,
+            id_disco INTEGER NOT NULL,
+            PRIMARY KEY (customer_name, id_venta, id_disco)
+        );
+        """,
+        "CREATE INDEX idx_compras_cliente_venta ON compras_cliente (id_venta);",
+        """
+        CREATE FUNCTION mantener_compras_cliente() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                DELETE FROM compras_cliente WHERE id_venta = OLD.id_venta;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO compras_cliente (customer_name, id_venta, id_disco)
+                SELECT DISTINCT (NEW.detalles_venta).customer_name, NEW.id_venta, d
+                FROM unnest((NEW.detalles_venta).discos_comprados) AS d
+                WHERE (NEW.detalles_venta).customer_name IS NOT NULL AND d IS NOT NULL;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "CREATE TRIGGER trg_ventas_compras_ins_del AFTER INSERT OR DELETE ON ventas FOR EACH ROW EXECUTE FUNCTION mantener_compras_cliente();",
+        # En las actualizaciones solo se recalcula si ha cambiado el pedido
+        """
+        CREATE TRIGGER trg_ventas_compras_upd AFTER UPDATE ON ventas FOR EACH ROW
+        WHEN (OLD.detalles_venta IS DISTINCT FROM NEW.detalles_venta OR OLD.id_venta <> NEW.id_venta)
+        EXECUTE FUNCTION mantener_compras_cliente();
+        """,
+        """
+        CREATE FUNCTION reconstruir_compras_cliente() RETURNS void AS $$
+        BEGIN
+            TRUNCATE compras_cliente;
+            INSERT INTO compras_cliente (customer_name, id_venta, id_disco)
+            SELECT DISTINCT (v.detalles_venta).customer_name, v.id_venta, d
+            FROM ventas v, unnest((v.detalles_venta).discos_comprados) AS d
+            WHERE (v.detalles_venta).customer_name IS NOT NULL AND d IS NOT NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+
+        # Géneros del catálogo con el número de discos de cada uno, mantenidos por triggers
+        # sobre discos. La lista de géneros se pagina recorriendo su clave primaria, sin
+        # desanidar los géneros de todos los discos en cada página.
+        "CREATE TABLE generos_discos (genero TEXT PRIMARY KEY, discos INTEGER NOT NULL);",
+        """
+        CREATE FUNCTION mantener_generos_discos() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE generos_discos SET discos = discos - 1
+                WHERE genero IN (SELECT g FROM unnest(OLD.generos) AS g);
+                DELETE FROM generos_discos WHERE discos <= 0 AND genero = ANY(OLD.generos);
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO generos_discos AS c (genero, discos)
+                SELECT DISTINCT g, 1 FROM unnest(NEW.generos) AS g WHERE g IS NOT NULL ORDER BY g
+                ON CONFLICT (genero) DO UPDATE SET discos = c.discos + 1;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "CREATE TRIGGER trg_discos_generos_ins_del AFTER INSERT OR DELETE ON discos FOR EACH ROW EXECUTE FUNCTION mantener_generos_discos();",
+        """
+        CREATE TRIGGER trg_discos_generos_upd AFTER UPDATE ON discos FOR EACH ROW
+        WHEN (OLD.generos IS DISTINCT FROM NEW.generos)
+        EXECUTE FUNCTION mantener_generos_discos();
+        """,
+        """
+        CREATE FUNCTION reconstruir_generos_discos() RETURNS void AS $$
+        BEGIN
+            TRUNCATE generos_discos;
+            INSERT INTO generos_discos (genero, discos)
+            SELECT g, count(DISTINCT d.id_disco) FROM discos d, unnest(d.generos) AS g
+            WHERE g IS NOT NULL GROUP BY g;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+
+        # Contadores de unidades vendidas por disco, género y artista (módulo 'analitica').
+        # Cada aparición de un disco en 'discos_comprados' es una unidad; los contadores de
+        # género y artista suman las unidades de los discos que existen con sus géneros y
+        # artistas actuales, por eso también se ajustan cuando cambia un disco.
+        "CREATE TABLE ventas_por_disco (id_disco INTEGER PRIMARY KEY, unidades BIGINT NOT NULL DEFAULT 0);",
+        "CREATE TABLE ventas_por_genero (genero TEXT PRIMARY KEY, unidades BIGINT NOT NULL DEFAULT 0);",
+        "CREATE TABLE ventas_por_artista (id_artista INTEGER PRIMARY KEY, unidades BIGINT NOT NULL DEFAULT 0);",
+        # Los rankings se leen en orden de unidades sin ordenar la tabla entera
+        "CREATE INDEX idx_ventas_por_disco_unidades ON ventas_por_disco (unidades DESC, id_disco);",
+        "CREATE INDEX idx_ventas_por_artista_unidades ON ventas_por_artista (unidades DESC, id_artista);",
+        # Suma 'p_unidades[i]' unidades al disco 'p_discos[i]' y a sus géneros y artistas.
+        # Las filas se actualizan en orden de clave para que dos transacciones concurrentes
+        # no se bloqueen mutuamente.
+        """
+        CREATE FUNCTION sumar_unidades_vendidas(p_discos INTEGER[], p_unidades BIGINT[]) RETURNS void AS $$
+        BEGIN
+            INSERT INTO ventas_por_disco AS c (id_disco, unidades)
+            SELECT u.d, u.n FROM unnest(p_discos, p_unidades) AS u(d, n) ORDER BY u.d
+            ON CONFLICT (id_disco) DO UPDATE SET unidades = c.unidades + EXCLUDED.unidades;
+
+            INSERT INTO ventas_por_genero AS c (genero, unidades)
+            SELECT g, sum(u.n) FROM unnest(p_discos, p_unidades) AS u(d, n)
+            JOIN discos ON discos.id_disco = u.d, unnest(discos.generos) AS g
+            WHERE g IS NOT NULL GROUP BY g ORDER BY g
+            ON CONFLICT (genero) DO UPDATE SET unidades = c.unidades + EXCLUDED.unidades;
+
+            INSERT INTO ventas_por_artista AS c (id_artista, unidades)
+            SELECT a, sum(u.n) FROM unnest(p_discos, p_unidades) AS u(d, n)
+            JOIN discos ON discos.id_disco = u.d, unnest(discos.artistas_ids) AS a
+            WHERE a IS NOT NULL GROUP BY a ORDER BY a
+            ON CONFLICT (id_artista) DO UPDATE SET unidades = c.unidades + EXCLUDED.unidades;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        # Suma 'p_unidades' (puede ser negativo) a cada género y artista de un disco
+        """
+        CREATE FUNCTION sumar_unidades_disco(p_generos TEXT[], p_artistas INTEGER[], p_unidades BIGINT) RETURNS void AS $$
+        BEGIN
+            INSERT INTO ventas_por_genero AS c (genero, unidades)
+            SELECT g, p_unidades * count(*) FROM unnest(p_generos) AS g
+            WHERE g IS NOT NULL GROUP BY g ORDER BY g
+            ON CONFLICT (genero) DO UPDATE SET unidades = c.unidades + EXCLUDED.unidades;
+
+            INSERT INTO ventas_por_artista AS c (id_artista, unidades)
+            SELECT a, p_unidades * count(*) FROM unnest(p_artistas) AS a
+            WHERE a IS NOT NULL GROUP BY a ORDER BY a
+            ON CONFLICT (id_artista) DO UPDATE SET unidades = c.unidades + EXCLUDED.unidades;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        # Triggers por sentencia con tablas de transición: un INSERT de muchas ventas
+        # ajusta cada contador una sola vez. En un UPDATE solo se aplica la diferencia.
+        """
+        CREATE FUNCTION mantener_contadores_ventas() RETURNS trigger AS $$
+        DECLARE
+            v_discos INTEGER[];
+            v_unidades BIGINT[];
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                SELECT array_agg(d), array_agg(n) INTO v_discos, v_unidades FROM (
+                    SELECT d, count(*) AS n
+                    FROM nuevas, unnest((nuevas.detalles_venta).discos_comprados) AS d
+                    WHERE d IS NOT NULL GROUP BY d
+                ) m;
+            ELSIF TG_OP = 'DELETE' THEN
+                SELECT array_agg(d), array_agg(n) INTO v_discos, v_unidades FROM (
+                    SELECT d, -count(*) AS n
+                    FROM viejas, unnest((viejas.detalles_venta).discos_comprados) AS d
+                    WHERE d IS NOT NULL GROUP BY d
+                ) m;
+            ELSE
+                SELECT array_agg(d), array_agg(n) INTO v_discos, v_unidades FROM (
+                    SELECT d, sum(n) AS n FROM (
+                        SELECT d, 1 AS n FROM nuevas, unnest((nuevas.detalles_venta).discos_comprados) AS d
+                        UNION ALL
+                        SELECT d, -1 AS n FROM viejas, unnest((viejas.detalles_venta).discos_comprados) AS d
+                    ) cambios
+                    WHERE d IS NOT NULL GROUP BY d HAVING sum(n) <> 0
+                ) m;
+            END IF;
+            IF v_discos IS NOT NULL THEN
+                PERFORM sumar_unidades_vendidas(v_discos, v_unidades);
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "CREATE TRIGGER trg_ventas_contadores_ins AFTER INSERT ON ventas REFERENCING NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION mantener_contadores_ventas();",
+        "CREATE TRIGGER trg_ventas_contadores_upd AFTER UPDATE ON ventas REFERENCING OLD TABLE AS viejas NEW TABLE AS nuevas FOR EACH STATEMENT EXECUTE FUNCTION mantener_contadores_ventas();",
+        "CREATE TRIGGER trg_ventas_contadores_del AFTER DELETE ON ventas REFERENCING OLD TABLE AS viejas FOR EACH STATEMENT EXECUTE FUNCTION mantener_contadores_ventas();",
+        # Si cambian los géneros o artistas de un disco, sus unidades pasan de los antiguos a los nuevos
+        """
+        CREATE FUNCTION mantener_contadores_discos() RETURNS trigger AS $$
+        DECLARE
+            v_unidades BIGINT;
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                SELECT unidades INTO v_unidades FROM ventas_por_disco WHERE id_disco = OLD.id_disco;
+                IF coalesce(v_unidades, 0) <> 0 THEN
+                    PERFORM sumar_unidades_disco(OLD.generos, OLD.artistas_ids, -v_unidades);
+                END IF;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                SELECT unidades INTO v_unidades FROM ventas_por_disco WHERE id_disco = NEW.id_disco;
+                IF coalesce(v_unidades, 0) <> 0 THEN
+                    PERFORM sumar_unidades_disco(NEW.generos, NEW.artistas_ids, v_unidades);
+                END IF;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "CREATE TRIGGER trg_discos_contadores_ins_del AFTER INSERT OR DELETE ON discos FOR EACH ROW EXECUTE FUNCTION mantener_contadores_discos();",
+        """
+        CREATE TRIGGER trg_discos_contadores_upd AFTER UPDATE ON discos FOR EACH ROW
+        WHEN (OLD.generos IS DISTINCT FROM NEW.generos OR OLD.artistas_ids IS DISTINCT FROM NEW.artistas_ids
+              OR OLD.id_disco <> NEW.id_disco)
+        EXECUTE FUNCTION mantener_contadores_discos();
+        """,
+        # Vaciar ventas o discos deja sin unidades los contadores que dependen de ellos
+        """
+        CREATE FUNCTION vaciar_contadores_ventas() RETURNS trigger AS $$
+        BEGIN
+            IF TG_TABLE_NAME = 'ventas' THEN
+                TRUNCATE ventas_por_disco;
+            END IF;
+            TRUNCATE ventas_por_genero, ventas_por_artista;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        "CREATE TRIGGER trg_ventas_contadores_truncate AFTER TRUNCATE ON ventas FOR EACH STATEMENT EXECUTE FUNCTION vaciar_contadores_ventas();",
+        "CREATE TRIGGER trg_discos_contadores_truncate AFTER TRUNCATE ON discos FOR EACH STATEMENT EXECUTE FUNCTION vaciar_contadores_ventas();",
+        """
+        CREATE FUNCTION reconstruir_contadores_ventas() RETURNS void AS $$
+        BEGIN
+            TRUNCATE ventas_por_disco, ventas_por_genero, ventas_por_artista;
+            INSERT INTO ventas_por_disco (id_disco, unidades)
+            SELECT d, count(*) FROM ventas v, unnest((v.detalles_venta).discos_comprados) AS d
+            WHERE d IS NOT NULL GROUP BY d;
+            INSERT INTO ventas_por_genero (genero, unidades)
+            SELECT g, sum(c.unidades) FROM ventas_por_disco c
+            JOIN discos ON discos.id_disco = c.id_disco, unnest(discos.generos) AS g
+            WHERE g IS NOT NULL GROUP BY g;
+            INSERT INTO ventas_por_artista (id_artista, unidades)
+            SELECT a, sum(c.unidades) FROM ventas_por_disco c
+            JOIN discos ON discos.id_disco = c.id_disco, unnest(discos.artistas_ids) AS a
+            WHERE a IS NOT NULL GROUP BY a;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+    )
+
+    # Particiones mensuales de ventas. Se definen en los dos modos: si ventas no está
+    # particionada 'asegurar_particiones_ventas' no hace nada.
+    funciones_particiones = (
+        # Crea la partición del mes de 'p_mes'. Las ventas de ese mes que estuvieran en la
+        # partición por defecto se trasladan a la nueva con los triggers desactivados:
+        # son las mismas ventas y las tablas derivadas no deben cambiar.
+        """
+        CREATE FUNCTION crear_particion_ventas(p_mes DATE) RETURNS TEXT AS $$
+        DECLARE
+            v_inicio DATE := date_trunc('month', p_mes)::DATE;
+            v_fin DATE := (date_trunc('month', p_mes) + INTERVAL '1 month')::DATE;
+            v_nombre TEXT := 'ventas_' || to_char(p_mes, 'YYYY_MM');
+        BEGIN
+            IF to_regclass(v_nombre) IS NOT NULL THEN
+                RETURN v_nombre;
+            END IF;
+            EXECUTE format('CREATE TABLE %I (LIKE ventas INCLUDING DEFAULTS)', v_nombre);
+            IF EXISTS (SELECT 1 FROM ventas_default
+                       WHERE (detalles_venta).sale_date >= v_inicio AND (detalles_venta).sale_date < v_fin) THEN
+                ALTER TABLE ventas_default DISABLE TRIGGER USER;
+                EXECUTE format('WITH movidas AS (DELETE FROM ventas_default WHERE (detalles_venta).sale_date >= $1 '
+                               'AND (detalles_venta).sale_date < $2 RETURNING *) INSERT INTO %I SELECT * FROM movidas',
+                               v_nombre) USING v_inicio, v_fin;
+                ALTER TABLE ventas_default ENABLE TRIGGER USER;
+            END IF;
+            EXECUTE format('ALTER TABLE ventas ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                           v_nombre, v_inicio, v_fin);
+            RETURN v_nombre;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+        # Crea las particiones de los meses que tienen ventas en la partición por defecto y
+        # las del mes actual y los 'p_meses_futuros' siguientes. Devuelve cuántas ha creado.
+        """
+        CREATE FUNCTION asegurar_particiones_ventas(p_meses_futuros INTEGER) RETURNS INTEGER AS $$
+        DECLARE
+            v_meses DATE[];
+            v_mes DATE;
+            v_creadas INTEGER := 0;
+        BEGIN
+            IF NOT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'ventas'::regclass) THEN
+                RETURN 0;
+            END IF;
+            SELECT array_agg(mes ORDER BY mes) INTO v_meses FROM (
+                SELECT date_trunc('month', (detalles_venta).sale_date)::DATE AS mes
+                FROM ventas_default WHERE (detalles_venta).sale_date IS NOT NULL
+                UNION
+                SELECT generate_series(date_trunc('month', current_date),
+                                       date_trunc('month', current_date) + make_interval(months => p_meses_futuros),
+                                       INTERVAL '1 month')::DATE
+            ) m;
+            FOREACH v_mes IN ARRAY v_meses LOOP
+                IF to_regclass('ventas_' || to_char(v_mes, 'YYYY_MM')) IS NULL THEN
+                    PERFORM crear_particion_ventas(v_mes);
+                    v_creadas := v_creadas + 1;
+                END IF;
+            END LOOP;
+            RETURN v_creadas;
+        END;
+        $$ LANGUAGE plpgsql;
+        """,
+    )
+
+    # Índices de trigramas para la búsqueda difusa. Requieren la extensión pg_trgm, que no
+    # siempre está instalada: si falla, las búsquedas usan coincidencia por subcadena.
+    indices_trigramas = (
+        "CREATE EXTENSION IF NOT EXISTS pg_trgm;",
+        "CREATE INDEX idx_discos_titulo_trgm ON discos USING GIN (lower(titulo) gin_trgm_ops);",
+        "CREATE INDEX idx_ventas_cliente_trgm ON ventas USING GIN (lower((detalles_venta).customer_name) gin_trgm_ops);",
+        """
+        CREATE INDEX idx_artistas_nombre_trgm ON artistas USING GIN ((lower(coalesce((datos_artista).nombre, '') || ' '
+            || coalesce((datos_artista).apellido, ''))) gin_trgm_ops);
+        """,
     )
 
     conn = None
@@ -56,12 +467,37 @@ def crear_estructura():
         conn = get_connection()
         if conn is not None:
             cur = conn.cursor()
+            if connection.ESQUEMA is None:
+                for command in borrados:
+                    cur.execute(command)
+            else:
+                # Con un esquema propio se recrea el esquema entero. Los DROP sueltos no
+                # sirven: con search_path 'esquema, public' borrarían las tablas de public
+                # si el esquema aún no las tiene.
+                esquema = sql.Identifier(connection.ESQUEMA)
+                cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE;").format(esquema))
+                cur.execute(sql.SQL("CREATE SCHEMA {};").format(esquema))
             # Ejecutar cada comando para montar la base de datos
             for command in commands:
                 cur.execute(command)
+            for command in funciones_particiones:
+                cur.execute(command)
+            cur.execute("SAVEPOINT trigramas;")
+            try:
+                for command in indices_trigramas:
+                    cur.execute(command)
+                cur.execute("RELEASE SAVEPOINT trigramas;")
+            except (Exception, psycopg2.DatabaseError) as error:
+                cur.execute("ROLLBACK TO SAVEPOINT trigramas;")
+                print(f"ℹ️  Sin índices de trigramas (pg_trgm no disponible): {str(error).splitlines()[0]}")
+            if con_datos:
+                for command in DATOS_INICIALES:
+                    cur.execute(command)
+            cur.execute("SELECT asegurar_particiones_ventas(%s);", (MESES_FUTUROS,))
             cur.close()
             # Guardar todos los cambios realizados
             conn.commit() 
+            transacciones.notificar_reinicio()
             print("Base de datos configurada con los artistas y canciones solicitados.")
             
     except (Exception, psycopg2.DatabaseError) as error:
@@ -73,5 +509,99 @@ def crear_estructura():
         if conn is not None:
             conn.close()
 
+def reiniciar_datos():
+    """
+    Devuelve la base de datos a los datos iniciales sin recrear la estructura:
+    vacía las tablas con TRUNCATE ... RESTART IDENTITY (los ids vuelven a empezar
+    en 1) y vuelve a insertar DATOS_INICIALES. Es mucho más rápido que
+    'crear_estructura' y no necesita bloqueos sobre tipos ni funciones.
+
+    Si falta alguna tabla (base de datos vacía o de una versión anterior) se
+    recurre a 'crear_estructura'.
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        if conn is not None:
+            cur = conn.cursor()
+            cur.execute("SELECT bool_and(to_regclass(t) IS NOT NULL) FROM unnest(%s::TEXT[]) AS t;", (list(TABLAS_DATOS),))
+            if not cur.fetchone()[0]:
+                cur.close()
+                conn.close()
+                conn = None
+                crear_estructura()
+                return
+            cur.execute(f"TRUNCATE {', '.join(TABLAS_DATOS)} RESTART IDENTITY;")
+            for command in DATOS_INICIALES:
+                cur.execute(command)
+            cur.execute("SELECT asegurar_particiones_ventas(%s);", (MESES_FUTUROS,))
+            cur.close()
+            conn.commit()
+            # Los ids vuelven a empezar: las cachés y el catálogo en memoria se descartan
+            transacciones.notificar_reinicio()
+            print("Datos iniciales restaurados.")
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al reiniciar los datos: {error}")
+        if conn:
+            conn.rollback()
+    finally:
+        if conn is not None:
+            conn.close()
+
+def borrar_esquema():
+    """
+    Elimina el esquema configurado en 'connection.ESQUEMA' con todo su contenido
+    (p. ej. el de un worker de pytest al terminar). No hace nada si no hay esquema
+    configurado: nunca borra el esquema por defecto.
+    """
+    if connection.ESQUEMA is None:
+        return
+    # Las conexiones del pool pueden tener bloqueos o sentencias preparadas sobre el esquema
+    connection.cerrar_pool()
+    conn = get_connection()
+    if conn is None:
+        return
+    try:
+        cur = conn.cursor()
+        cur.execute(sql.SQL("DROP SCHEMA IF EXISTS {} CASCADE;").format(sql.Identifier(connection.ESQUEMA)))
+        cur.close()
+        conn.commit()
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al borrar el esquema {connection.ESQUEMA}: {error}")
+        conn.rollback()
+    finally:
+        conn.close()
+
+def asegurar_particiones(meses_futuros=MESES_FUTUROS):
+    """
+    Crea las particiones mensuales de ventas que falten hasta 'meses_futuros' meses
+    por delante del actual (y reparte lo que haya caído en la partición por defecto).
+    No hace nada si ventas no está particionada.
+
+    Args:
+        meses_futuros (int): Meses por delante del actual que deben tener partición.
+
+    Returns:
+        int: Particiones creadas, o None si hubo un error.
+    """
+    conn = get_connection()
+    if conn is None:
+        return None
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT asegurar_particiones_ventas(%s);", (meses_futuros,))
+        creadas = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+        return creadas
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"Error al crear las particiones de ventas: {error}")
+        conn.rollback()
+        return None
+    finally:
+        conn.close()
+
 if __name__ == "__main__":
-    crear_estructura()
\ No newline at end of file
+    import sys
+    crear_estructura(particionada="--particionada" in sys.argv[1:])
\ No newline at end of file
@@ -0,0 +1,156 @@
+import argparse
+import gzip
+import os
+import sys
+import time
+
+import psycopg2
+from carga_masiva import NULO_CSV, SEPARADOR_ARRAY, TABLAS
+from connection import conexion
+
+# Nivel de gzip: el 6 comprime casi como el 9 a bastante más velocidad
+NIVEL_GZIP = 6
+
+# Consultas de exportación. Los tipos compuestos se aplanan en columnas y los arrays se
+# escriben separados por SEPARADOR_ARRAY, con las mismas columnas que lee carga_masiva.
+# Los NULL (también los de dentro de los arrays) se escriben como NULO_CSV, distinto de
+# la cadena vacía, de modo que un directorio exportado puede volver a cargarse tal cual.
+CONSULTAS_EXPORTACION = {
+    "artistas": """
+        SELECT id_artista,
+            (datos_artista).nombre,
+            (datos_artista).apellido,
+            (datos_artista).nacionalidad
+        FROM artistas ORDER BY id_artista
+    """,
+    "discos": f"""
+        SELECT id_disco, titulo, anio_lanzamiento,
+            array_to_string(generos, '{SEPARADOR_ARRAY}', '{NULO_CSV}') AS generos,
+            array_to_string(artistas_ids, '{SEPARADOR_ARRAY}', '{NULO_CSV}') AS artistas_ids
+        FROM discos ORDER BY id_disco
+    """,
+    # Además de los IDs, cada venta lleva los títulos de sus discos en el mismo orden
+    # (vacío si el disco ya no existe). El LATERAL resuelve cada venta con el índice
+    # de la clave primaria de discos, así que el resultado sale en streaming.
+    "ventas": f"""
+        SELECT v.id_venta,
+            (v.detalles_venta).customer_name,
+            (v.detalles_venta).sale_date,
+            array_to_string((v.detalles_venta).discos_comprados, '{SEPARADOR_ARRAY}', '{NULO_CSV}') AS discos_comprados,
+            t.titulos
+        FROM ventas v
+        LEFT JOIN LATERAL (
+            SELECT string_agg(coalesce(d.titulo, ''), '{SEPARADOR_ARRAY}' ORDER BY u.orden) AS titulos
+            FROM unnest((v.detalles_venta).discos_comprados) WITH ORDINALITY AS u(id_disco, orden)
+            LEFT JOIN discos d ON d.id_disco = u.id_disco
+        ) t ON true
+        ORDER BY v.id_venta
+    """,
+}
+
+def _copiar(cur, tabla, fichero):
+    """ Vuelca una tabla en 'fichero' (binario) con COPY ... TO STDOUT en CSV con cabecera y NULL como NULO_CSV. """
+    cur.copy_expert(f"COPY ({CONSULTAS_EXPORTACION[tabla]}) TO STDOUT WITH (FORMAT csv, HEADER, NULL '{NULO_CSV}');",
+                    fichero)
+    return cur.rowcount
+
+def _abrir(ruta, comprimir):
+    if comprimir:
+        return gzip.open(ruta, "wb", compresslevel=NIVEL_GZIP)
+    return open(ruta, "wb")
+
+def exportar_directorio(directorio, comprimir=False, tablas=TABLAS):
+    """
+    Exporta las tablas a 'directorio' como artistas.csv, discos.csv y ventas.csv
+    (con '.gz' si se comprimen). PostgreSQL genera el CSV y los datos pasan al
+    fichero por bloques, sin cargarse en memoria.
+
+    Todas las tablas se leen de la misma instantánea (REPEATABLE READ), así que el
+    conjunto exportado es coherente aunque haya escrituras mientras tanto.
+
+    Args:
+        directorio (str): Carpeta de destino (se crea si no existe).
+        comprimir (bool): Si es True los ficheros se comprimen con gzip.
+        tablas (tuple): Tablas a exportar.
+
+    Returns:
+        dict: Filas exportadas por tabla (vacío si la exportación falló).
+    """
+    exportadas = {}
+    inicio = time.perf_counter()
+    os.makedirs(directorio, exist_ok=True)
+    extension = ".csv.gz" if comprimir else ".csv"
+
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            # Si ya hay una transacción abierta (p. ej. en los tests) se usa la suya
+            if conn.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY;")
+            for tabla in tablas:
+                with _abrir(os.path.join(directorio, tabla + extension), comprimir) as fichero:
+                    exportadas[tabla] = _copiar(cur, tabla, fichero)
+            cur.close()
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"❌ Error en la exportación: {error}")
+        return {}
+
+    segundos = time.perf_counter() - inicio
+    total = sum(exportadas.values())
+    for tabla, filas in exportadas.items():
+        print(f"  {tabla}: {filas} filas")
+    print(f"✅ {total} filas exportadas en {segundos:.2f} s ({total / max(segundos, 1e-9):,.0f} filas/s)")
+    return exportadas
+
+def exportar_tabla(tabla, destino=None, comprimir=False):
+    """
+    Exporta una sola tabla a un fichero o a la salida estándar.
+
+    Args:
+        tabla (str): 'artistas', 'discos' o 'ventas'.
+        destino (str): Ruta del fichero; None o '-' para la salida estándar.
+        comprimir (bool): Si es True se escribe comprimido con gzip.
+
+    Returns:
+        int: Filas exportadas, o None si hubo un error.
+    """
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            if destino in (None, "-"):
+                salida = sys.stdout.buffer
+                if comprimir:
+                    with gzip.GzipFile(fileobj=salida, mode="wb", compresslevel=NIVEL_GZIP) as fichero:
+                        filas = _copiar(cur, tabla, fichero)
+                else:
+                    filas = _copiar(cur, tabla, salida)
+                salida.flush()
+            else:
+                with _abrir(destino, comprimir) as fichero:
+                    filas = _copiar(cur, tabla, fichero)
+            cur.close()
+            return filas
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        # La salida estándar puede llevar los datos: el error va a stderr
+        print(f"❌ Error al exportar {tabla}: {error}", file=sys.stderr)
+        return None
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exportación en streaming con COPY TO STDOUT.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    p_dir = sub.add_parser("directorio", help="Exporta todas las tablas a una carpeta (recargable con carga_masiva).")
+    p_dir.add_argument("directorio")
+    p_dir.add_argument("--gzip", action="store_true", help="Comprime los ficheros (.csv.gz).")
+
+    p_tab = sub.add_parser("tabla", help="Exporta una tabla a un fichero o a la salida estándar.")
+    p_tab.add_argument("tabla", choices=TABLAS)
+    p_tab.add_argument("-o", "--salida", default="-", help="Fichero de destino ('-' = salida estándar).")
+    p_tab.add_argument("--gzip", action="store_true", help="Comprime la salida con gzip.")
+
+    args = parser.parse_args()
+    if args.comando == "directorio":
+        sys.exit(0 if exportar_directorio(args.directorio, args.gzip) else 1)
+    sys.exit(0 if exportar_tabla(args.tabla, args.salida, args.gzip) is not None else 1)
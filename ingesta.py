@@ -0,0 +1,146 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import transacciones
+
+# Ventas que se escriben como máximo en cada transacción
+TAM_LOTE_VENTAS = 500
+
+# Milisegundos que se espera a que lleguen más ventas antes de escribir un lote incompleto
+ESPERA_MAX_MS = 5
+
+class EscritorVentas(threading.Thread):
+    """
+    Hilo que agrupa las ventas que llegan de muchos hilos y las escribe por lotes
+    (group commit): un INSERT multi-fila y un solo COMMIT por lote, en lugar de
+    una transacción y una espera de disco por venta.
+
+    Un lote se escribe al reunir 'tam_lote' ventas o cuando pasan 'espera_ms'
+    desde la primera, lo que ocurra antes. Cada llamada a 'registrar' recibe un
+    Future que se resuelve con el ID de su venta (o None si no se pudo guardar).
+    """
+
+    def __init__(self, tam_lote=TAM_LOTE_VENTAS, espera_ms=ESPERA_MAX_MS):
+        super().__init__(name="escritor-ventas", daemon=True)
+        self.tam_lote = tam_lote
+        self.espera_ms = espera_ms
+        self._cola = queue.Queue()
+        self._parar = threading.Event()
+        # Hace atómicos la comprobación de '_parar' y el encolado en 'registrar'
+        self._lock = threading.Lock()
+        self.lotes = 0
+        self.ventas = 0
+
+    def registrar(self, cliente, fecha, ids_discos):
+        """
+        Encola una venta para el siguiente lote.
+
+        Args:
+            cliente (str): Nombre del cliente.
+            fecha (date|str): Fecha de la venta (None para la fecha actual).
+            ids_discos (list): IDs de los discos comprados.
+
+        Returns:
+            Future: Se resuelve con el ID de la venta, o None si no se guardó.
+        """
+        futuro = Future()
+        with self._lock:
+            if self._parar.is_set():
+                futuro.set_result(None)
+            else:
+                self._cola.put(((cliente, fecha, list(ids_discos)), futuro))
+        return futuro
+
+    def run(self):
+        try:
+            # Al detenerse se terminan de escribir las ventas que ya estaban en la cola
+            while not (self._parar.is_set() and self._cola.empty()):
+                try:
+                    lote = [self._cola.get(timeout=0.1)]
+                except queue.Empty:
+                    continue
+                limite = time.monotonic() + self.espera_ms / 1000
+                while len(lote) < self.tam_lote:
+                    restante = limite - time.monotonic()
+                    try:
+                        lote.append(self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait())
+                    except queue.Empty:
+                        break
+                self._escribir(lote)
+        finally:
+            self._descartar_pendientes()
+
+    def _descartar_pendientes(self):
+        """ Resuelve con None los Future de las ventas que quedan en la cola sin escribir. """
+        while True:
+            try:
+                _, futuro = self._cola.get_nowait()
+            except queue.Empty:
+                return
+            if not futuro.done():
+                futuro.set_result(None)
+
+    def _escribir(self, lote):
+        ids = transacciones.registrar_ventas([venta for venta, _ in lote], tam_lote=self.tam_lote)
+        if not ids and len(lote) > 1:
+            # Una venta errónea deshace todo su lote: se reintentan una a una para
+            # que solo falle ella
+            for elemento in lote:
+                self._escribir([elemento])
+            return
+        self.lotes += 1
+        self.ventas += len(ids)
+        for (_, futuro), id_venta in zip(lote, ids or [None] * len(lote)):
+            futuro.set_result(id_venta)
+
+    def detener(self):
+        """ Escribe las ventas pendientes, termina el hilo y espera a que lo haga. """
+        with self._lock:
+            self._parar.set()
+        if self.is_alive():
+            self.join()
+        else:
+            # Sin hilo (no se arrancó o ya terminó) nadie escribirá lo encolado
+            self._descartar_pendientes()
+
+_escritor = None
+_escritor_lock = threading.Lock()
+
+def iniciar_escritor(tam_lote=TAM_LOTE_VENTAS, espera_ms=ESPERA_MAX_MS):
+    """
+    Arranca (una sola vez) el escritor de ventas global.
+
+    Returns:
+        EscritorVentas: El hilo escritor en ejecución.
+    """
+    global _escritor
+    with _escritor_lock:
+        if _escritor is None or not _escritor.is_alive():
+            _escritor = EscritorVentas(tam_lote, espera_ms)
+            _escritor.start()
+        return _escritor
+
+def detener_escritor():
+    """ Escribe lo pendiente y detiene el escritor de ventas global si está en marcha. """
+    global _escritor
+    with _escritor_lock:
+        if _escritor is not None:
+            _escritor.detener()
+            _escritor = None
+
+def registrar_venta(cliente, fecha, ids_discos, timeout=None):
+    """
+    Registra una venta a través del escritor global y espera a que se confirme.
+
+    Args:
+        cliente (str): Nombre del cliente.
+        fecha (date|str): Fecha de la venta (None para la fecha actual).
+        ids_discos (list): IDs de los discos comprados.
+        timeout (float): Segundos máximos de espera (None = sin límite).
+
+    Returns:
+        int: ID de la venta creada, o None si no se guardó.
+    """
+    return iniciar_escritor().registrar(cliente, fecha, ids_discos).result(timeout)
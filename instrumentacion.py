@@ -0,0 +1,214 @@
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from psycopg2 import extensions
+
+# Límites superiores (en ms) de los cubos del histograma de latencias
+CUBOS_MS = (0.25, 0.5, 1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, float("inf"))
+
+# Las consultas que superen este tiempo se escriben en el log de consultas lentas
+UMBRAL_LENTA_MS = 200
+
+# Nombre de la operación en curso (lo fija el decorador 'medido')
+_consulta_actual = contextvars.ContextVar("consulta_actual", default=None)
+
+log_lentas = logging.getLogger("bdor.consultas_lentas")
+
+class _Histograma:
+    """ Histograma de latencias con cubos fijos más contadores de total, mínimo y máximo. """
+
+    def __init__(self):
+        self.cubos = [0] * len(CUBOS_MS)
+        self.n = 0
+        self.total_ms = 0.0
+        self.min_ms = None
+        self.max_ms = 0.0
+
+    def anotar(self, ms):
+        self.cubos[bisect.bisect_left(CUBOS_MS, ms)] += 1
+        self.n += 1
+        self.total_ms += ms
+        self.min_ms = ms if self.min_ms is None else min(self.min_ms, ms)
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentil(self, p):
+        """ Percentil aproximado: límite superior del cubo en el que cae (acotado por el máximo). """
+        if self.n == 0:
+            return 0.0
+        objetivo = self.n * p / 100
+        acumulado = 0
+        for limite, cuenta in zip(CUBOS_MS, self.cubos):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return min(limite, self.max_ms)
+        return self.max_ms
+
+    def resumen(self):
+        return {
+            "n": self.n,
+            "media_ms": round(self.total_ms / self.n, 3) if self.n else 0.0,
+            "min_ms": round(self.min_ms or 0.0, 3),
+            "p50_ms": round(self.percentil(50), 3),
+            "p95_ms": round(self.percentil(95), 3),
+            "p99_ms": round(self.percentil(99), 3),
+            "max_ms": round(self.max_ms, 3),
+        }
+
+class _MetricasConsulta:
+    def __init__(self):
+        self.ejecucion = _Histograma()
+        self.checkout = _Histograma()
+        self.filas = 0
+        self.errores = 0
+        self.lentas = 0
+
+_metricas = {}
+_lock = threading.Lock()
+
+def _metricas_de(nombre):
+    metricas = _metricas.get(nombre)
+    if metricas is None:
+        metricas = _metricas.setdefault(nombre, _MetricasConsulta())
+    return metricas
+
+def _nombre_actual(query=None):
+    """ Nombre de la operación en curso o, si no hay, el inicio del SQL. """
+    nombre = _consulta_actual.get()
+    if nombre is None and query is None:
+        nombre = "(sin nombre)"
+    elif nombre is None:
+        texto = query.decode() if isinstance(query, bytes) else str(query or "")
+        nombre = "sql: " + " ".join(texto.split())[:40]
+    return nombre
+
+def medido(funcion):
+    """
+    Decorador que etiqueta con el nombre de la función todas las consultas que se
+    ejecuten durante la llamada, para agruparlas en las métricas.
+    """
+    @functools.wraps(funcion)
+    def envoltorio(*args, **kwargs):
+        token = _consulta_actual.set(funcion.__name__)
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            _consulta_actual.reset(token)
+    return envoltorio
+
+@contextmanager
+def nombre_consulta(nombre):
+    """ Context manager equivalente a 'medido' para un bloque concreto. """
+    token = _consulta_actual.set(nombre)
+    try:
+        yield
+    finally:
+        _consulta_actual.reset(token)
+
+def registrar_ejecucion(query, segundos, filas, error=False):
+    """
+    Anota la ejecución de una sentencia y, si supera el umbral, la escribe en el log
+    de consultas lentas.
+
+    Args:
+        query (str|bytes): Sentencia ejecutada.
+        segundos (float): Tiempo de ejecución.
+        filas (int): Filas devueltas o afectadas (-1 si no se conocen).
+        error (bool): True si la sentencia falló.
+    """
+    nombre = _nombre_actual(query)
+    ms = segundos * 1000
+    lenta = ms >= UMBRAL_LENTA_MS
+    with _lock:
+        metricas = _metricas_de(nombre)
+        metricas.ejecucion.anotar(ms)
+        if filas and filas > 0:
+            metricas.filas += filas
+        if error:
+            metricas.errores += 1
+        if lenta:
+            metricas.lentas += 1
+    if lenta:
+        texto = query.decode() if isinstance(query, bytes) else str(query)
+        log_lentas.warning("%s %.1f ms filas=%s %s", nombre, ms, filas, " ".join(texto.split())[:500])
+
+def registrar_checkout(segundos):
+    """ Anota el tiempo que se esperó para obtener una conexión del pool. """
+    nombre = _nombre_actual()
+    with _lock:
+        _metricas_de(nombre).checkout.anotar(segundos * 1000)
+
+class CursorInstrumentado(extensions.cursor):
+    """ Cursor que mide cada 'execute' y lo anota en las métricas. """
+
+    def execute(self, query, vars=None):
+        error = False
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        except Exception:
+            error = True
+            raise
+        finally:
+            registrar_ejecucion(query, time.perf_counter() - inicio, self.rowcount, error)
+
+def configurar_log_lentas(ruta, umbral_ms=None):
+    """
+    Envía el log de consultas lentas a un fichero y, opcionalmente, cambia el umbral.
+
+    Args:
+        ruta (str): Fichero donde se añaden las consultas lentas.
+        umbral_ms (float): Nuevo umbral en milisegundos.
+    """
+    global UMBRAL_LENTA_MS
+    if umbral_ms is not None:
+        UMBRAL_LENTA_MS = umbral_ms
+    for manejador in list(log_lentas.handlers):
+        log_lentas.removeHandler(manejador)
+        manejador.close()
+    manejador = logging.FileHandler(ruta, encoding="utf-8")
+    manejador.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    log_lentas.addHandler(manejador)
+    log_lentas.setLevel(logging.WARNING)
+    log_lentas.propagate = False
+
+def resumen():
+    """
+    Devuelve las métricas acumuladas por operación.
+
+    Returns:
+        dict: {nombre: {ejecucion, checkout, filas, errores, lentas}}.
+    """
+    with _lock:
+        return {
+            nombre: {
+                "ejecucion": m.ejecucion.resumen(),
+                "checkout": m.checkout.resumen(),
+                "filas": m.filas,
+                "errores": m.errores,
+                "lentas": m.lentas,
+            }
+            for nombre, m in sorted(_metricas.items())
+        }
+
+def imprimir_resumen():
+    """ Muestra por pantalla una tabla con las métricas de cada operación. """
+    datos = resumen()
+    if not datos:
+        print("ℹ️  Todavía no se ha ejecutado ninguna consulta.")
+        return
+    print(f"  {'Operación':<32} {'n':>6} {'p50 ms':>9} {'p95 ms':>9} {'máx ms':>9} "
+          f"{'filas':>8} {'checkout ms':>12} {'lentas':>6} {'errores':>7}")
+    for nombre, m in datos.items():
+        e = m["ejecucion"]
+        print(f"  {nombre[:32]:<32} {e['n']:>6} {e['p50_ms']:>9.3f} {e['p95_ms']:>9.3f} {e['max_ms']:>9.3f} "
+              f"{m['filas']:>8} {m['checkout']['media_ms']:>12.3f} {m['lentas']:>6} {m['errores']:>7}")
+
+def reiniciar():
+    """ Borra todas las métricas acumuladas. """
+    with _lock:
+        _metricas.clear()
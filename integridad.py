@@ -0,0 +1,162 @@
+import argparse
+import sys
+
+import psycopg2
+import transacciones
+from connection import conexion
+from instrumentacion import medido
+
+# Filas que se revisan (y como mucho se reparan) en cada transacción
+TAM_BLOQUE = 10000
+
+# Arrays de IDs sin clave foránea que se comprueban. Por cada tabla: clave por la que se
+# recorre, expresión del array, destino del SET al repararlo, tabla y clave referenciadas
+# y asignaciones extra al reparar.
+COMPROBACIONES = {
+    "ventas": {
+        "clave": "id_venta",
+        "array": "(detalles_venta).discos_comprados",
+        "destino": "detalles_venta.discos_comprados",
+        "referencia": ("discos", "id_disco"),
+        "extra": ", version = version + 1",
+    },
+    "discos": {
+        "clave": "id_disco",
+        "array": "artistas_ids",
+        "destino": "artistas_ids",
+        "referencia": ("artistas", "id_artista"),
+        "extra": "",
+    },
+}
+
+def _sql_comprobacion(tabla, c):
+    """ Consultas de una comprobación: límite del bloque, anti-join y reparación. """
+    ref_tabla, ref_clave = c["referencia"]
+    limite = f"""
+        SELECT max({c['clave']}), count(*) FROM (
+            SELECT {c['clave']} FROM {tabla} WHERE {c['clave']} > %s ORDER BY {c['clave']} LIMIT %s
+        ) b;
+    """
+    # Anti-join: cada ID desanidado sin fila en la tabla referenciada es una referencia rota
+    rotas = f"""
+        SELECT t.{c['clave']}, array_agg(DISTINCT u.id ORDER BY u.id)
+        FROM {tabla} t CROSS JOIN LATERAL unnest({c['array']}) AS u(id)
+        WHERE t.{c['clave']} > %s AND t.{c['clave']} <= %s
+          AND u.id IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM {ref_tabla} r WHERE r.{ref_clave} = u.id)
+        GROUP BY t.{c['clave']};
+    """
+    # El array se recalcula desde la fila vigente: lo que se haya cambiado entretanto se conserva
+    reparar = f"""
+        UPDATE {tabla} SET {c['destino']} = ARRAY(
+                SELECT u.id FROM unnest({c['array']}) WITH ORDINALITY AS u(id, n)
+                WHERE u.id IS NULL OR EXISTS (SELECT 1 FROM {ref_tabla} r WHERE r.{ref_clave} = u.id)
+                ORDER BY u.n
+            ){c['extra']}
+        WHERE {c['clave']} = ANY(%s);
+    """
+    return limite, rotas, reparar
+
+def _informar(tabla, resultado, maximo):
+    porcentaje = 100 * resultado["ultimo_id"] / maximo if maximo else 100
+    print(f"  {tabla}: {resultado['revisadas']} filas revisadas ({porcentaje:.0f} %), "
+          f"{resultado['filas_rotas']} con referencias rotas, {resultado['reparadas']} reparadas")
+
+@medido
+def comprobar_tabla(tabla, reparar=False, tam_bloque=TAM_BLOQUE, progreso=_informar):
+    """
+    Busca en 'tabla' los IDs de su array que no existen en la tabla referenciada.
+
+    La tabla se recorre por bloques de 'tam_bloque' filas en orden de clave
+    (keyset), cada uno en su propia transacción corta, así que nunca se mantiene
+    una instantánea ni bloqueos durante todo el recorrido.
+
+    Args:
+        tabla (str): 'ventas' (discos_comprados) o 'discos' (artistas_ids).
+        reparar (bool): Si es True se quitan de los arrays los IDs rotos, bloque a bloque.
+        tam_bloque (int): Filas por bloque.
+        progreso (callable): Función (tabla, resultado, id_maximo) que se llama tras
+            cada bloque; None para no informar.
+
+    Returns:
+        dict: Con 'revisadas', 'filas_rotas', 'ids_rotos' (IDs inexistentes distintos),
+            'reparadas' y 'ultimo_id' (clave de la última fila revisada); diccionario
+            vacío si hubo un error.
+    """
+    c = COMPROBACIONES[tabla]
+    sql_limite, sql_rotas, sql_reparar = _sql_comprobacion(tabla, c)
+    resultado = {"revisadas": 0, "filas_rotas": 0, "ids_rotos": set(), "reparadas": 0, "ultimo_id": 0}
+
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(f"SELECT max({c['clave']}) FROM {tabla};")
+            maximo = cur.fetchone()[0] or 0
+            conn.commit()
+            cur.close()
+
+        while True:
+            with conexion() as conn:
+                cur = conn.cursor()
+                cur.execute(sql_limite, (resultado["ultimo_id"], tam_bloque))
+                hasta, filas = cur.fetchone()
+                if not filas:
+                    conn.commit()
+                    break
+
+                cur.execute(sql_rotas, (resultado["ultimo_id"], hasta))
+                rotas = cur.fetchall()
+                if rotas and reparar:
+                    cur.execute(sql_reparar, ([fila[0] for fila in rotas],))
+                    resultado["reparadas"] += cur.rowcount
+                conn.commit()
+                cur.close()
+
+            resultado["revisadas"] += filas
+            resultado["filas_rotas"] += len(rotas)
+            for _, ids in rotas:
+                resultado["ids_rotos"].update(ids)
+            resultado["ultimo_id"] = hasta
+            if progreso is not None:
+                progreso(tabla, resultado, maximo)
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"❌ Error al comprobar {tabla}: {error}")
+        return {}
+
+    if resultado["reparadas"]:
+        # La reparación cambia arrays de filas existentes: no es un alta que las copias
+        # locales (caché, catálogo en memoria) puedan aplicar por partes
+        transacciones.notificar_reinicio()
+    resultado["ids_rotos"] = sorted(resultado["ids_rotos"])
+    return resultado
+
+def comprobar_integridad(reparar=False, tam_bloque=TAM_BLOQUE, progreso=_informar):
+    """
+    Comprueba (y opcionalmente repara) los arrays de IDs de ventas y discos.
+
+    Returns:
+        dict: {tabla: resultado de 'comprobar_tabla'}.
+    """
+    return {tabla: comprobar_tabla(tabla, reparar, tam_bloque, progreso) for tabla in COMPROBACIONES}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Busca IDs inexistentes en los arrays discos_comprados y artistas_ids.")
+    parser.add_argument("--reparar", action="store_true", help="Quita de los arrays los IDs que no existen.")
+    parser.add_argument("--bloque", type=int, default=TAM_BLOQUE, help="Filas revisadas por transacción.")
+    parser.add_argument("--tablas", nargs="+", choices=tuple(COMPROBACIONES), default=tuple(COMPROBACIONES))
+    args = parser.parse_args()
+
+    correcto = True
+    for tabla in args.tablas:
+        res = comprobar_tabla(tabla, args.reparar, args.bloque)
+        if not res:
+            correcto = False
+        elif res["filas_rotas"]:
+            ref = COMPROBACIONES[tabla]["referencia"][0]
+            reparadas = f" ({res['reparadas']} reparadas)" if args.reparar else ""
+            print(f"⚠️  {tabla}: {res['filas_rotas']} filas apuntan a {ref} inexistentes: {res['ids_rotos']}{reparadas}")
+            correcto = correcto and res["reparadas"] == res["filas_rotas"]
+        else:
+            print(f"✅ {tabla}: sin referencias rotas.")
+    sys.exit(0 if correcto else 1)
@@ -1,12 +1,84 @@
+import os
+import sys
+
+import analitica
+import cache
+import catalogo
+import cli
 import crear_bbdd
+import instrumentacion
 import consultas
+import sesion as sesion_menu
 import transacciones
 
+# Elementos que se muestran por página en los listados del menú
+TAM_PAGINA = 20
+
+def paginar(obtener_pagina, clave, formatear, pregunta, numerar=True, sesion=None):
+    """ 
+    Muestra un listado página a página y devuelve la respuesta del usuario.
+    Solo se muestra la siguiente página cuando el usuario pide ver más ('m'); con
+    una sesión, se precarga mientras el usuario lee la actual.
+    
+    Args:
+        obtener_pagina (callable): Función (despues, tam_pagina) que devuelve una página.
+        clave (callable): Extrae de un elemento el cursor 'despues' de la página siguiente.
+        formatear (callable): Devuelve el texto con el que se imprime cada elemento.
+        pregunta (str): Texto de la pregunta final.
+        numerar (bool): Si es True cada elemento se imprime con su número de selección.
+        sesion (SesionMenu): Sesión del menú que precarga las páginas (opcional).
+        
+    Returns:
+        tuple: (respuesta, elementos mostrados); respuesta es None si no hay elementos.
+    """
+    mostrados = []
+    despues = None
+    while True:
+        if sesion is not None:
+            pagina = sesion.pagina(obtener_pagina, despues, TAM_PAGINA)
+        else:
+            pagina = obtener_pagina(despues, TAM_PAGINA)
+        for elem in pagina:
+            mostrados.append(elem)
+            prefijo = f"{len(mostrados)}. " if numerar else ""
+            print(f"  {prefijo}{formatear(elem)}")
+        if not mostrados:
+            return None, mostrados
+
+        hay_mas = len(pagina) == TAM_PAGINA
+        if hay_mas and sesion is not None:
+            sesion.precargar(obtener_pagina, clave(pagina[-1]), TAM_PAGINA)
+        sufijo = " ('m' para ver más)" if hay_mas else ""
+        respuesta = input(f"\n👉 {pregunta}{sufijo}: ").strip()
+        if hay_mas and respuesta.lower() == "m":
+            despues = clave(pagina[-1])
+            continue
+        return respuesta, mostrados
+
+def elegir(respuesta, mostrados):
+    """ Devuelve el elemento cuyo número tecleó el usuario, o None si no es válido. """
+    try:
+        sel = int(respuesta) - 1
+    except (TypeError, ValueError):
+        return None
+    return mostrados[sel] if 0 <= sel < len(mostrados) else None
+
 def main():
     """ 
     Punto de entrada principal de la aplicación. Gestiona el menú y 
     las llamadas a los módulos de BDOR, consultas y transacciones.
     """
+    # Una sola sesión para todo el menú: conexiones abiertas de antemano y precarga de listados
+    sesion = sesion_menu.SesionMenu()
+    # Los listados del menú se sirven desde la caché, que se invalida con los avisos de la BD
+    cache.iniciar_escucha()
+    # Si ventas está particionada, se crean las particiones de los próximos meses
+    crear_bbdd.asegurar_particiones()
+    # Las consultas que superen el umbral se anotan en este fichero
+    instrumentacion.configurar_log_lentas("consultas_lentas.log")
+    # Con BDOR_CATALOGO_MEMORIA=1 los géneros y colaboradores se responden desde memoria
+    if os.environ.get("BDOR_CATALOGO_MEMORIA") == "1":
+        catalogo.activar()
     while True:
         print("""
     ==========================================================
@@ -21,73 +93,80 @@ def main():
         7. 🧨 Forzar Error de ID Duplicado (ROLLBACK)
         8. 📝 Actualizar Cliente en Pedido
         9. 🗑️  Eliminar un Pedido
+       10. 📊 Ver Métricas de Consultas
+       11. 🏆 Ver Rankings de Ventas
         0. 🚪 Salir
     =========================================================="""
         )
         
+        # Mientras el usuario elige, se piden en segundo plano las primeras páginas
+        sesion.precargar_menu(TAM_PAGINA)
         opcion = input("👉 Seleccione una opción: ")
 
         if opcion == "1":
             try:
-                crear_bbdd.crear_estructura()
-                print("\n✅ Estructura y datos iniciales cargados correctamente.")
+                # Vacía las tablas y vuelve a cargar los datos iniciales (solo recrea la
+                # estructura si falta alguna tabla)
+                crear_bbdd.reiniciar_datos()
+                print("\n✅ Datos iniciales cargados correctamente.")
             except Exception as e:
                 print(f"\n❌ Error al reiniciar la base de datos: {e}")
 
         elif opcion == "2":
             print("\nℹ️  LISTADO COMPLETO DE LA BASE DE DATOS:")
+            # Se recorren con cursores de servidor: las filas se imprimen según llegan
             # Artistas
-            artistas = consultas.listar_todos_artistas()
+            artistas = consultas.iterar_artistas()
             print("\n--- Artistas ---")
             for a in artistas: print(f"  ID: {a[0]} | {a[1]} {a[2]} ({a[3]})")
             # Discos
-            discos = consultas.listar_todos_discos()
+            discos = consultas.iterar_discos()
             print("\n--- Discos ---")
             for d in discos: print(f"  ID: {d[0]} | {d[1]} | Géneros: {d[3]}")
             # Ventas
-            ventas = consultas.listar_todas_ventas()
+            ventas = consultas.iterar_ventas()
             print("\n--- Ventas ---")
             for v in ventas: print(f"  Venta {v[0]}: {v[1]} compró {v[3]}")
 
         elif opcion == "3":
             print("\n🔍 GÉNEROS DISPONIBLES:")
-            lista = consultas.obtener_lista_generos()
+            resp, lista = paginar(cache.pagina_generos, lambda g: g, lambda g: g,
+                                  "Elija el número del género", sesion=sesion)
             if not lista:
                 print("⚠️  No hay géneros registrados.")
             else:
-                for i, g in enumerate(lista, 1): print(f"  {i}. {g}")
-                sel = int(input("\n👉 Elija el número del género: ")) - 1
-                if 0 <= sel < len(lista):
-                    res = consultas.consulta_generos(lista[sel])
-                    print(f"\n✅ Discos de '{lista[sel]}':")
+                genero = elegir(resp, lista)
+                if genero is not None:
+                    res = catalogo.consulta_generos(genero)
+                    print(f"\n✅ Discos de '{genero}':")
                     for r in res: print(f"  - {r[0]} ({r[1]})")
                 else: print("❌ Selección no válida.")
 
         elif opcion == "4":
             print("\n🔍 CLIENTES CON COMPRAS:")
-            lista = consultas.obtener_lista_clientes()
+            resp, lista = paginar(cache.pagina_clientes, lambda c: c, lambda c: c,
+                                  "Elija el número del cliente", sesion=sesion)
             if not lista:
                 print("⚠️  No hay clientes con compras.")
             else:
-                for i, c in enumerate(lista, 1): print(f"  {i}. {c}")
-                sel = int(input("\n👉 Elija el número del cliente: ")) - 1
-                if 0 <= sel < len(lista):
-                    res = consultas.consulta_cliente(lista[sel])
-                    print(f"\n✅ Compras de '{lista[sel]}':")
+                cliente = elegir(resp, lista)
+                if cliente is not None:
+                    res = consultas.consulta_cliente(cliente)
+                    print(f"\n✅ Compras de '{cliente}':")
                     for r in res: print(f"  - {r[0]}")
                 else: print("❌ Selección no válida.")
 
         elif opcion == "5":
             print("\n🔍 CATÁLOGO DE DISCOS:")
-            lista = consultas.obtener_lista_titulos_discos()
+            resp, lista = paginar(cache.pagina_titulos_discos, lambda d: d, lambda d: d[0],
+                                  "Elija el número del disco", sesion=sesion)
             if not lista:
                 print("⚠️  No hay discos registrados.")
             else:
-                for i, t in enumerate(lista, 1): print(f"  {i}. {t}")
-                sel = int(input("\n👉 Elija el número del disco: ")) - 1
-                if 0 <= sel < len(lista):
-                    res = consultas.consulta_colaboradores(lista[sel])
-                    print(f"\n✅ Colaboradores en '{lista[sel]}':")
+                disco = elegir(resp, lista)
+                if disco is not None:
+                    res = catalogo.consulta_colaboradores(disco[0])
+                    print(f"\n✅ Colaboradores en '{disco[0]}':")
                     for r in res: print(f"  - {r[0]} {r[1]}")
                 else: print("❌ Selección no válida.")
 
@@ -109,42 +188,52 @@ def main():
         
         elif opcion == "8":
             print("\n📝 ACTUALIZAR CANCIONES DEL PEDIDO")
-            ventas_lista = consultas.listar_todas_ventas()
+            resp, ventas_lista = paginar(cache.pagina_ventas, lambda v: v[0],
+                                         lambda v: f"Pedido #{v[0]} (Cliente: {v[1]})",
+                                         "Seleccione el número de pedido a editar", sesion=sesion)
             
             if not ventas_lista:
                 print("⚠️ No hay pedidos registrados.")
+            elif elegir(resp, ventas_lista) is None:
+                print("❌ Selección no válida.")
             else:
-                for i, v in enumerate(ventas_lista, 1):
-                    print(f"  {i}. Pedido #{v[0]} (Cliente: {v[1]})")
-                
-                sel_v = int(input("\n👉 Seleccione el número de pedido a editar: ")) - 1
-                id_venta_sel = ventas_lista[sel_v][0]
+                id_venta_sel = elegir(resp, ventas_lista)[0]
+                # Se lee el pedido con su versión: si otro usuario lo cambia mientras
+                # se elige, la actualización no pisa su cambio
+                venta_sel = consultas.obtener_venta(id_venta_sel)
+                if venta_sel is None:
+                    print("❌ El pedido ya no existe.")
+                    continue
+
+                # Todos los discos del pedido en una sola consulta
+                actuales = consultas.discos_por_ids(venta_sel[3] or [])
+                print("\n💿 Discos actuales del pedido:")
+                for id_d, d in actuales.items():
+                    print(f"  ID: {id_d} | {d[1] if d else '(disco eliminado)'}")
 
                 print("\n🎸 CANCIONES DISPONIBLES EN EL CATÁLOGO:")
-                discos_cat = consultas.obtener_discos_id_y_titulo()
-                for d in discos_cat:
-                    print(f"  ID: {d[0]} | Título: {d[1]}")
-                
-                entrada = input("\n👉 Introduzca los IDs de las nuevas canciones (separados por comas): ")
-                nuevos_ids = [int(x.strip()) for x in entrada.split(",")]
-
-                if transacciones.actualizar_discos_venta(id_venta_sel, nuevos_ids):
+                entrada, _ = paginar(cache.pagina_discos_por_id, lambda d: d[0],
+                                     lambda d: f"ID: {d[0]} | Título: {d[1]}",
+                                     "Introduzca los IDs de las nuevas canciones (separados por comas)",
+                                     numerar=False, sesion=sesion)
+                nuevos_ids = [int(x.strip()) for x in (entrada or "").split(",") if x.strip()]
+
+                if transacciones.actualizar_discos_venta(id_venta_sel, nuevos_ids, version=venta_sel[4]):
                     print(f"\n✅ Pedido #{id_venta_sel} actualizado con éxito con los discos: {nuevos_ids}.")
                 else:
                     print("\n❌ Error: No se pudo actualizar el pedido.")
 
         elif opcion == "9":
             print("\n🗑️  SELECCIONE EL PEDIDO A ELIMINAR:")
-            lista = consultas.listar_todas_ventas()
+            resp, lista = paginar(cache.pagina_ventas, lambda v: v[0],
+                                  lambda v: f"Pedido #{v[0]} - Cliente: {v[1]} ({v[2]})",
+                                  "Elija el número del pedido a borrar", sesion=sesion)
             if not lista:
                 print("⚠️  No hay ventas para eliminar.")
             else:
-                for i, v in enumerate(lista, 1):
-                    print(f"  {i}. Pedido #{v[0]} - Cliente: {v[1]} ({v[2]})")
-                
-                sel = int(input("\n👉 Elija el número del pedido a borrar: ")) - 1
-                if 0 <= sel < len(lista):
-                    id_v = lista[sel][0]
+                venta = elegir(resp, lista)
+                if venta is not None:
+                    id_v = venta[0]
                     confirmar = input(f"⚠️  ¿Seguro que desea borrar el pedido #{id_v}? (s/n): ")
                     if confirmar.lower() == 's':
                         if transacciones.eliminar_venta(id_v):
@@ -154,11 +243,30 @@ def main():
                 else:
                     print("❌ Selección no válida.")
 
+        elif opcion == "10":
+            print("\n📊 MÉTRICAS DE CONSULTAS (desde el arranque):")
+            instrumentacion.imprimir_resumen()
+            stats = cache.estadisticas()
+            print(f"\n🗃️  Caché: {stats['aciertos']} aciertos | {stats['fallos']} fallos | "
+                  f"{stats['entradas']} entradas | {stats['invalidaciones']} invalidaciones")
+            cat = catalogo.catalogo.estadisticas()
+            if cat["activo"]:
+                print(f"📚 Catálogo en memoria: {cat['discos']} discos | {cat['artistas']} artistas | "
+                      f"{cat['generos']} géneros | {cat['recargas']} recargas | {cat['incrementales']} actualizaciones")
+
+        elif opcion == "11":
+            print("\n🏆 RANKINGS DE VENTAS:")
+            analitica.imprimir_rankings()
+
         elif opcion == "0":
             print("\n👋 Saliendo del sistema. ¡Hasta pronto!")
+            sesion.cerrar()
             break
         else:
             print("\n❌ Opción no válida. Intente de nuevo.")
 
 if __name__ == "__main__":
+    # Con argumentos se ejecuta como comando, sin menú (ver cli.py)
+    if len(sys.argv) > 1:
+        sys.exit(cli.main())
     main()
\ No newline at end of file
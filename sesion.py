@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import cache
+import connection
+
+# Hilos que precargan listados mientras el usuario teclea
+HILOS_PRECARGA = 2
+
+class SesionMenu:
+    """
+    Sesión del menú interactivo: se crea una vez al arrancar y dura hasta salir.
+
+    Al crearla se abren las conexiones del pool que usará (la del menú y las de
+    los hilos de precarga), de modo que ninguna acción paga la conexión. Mientras
+    el usuario lee el menú o una página, 'precargar' pide en segundo plano los
+    listados que probablemente necesite después; las respuestas quedan en la
+    caché de listados y 'pagina' las sirve sin esperar a la BD.
+    """
+
+    def __init__(self, hilos=HILOS_PRECARGA):
+        connection.configurar_pool(minconn=1 + hilos, maxconn=max(connection.POOL_MAX, 1 + hilos))
+        self._ejecutor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="precarga")
+        self._pendientes = {}
+        self._lock = threading.Lock()
+        self.precargas = 0
+        self.esperas = 0
+
+    def precargar(self, obtener_pagina, despues, tam_pagina):
+        """
+        Pide una página en segundo plano (si no se está pidiendo ya).
+
+        Args:
+            obtener_pagina (callable): Función cacheada (despues, tam_pagina) de 'cache'.
+            despues (object): Cursor de la página.
+            tam_pagina (int): Elementos por página.
+        """
+        clave = (obtener_pagina, despues, tam_pagina)
+        with self._lock:
+            if self._ejecutor is None:
+                return
+            # Las precargas terminadas ya dejaron su página en la caché: se olvidan para
+            # que solo se guarden las que siguen en curso
+            for terminada in [c for c, f in self._pendientes.items() if f.done()]:
+                del self._pendientes[terminada]
+            if clave in self._pendientes:
+                return
+            self._pendientes[clave] = self._ejecutor.submit(obtener_pagina, despues, tam_pagina)
+            self.precargas += 1
+
+    def precargar_menu(self, tam_pagina):
+        """ Precarga la primera página de los listados con los que empiezan las opciones del menú. """
+        for obtener_pagina in (cache.pagina_generos, cache.pagina_clientes, cache.pagina_titulos_discos,
+                               cache.pagina_ventas, cache.pagina_discos_por_id):
+            self.precargar(obtener_pagina, None, tam_pagina)
+
+    def pagina(self, obtener_pagina, despues, tam_pagina):
+        """
+        Devuelve una página. Si su precarga sigue en curso se espera a que termine
+        en lugar de lanzar la misma consulta otra vez.
+
+        Returns:
+            list: Los elementos de la página.
+        """
+        with self._lock:
+            pendiente = self._pendientes.pop((obtener_pagina, despues, tam_pagina), None)
+        if pendiente is not None and not pendiente.done():
+            self.esperas += 1
+            wait([pendiente])
+        # Se vuelve a pedir a la caché (y no al resultado de la precarga) por si un
+        # commit posterior la ha invalidado
+        return obtener_pagina(despues, tam_pagina)
+
+    def cerrar(self):
+        """ Cancela las precargas pendientes y cierra las conexiones de la sesión. """
+        with self._lock:
+            ejecutor, self._ejecutor = self._ejecutor, None
+            self._pendientes.clear()
+        if ejecutor is not None:
+            ejecutor.shutdown(wait=True, cancel_futures=True)
+        connection.cerrar_pool()
@@ -1,6 +1,30 @@
+import asyncio
+import datetime
+import gc
+import gzip
+import json
+import os
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
 import pytest
-import crear_bbdd
+import analitica
+import benchmark
+import cache
+import carga_masiva
+import catalogo
+import cli
+import connection
 import consultas
+import consultas_async
+import crear_bbdd
+import exportar
+import ingesta
+import instrumentacion
+import integridad
+import sesion as sesion_menu
 import transacciones
 from connection import get_connection
 
@@ -9,18 +33,99 @@ def setup_database():
     """ 
     Fixture que prepara la base de datos antes de ejecutar los tests.
     Reinicia las tablas y carga los datos iniciales de Connor Kauffman, Rawayana y Neomai.
+    Con pytest-xdist ('pytest -n 4 test.py') cada worker trabaja en su propio esquema.
     """
+    worker = os.environ.get("PYTEST_XDIST_WORKER")
+    if worker:
+        connection.configurar_esquema(f"bdor_test_{worker}")
     crear_bbdd.crear_estructura()
     yield
+    if worker:
+        crear_bbdd.borrar_esquema()
+        connection.configurar_esquema(None)
+
+@pytest.fixture(autouse=True)
+def transaccion_por_test(request):
+    """ 
+    Ejecuta cada test dentro de una transacción que se deshace al terminar, así
+    ningún test ve los cambios de otro y el orden no importa.
+    Los tests que necesitan COMMIT reales piden el fixture 'bd_sin_aislar'.
+    """
+    if "bd_sin_aislar" in request.fixturenames:
+        yield
+        return
+    with connection.transaccion_de_prueba():
+        yield
+    # Lo que se guardó en la caché durante el test puede venir de datos ya deshechos
+    cache.cache.vaciar()
+
+@pytest.fixture
+def bd_sin_aislar():
+    """ 
+    Para los tests que usan otras conexiones (NOTIFY, asíncronas, COPY, DDL) y
+    necesitan que los cambios se confirmen de verdad: al terminar se restauran
+    los datos iniciales con el reinicio rápido.
+    """
+    yield
+    crear_bbdd.reiniciar_datos()
+    cache.cache.vaciar()
 
 # --- TESTS DE CONEXIÓN Y ESTRUCTURA ---
 
+def test_reinicio_rapido_y_transaccion_de_prueba(bd_sin_aislar):
+    """ Verifica que los COMMIT dentro de una transacción de prueba se deshacen y que el reinicio rápido restaura los datos. """
+    with connection.transaccion_de_prueba():
+        assert transacciones.eliminar_venta(1) is True
+        assert 1 not in [v[0] for v in consultas.listar_todas_ventas()]
+    assert 1 in [v[0] for v in consultas.listar_todas_ventas()]
+
+    assert transacciones.insertar_artista_y_disco("Temporal", "", "Española", "Temporal", 2026, ["Rock"]) is True
+    crear_bbdd.reiniciar_datos()
+    assert [a[0] for a in consultas.listar_todos_artistas()] == [1, 2, 3]
+    assert len(consultas.listar_todas_ventas()) == 3
+    assert consultas.consulta_cliente('Inés Pérez') == [('Hora Loca',)]
+    assert transacciones.insertar_artista_y_disco("Temporal", "", "Española", "Temporal", 2026, ["Rock"]) is True
+    assert max(a[0] for a in consultas.listar_todos_artistas()) == 4
+
 def test_conexion_servidor():
     """ Verifica que la conexión con el host localhost y puerto 5432 es exitosa. """
     conn = get_connection()
     assert conn is not None
     conn.close()
 
+def test_pool_reutiliza_conexiones(bd_sin_aislar):
+    """ Verifica que el pool devuelve conexiones calientes y sustituye las que se han cerrado. """
+    with connection.conexion() as conn:
+        primera = conn
+    with connection.conexion() as conn:
+        assert conn is primera
+
+    # Una conexión rota no debe volver a entregarse
+    primera.close()
+    with connection.conexion() as conn:
+        assert conn is not primera
+        assert conn.closed == 0
+
+def test_pool_conserva_conexiones_con_varios_hilos(bd_sin_aislar):
+    """ Verifica que con varios hilos a la vez el pool no cierra y reabre conexiones en cada devolución. """
+    pool_global = connection.configurar_pool(minconn=1, maxconn=8)
+    try:
+        barrera = threading.Barrier(8)
+
+        def trabajar():
+            barrera.wait()
+            for _ in range(50):
+                assert len(consultas.consulta_generos('Rock')) >= 3
+
+        hilos = [threading.Thread(target=trabajar) for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        assert pool_global.conexiones_creadas <= 8
+    finally:
+        connection.configurar_pool()
+
 # --- TESTS DE CONSULTAS OBLIGATORIAS ---
 
 def test_consulta_generos_rock():
@@ -32,12 +137,60 @@ def test_consulta_generos_rock():
     assert 'Leavin You' in titulos
     assert 'Carmesí' in titulos
 
+def test_consulta_generos_usa_indice_gin():
+    """ Verifica que la forma '@>' de la consulta por género puede resolverse con el índice GIN. """
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        # Con tan pocas filas el planificador prefiere el recorrido secuencial; se desactiva
+        cur.execute("SET LOCAL enable_seqscan = off;")
+        cur.execute("EXPLAIN SELECT titulo FROM discos WHERE generos @> ARRAY[%s]::TEXT[];", ('Rock',))
+        plan = " ".join(r[0] for r in cur.fetchall())
+        cur.close()
+    assert 'idx_discos_generos' in plan
+
+def test_sentencias_preparadas_una_vez_por_conexion(bd_sin_aislar):
+    """ Verifica que las búsquedas frecuentes se preparan una sola vez por conexión y sobreviven a un reinicio de la BD. """
+    connection.configurar_pool(minconn=1, maxconn=1)
+    try:
+        for _ in range(3):
+            assert len(consultas.consulta_generos('Rock')) >= 3
+        with connection.conexion() as conn:
+            assert "consulta_generos" in conn.preparadas
+            cur = conn.cursor()
+            cur.execute("SELECT name FROM pg_prepared_statements;")
+            assert [r[0] for r in cur.fetchall()] == ["consulta_generos"]
+            cur.close()
+
+        # Tras recrear tablas y tipos la sentencia preparada se vuelve a planificar sola
+        crear_bbdd.crear_estructura()
+        assert consultas.buscar_disco_por_id(2)[1] == 'Malportada'
+        assert len(consultas.consulta_generos('Rock')) == 3
+    finally:
+        # El resto de tests usa el pool de tamaño normal
+        connection.configurar_pool()
+
 def test_consulta_compras_cliente():
     """ Verifica los discos comprados por 'José Joselito'. """
     compras = consultas.consulta_cliente('José Joselito')
     assert len(compras) == 2
     assert compras[0][0] == 'Malportada'
 
+def test_compras_cliente_mantenidas_por_triggers():
+    """ Verifica que la tabla de compras por cliente sigue a las altas, cambios y bajas de ventas. """
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO ventas (detalles_venta) VALUES (('Cliente Trigger', '2025-03-01', ARRAY[1, 2, 2])) RETURNING id_venta;")
+        id_venta = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+    assert consultas.consulta_cliente('Cliente Trigger') == [('Leavin You',), ('Malportada',)]
+
+    assert transacciones.actualizar_discos_venta(id_venta, [5]) is True
+    assert consultas.consulta_cliente('Cliente Trigger') == [('Síndrome de Stendhal',)]
+
+    assert transacciones.eliminar_venta(id_venta) is True
+    assert consultas.consulta_cliente('Cliente Trigger') == []
+
 def test_consulta_colaboradores():
     """ Verifica que Neomai aparece como colaboradora en 'Síndrome de Stendhal'. """
     artistas = consultas.consulta_colaboradores('Síndrome de Stendhal')
@@ -45,6 +198,112 @@ def test_consulta_colaboradores():
 
     assert artistas[0][0] == 'Neomai'
 
+def test_iterar_con_cursor_de_servidor(bd_sin_aislar):
+    """ Verifica que los recorridos en streaming devuelven lo mismo que los listados completos. """
+    assert list(consultas.iterar_artistas(itersize=1)) == consultas.listar_todos_artistas()
+    assert list(consultas.iterar_discos(itersize=2)) == consultas.listar_todos_discos()
+    assert list(consultas.iterar_ventas(itersize=1)) == consultas.listar_todas_ventas()
+
+    # Abandonar el recorrido a medias devuelve la conexión al pool sin transacción abierta
+    recorrido = consultas.iterar_discos(itersize=1)
+    next(recorrido)
+    recorrido.close()
+    with connection.conexion() as conn:
+        assert conn.get_transaction_status() == 0
+
+def test_paginacion_keyset():
+    """ Verifica que recorrer las páginas devuelve los mismos elementos que el listado completo. """
+    def recorrer(obtener_pagina, clave, tam_pagina):
+        elementos, despues = [], None
+        while True:
+            pagina = obtener_pagina(despues, tam_pagina)
+            if not pagina:
+                return elementos
+            elementos.extend(pagina)
+            despues = clave(pagina[-1])
+
+    assert recorrer(consultas.pagina_generos, lambda g: g, 2) == consultas.obtener_lista_generos()
+    assert recorrer(consultas.pagina_clientes, lambda c: c, 2) == consultas.obtener_lista_clientes()
+    titulos = recorrer(consultas.pagina_titulos_discos, lambda d: d, 2)
+    assert [t for t, _ in titulos] == consultas.obtener_lista_titulos_discos()
+    assert recorrer(consultas.pagina_discos_por_id, lambda d: d[0], 2) == consultas.obtener_discos_id_y_titulo()
+    assert recorrer(consultas.pagina_ventas, lambda v: v[0], 2) == consultas.listar_todas_ventas()
+
+def test_trigramas_se_comprueban_por_conexion():
+    """ Verifica que la disponibilidad de pg_trgm se recuerda por conexión y se olvida tras un reinicio. """
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        instalada = consultas._trigramas_disponibles(cur)
+        consultas._trigramas_por_conexion[conn] = not instalada
+        assert consultas._trigramas_disponibles(cur) is (not instalada)
+        transacciones.notificar_reinicio()
+        assert consultas._trigramas_disponibles(cur) is instalada
+        cur.close()
+
+def test_busqueda_difusa_por_trigramas():
+    """ Verifica los índices de trigramas y la búsqueda por similitud donde pg_trgm está disponible. """
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm');")
+        disponible = cur.fetchone()[0]
+        cur.execute("""
+            SELECT count(*) FROM pg_indexes
+            WHERE schemaname = current_schema() AND indexname LIKE 'idx\\_%%\\_trgm';
+        """)
+        indices = cur.fetchone()[0]
+        cur.close()
+    if not disponible:
+        pytest.skip("La extensión pg_trgm no está disponible en este servidor")
+
+    assert indices == 3
+    # Con una letra de menos no hay prefijo ni subcadena: solo la similitud la encuentra
+    assert ('Malportada', 2) in consultas.buscar_titulos("malportda")
+    assert ('Leavin You', 1) in consultas.buscar_titulos("leavin yu")
+
+def test_paginas_de_generos_desde_tabla_indexada():
+    """ Verifica que 'generos_discos' sigue a los discos y que las páginas de géneros usan su clave primaria. """
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO discos (titulo, generos) VALUES ('Doble Zeta', ARRAY['Zeta', 'Rock', 'Zeta']);")
+        cur.execute("UPDATE discos SET generos = ARRAY['Jazz'] WHERE id_disco = 2;")
+        cur.execute("DELETE FROM discos WHERE id_disco = 5;")
+        conn.commit()
+        cur.execute("SELECT genero, discos FROM generos_discos ORDER BY genero;")
+        contadores = cur.fetchall()
+        cur.execute("""
+            SELECT g, count(DISTINCT id_disco) FROM discos, unnest(generos) AS g GROUP BY g ORDER BY g;
+        """)
+        assert contadores == cur.fetchall()
+        assert ('Alternative', 1) not in contadores and ('Zeta', 1) in contadores
+
+        cur.execute("SET LOCAL enable_seqscan = off;")
+        cur.execute("EXPLAIN SELECT genero FROM generos_discos WHERE genero > %s ORDER BY genero LIMIT 2;", ('Indie',))
+        plan = " ".join(r[0] for r in cur.fetchall())
+        cur.close()
+    assert 'generos_discos_pkey' in plan
+    assert consultas.pagina_generos('Indie', 2) == ['Jazz', 'Pop']
+
+def test_busquedas_por_lotes():
+    """ Verifica que las búsquedas por lotes coinciden con las individuales y cubren claves inexistentes. """
+    titulos = ['Carmesí', 'Malportada', 'No Existe']
+    colaboradores = consultas.colaboradores_por_titulos(titulos)
+    assert colaboradores == {t: consultas.consulta_colaboradores(t) for t in titulos}
+
+    discos = consultas.discos_por_ids([2, 4, 999])
+    assert discos == {2: consultas.buscar_disco_por_id(2), 4: consultas.buscar_disco_por_id(4), 999: None}
+
+    clientes = ['José Joselito', 'Inés Pérez', 'Nadie']
+    assert consultas.compras_por_clientes(clientes) == {c: consultas.consulta_cliente(c) for c in clientes}
+
+def test_busqueda_por_prefijo_y_difusa():
+    """ Verifica el orden (prefijo primero), que no distingue mayúsculas y el escape de comodines. """
+    assert consultas.buscar_titulos("MAL")[0] == ('Malportada', 2)
+    assert ('Síndrome de Stendhal', 5) in consultas.buscar_titulos("stendhal")
+    assert consultas.buscar_clientes("inés") == ['Inés Pérez']
+    assert consultas.buscar_artistas("connor k") == [(1, 'Connor', 'Kauffman')]
+    assert consultas.buscar_titulos("%") == []
+    assert len(consultas.buscar_titulos("a", limite=2)) == 2
+
 # --- TESTS DE TRANSACCIONES (COMMIT Y ROLLBACK) ---
 
 def test_transaccion_exitosa_commit():
@@ -57,6 +316,52 @@ def test_transaccion_exitosa_commit():
     res = consultas.consulta_colaboradores('Disco Test')
     assert len(res) > 0
 
+def test_insercion_por_lotes_commit():
+    """ Verifica que la inserción por lotes asocia cada disco con el ID generado de su artista. """
+    registros = [(f'Lote{i}', 'Test', 'España', f'Disco Lote {i}', 2020 + i, ['Lote']) for i in range(5)]
+    assert transacciones.insertar_artistas_y_discos(registros, tam_lote=2) is True
+
+    for i in range(5):
+        assert consultas.consulta_colaboradores(f'Disco Lote {i}') == [(f'Lote{i}', 'Test')]
+
+def test_insercion_por_lotes_rollback():
+    """ Verifica que si falla un lote posterior no se guarda ninguno de los anteriores. """
+    registros = [(f'Atomico{i}', '', 'España', f'Disco Atomico {i}', 2024, ['Rock']) for i in range(4)]
+    registros.append(('Roto', '', 'España', 'Disco Roto', 'no es un año', ['Rock']))
+    assert transacciones.insertar_artistas_y_discos(registros, tam_lote=2) is False
+
+    nombres = [a[1] for a in consultas.listar_todos_artistas()]
+    assert not any(n.startswith('Atomico') for n in nombres)
+
+def test_registro_de_ventas_agrupado():
+    """ Verifica que el escritor agrupa ventas de varios hilos y devuelve a cada uno su ID, aislando las erróneas. """
+    assert consultas.obtener_venta(transacciones.registrar_venta('Cliente Suelto', None, [1]))[1] == 'Cliente Suelto'
+
+    escritor = ingesta.EscritorVentas(tam_lote=10, espera_ms=200)
+    escritor.start()
+    try:
+        pedidos = [(f'Cliente Lote {i}', '2025-04-01', [1 + i % 5]) for i in range(24)]
+        pedidos[7] = ('Cliente Roto', 'no es una fecha', [1])
+        with ThreadPoolExecutor(6) as ejecutor:
+            futuros = list(ejecutor.map(lambda p: escritor.registrar(*p), pedidos))
+        ids = [f.result(10) for f in futuros]
+    finally:
+        escritor.detener()
+
+    assert ids[7] is None
+    assert escritor.ventas == 23 and escritor.lotes < 23
+    for (cliente, _, discos), id_venta in zip(pedidos, ids):
+        if id_venta is not None:
+            assert consultas.obtener_venta(id_venta)[1:4:2] == (cliente, discos)
+
+def test_escritor_ventas_detenido_sin_arrancar():
+    """ Verifica que detener un escritor que no llegó a arrancar no falla y resuelve lo encolado con None. """
+    escritor = ingesta.EscritorVentas()
+    pendiente = escritor.registrar('Cliente Sin Hilo', None, [1])
+    escritor.detener()
+    assert pendiente.result(0) is None
+    assert escritor.registrar('Cliente Tardío', None, [1]).result(0) is None
+
 def test_transaccion_rollback_fallido():
     """ 
     Verifica que ante un error de integridad (ID duplicado), 
@@ -82,6 +387,35 @@ def test_actualizar_pedido():
     venta_actualizada = next(v for v in ventas if v[0] == 1)
     assert venta_actualizada[3] == [3]
 
+def test_edicion_de_pedidos_por_deltas_y_version():
+    """ Verifica las ediciones por deltas en lote y que una versión obsoleta no pisa otro cambio. """
+    # Venta 1: [2, 4]; venta 2: [1, 4, 5]
+    version = consultas.obtener_venta(1)[4]
+    assert transacciones.editar_ventas([(1, [5], [4]), (2, [], [4, 5]), (999, [1], [])]) == [1, 2]
+    assert consultas.obtener_venta(1)[3] == [2, 5]
+    assert consultas.obtener_venta(2)[3] == [1]
+    assert consultas.consulta_cliente('Mario el Castañas') == [('Leavin You',)]
+
+    # Otro usuario editó la venta 1 después de leer 'version': la edición se rechaza
+    assert consultas.obtener_venta(1)[4] == version + 1
+    assert transacciones.actualizar_discos_venta(1, [3], version=version) is False
+    assert transacciones.quitar_discos_venta(1, [2], version=version) is False
+    assert consultas.obtener_venta(1)[3] == [2, 5]
+
+    assert transacciones.anadir_discos_venta(1, [3, 3], version=version + 1) is True
+    assert consultas.obtener_venta(1)[3:] == ([2, 5, 3, 3], version + 2)
+
+def test_edicion_de_pedidos_repetidos_en_orden():
+    """ Verifica que varias ediciones de un mismo pedido se aplican en orden y que cuenta la primera versión indicada. """
+    # Venta 1: [2, 4]
+    version = consultas.obtener_venta(1)[4]
+    assert transacciones.editar_ventas([(1, [5], []), (1, [], [5]), (1, [3], [2])]) == [1]
+    assert consultas.obtener_venta(1)[3:] == ([4, 3], version + 1)
+
+    # Una versión obsoleta en la segunda edición del pedido también la rechaza
+    assert transacciones.editar_ventas([(1, [5], []), (1, [], [4], version)]) == []
+    assert consultas.obtener_venta(1)[3] == [4, 3]
+
 def test_eliminar_pedido():
     """ Verifica el borrado físico de una venta. """
     exito = transacciones.eliminar_venta(1)
@@ -89,4 +423,490 @@ def test_eliminar_pedido():
 
     ventas = consultas.listar_todas_ventas()
     ids_ventas = [v[0] for v in ventas]
-    assert 1 not in ids_ventas
\ No newline at end of file
+    assert 1 not in ids_ventas
+
+def test_contadores_de_ventas_mantenidos_por_triggers():
+    """ Verifica que los rankings siguen a las ventas y a los cambios de discos y coinciden con una reconstrucción. """
+    def unidades(ranking, clave):
+        return {fila[0]: fila[-1] for fila in ranking}.get(clave, 0)
+
+    antes_disco = unidades(analitica.discos_mas_vendidos(100), 4)
+    antes_indie = unidades(analitica.ventas_por_genero(), 'Indie')
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO ventas (detalles_venta) VALUES (('Cliente Ranking', '2025-03-01', ARRAY[4, 4, 5])) RETURNING id_venta;")
+        id_venta = cur.fetchone()[0]
+        conn.commit()
+        cur.close()
+    assert unidades(analitica.discos_mas_vendidos(100), 4) == antes_disco + 2
+    assert unidades(analitica.ventas_por_genero(), 'Indie') == antes_indie + 3
+
+    assert transacciones.actualizar_discos_venta(id_venta, [4]) is True
+    assert unidades(analitica.discos_mas_vendidos(100), 4) == antes_disco + 1
+    assert unidades(analitica.ventas_por_genero(), 'Indie') == antes_indie + 1
+
+    # Cambiar los géneros de un disco traslada sus unidades al nuevo género
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE discos SET generos = ARRAY['Indie', 'Jazz'] WHERE id_disco = 4;")
+        conn.commit()
+        cur.close()
+    assert unidades(analitica.ventas_por_genero(), 'Jazz') == antes_disco + 1
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("UPDATE discos SET generos = ARRAY['Indie', 'Rock'] WHERE id_disco = 4;")
+        conn.commit()
+        cur.close()
+    assert unidades(analitica.ventas_por_genero(), 'Jazz') == 0
+
+    assert transacciones.eliminar_venta(id_venta) is True
+    assert unidades(analitica.discos_mas_vendidos(100), 4) == antes_disco
+
+    incrementales = (analitica.discos_mas_vendidos(100), analitica.ventas_por_genero(), analitica.ventas_por_artista(100))
+    assert analitica.reconstruir() is True
+    assert incrementales == (analitica.discos_mas_vendidos(100), analitica.ventas_por_genero(), analitica.ventas_por_artista(100))
+
+def test_comprobacion_de_integridad_por_bloques():
+    """ Verifica que se detectan y reparan los IDs inexistentes de los arrays, recorriendo por bloques. """
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM discos WHERE id_disco = 4;")
+        cur.execute("UPDATE discos SET artistas_ids = artistas_ids || 77 WHERE id_disco = 1;")
+        conn.commit()
+        cur.close()
+
+    avisos = []
+    res = integridad.comprobar_integridad(tam_bloque=2, progreso=lambda tabla, r, maximo: avisos.append(tabla))
+    assert (res["ventas"]["filas_rotas"], res["ventas"]["ids_rotos"]) == (2, [4])
+    assert (res["discos"]["filas_rotas"], res["discos"]["ids_rotos"]) == (1, [77])
+    assert avisos == ["ventas", "ventas", "discos", "discos"]
+
+    res = integridad.comprobar_integridad(reparar=True, tam_bloque=2, progreso=None)
+    assert res["ventas"]["reparadas"] == 2 and res["discos"]["reparadas"] == 1
+    assert consultas.obtener_venta(2)[3] == [1, 5]
+    assert consultas.buscar_disco_por_id(1)[4] == [1]
+    assert integridad.comprobar_integridad(progreso=None)["ventas"]["filas_rotas"] == 0
+
+# --- TESTS DE LA LÍNEA DE COMANDOS ---
+
+def test_cli_lote_con_salida_jsonl(tmp_path, bd_sin_aislar):
+    """ Verifica que un lote ejecuta varias operaciones en un proceso y escribe una línea JSON por fila. """
+    lote = tmp_path / "lote.txt"
+    lote.write_text('compras "José Joselito"\n# comentario\nactualizar-venta 3 4,5\neliminar-venta 2\nlistar ventas\n',
+                    encoding="utf-8")
+    salida = tmp_path / "salida.jsonl"
+
+    assert cli.main(["--salida", str(salida), "lote", str(lote)]) == 0
+    registros = [json.loads(l) for l in salida.read_text(encoding="utf-8").splitlines()]
+    assert registros[:2] == [{"operacion": "compras", "titulo": "Malportada"}, {"operacion": "compras", "titulo": "Carmesí"}]
+    assert {"operacion": "actualizar-venta", "id_venta": 3, "discos_comprados": [4, 5], "ok": True} in registros
+    ventas = [r for r in registros if r["operacion"] == "listar"]
+    assert [(v["id_venta"], v["discos_comprados"]) for v in ventas] == [(1, [2, 4]), (3, [4, 5])]
+
+    # Una operación fallida se refleja en el código de salida
+    assert cli.main(["--salida", str(salida), "eliminar-venta", "99"]) == 1
+
+# --- TESTS DE CARGA MASIVA ---
+
+def test_generador_determinista(tmp_path):
+    """ Verifica que la misma semilla produce exactamente los mismos ficheros. """
+    carga_masiva.generar_dataset(str(tmp_path / "a"), 200, semilla=7)
+    carga_masiva.generar_dataset(str(tmp_path / "b"), 200, semilla=7)
+    for tabla in carga_masiva.TABLAS:
+        assert (tmp_path / "a" / f"{tabla}.csv").read_text() == (tmp_path / "b" / f"{tabla}.csv").read_text()
+
+def test_carga_masiva_copy(tmp_path, bd_sin_aislar):
+    """ Verifica que COPY monta bien los tipos compuestos y arrays, incluso con comas y comillas. """
+    registros = {
+        "artistas": [{"id_artista": 1, "nombre": 'Dúo "El Loco"', "apellido": "Gómez, Jr.", "nacionalidad": "Española"}],
+        "discos": [{"id_disco": 1, "titulo": "Tab\tY \\ barra", "anio_lanzamiento": 2020,
+                    "generos": ["Rock", "Pop, Latino"], "artistas_ids": [1]}],
+        "ventas": [{"id_venta": 1, "customer_name": "O'Neil", "sale_date": "2024-02-29", "discos_comprados": [1, 1]}],
+    }
+    for tabla, filas in registros.items():
+        with open(tmp_path / f"{tabla}.jsonl", "w", encoding="utf-8") as f:
+            for fila in filas:
+                f.write(json.dumps(fila) + "\n")
+
+    try:
+        cargadas = carga_masiva.cargar_directorio(str(tmp_path))
+        assert cargadas == {"artistas": 1, "discos": 1, "ventas": 1}
+
+        assert consultas.listar_todos_artistas() == [(1, 'Dúo "El Loco"', "Gómez, Jr.", "Española")]
+        disco = consultas.listar_todos_discos()[0]
+        assert disco[1] == "Tab\tY \\ barra"
+        assert disco[3] == ["Rock", "Pop, Latino"]
+        venta = consultas.listar_todas_ventas()[0]
+        assert venta[1] == "O'Neil" and venta[3] == [1, 1]
+    finally:
+        # El resto de tests trabaja sobre los datos iniciales
+        crear_bbdd.crear_estructura()
+
+def test_carga_masiva_csv_con_nulos(tmp_path, bd_sin_aislar):
+    """ Verifica que en los CSV la marca \\N y los campos vacíos no textuales se cargan como NULL. """
+    (tmp_path / "artistas.csv").write_text(
+        "id_artista,nombre,apellido,nacionalidad\n1,Solo,\\N,\n", encoding="utf-8")
+    (tmp_path / "discos.csv").write_text(
+        "id_disco,titulo,anio_lanzamiento,generos,artistas_ids\n1,SinAnio,,Rock,1\n2,\\N,1999,,\\N\n", encoding="utf-8")
+    (tmp_path / "ventas.csv").write_text(
+        "id_venta,customer_name,sale_date,discos_comprados\n1,Sin Fecha,,1|\\N|2\n", encoding="utf-8")
+
+    try:
+        assert carga_masiva.cargar_directorio(str(tmp_path)) == {"artistas": 1, "discos": 2, "ventas": 1}
+        with connection.conexion() as conn, conn.cursor() as cur:
+            cur.execute("SELECT (datos_artista).apellido, (datos_artista).nacionalidad FROM artistas;")
+            assert cur.fetchall() == [(None, "")]
+            cur.execute("SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids FROM discos ORDER BY 1;")
+            assert cur.fetchall() == [(1, "SinAnio", None, ["Rock"], [1]), (2, None, 1999, [], None)]
+            cur.execute("SELECT detalles_venta FROM ventas;")
+            assert cur.fetchone()[0] == '("Sin Fecha",,"{1,NULL,2}")'
+    finally:
+        crear_bbdd.crear_estructura()
+
+def test_exportacion_copy_to(tmp_path):
+    """ Verifica que la exportación aplana tipos y arrays, añade los títulos y se puede volver a leer comprimida. """
+    exportadas = exportar.exportar_directorio(str(tmp_path), comprimir=True)
+    assert exportadas == {"artistas": 3, "discos": 5, "ventas": 3}
+
+    ruta = str(tmp_path / "ventas.csv.gz")
+    with gzip.open(ruta, "rt", encoding="utf-8") as f:
+        assert f.readline().strip() == "id_venta,customer_name,sale_date,discos_comprados,titulos"
+    ventas = list(carga_masiva._leer_registros(ruta))
+    assert ventas[0]["discos_comprados"] == "2|4"
+    assert ventas[0]["titulos"] == "Malportada|Carmesí"
+    assert carga_masiva._buscar_fichero(str(tmp_path), "discos") == str(tmp_path / "discos.csv.gz")
+
+def test_exportacion_y_carga_conservan_nulos(tmp_path, bd_sin_aislar):
+    """ Verifica que un directorio exportado con NULL en columnas, tipos compuestos y arrays vuelve a cargarse igual. """
+    consultas_tablas = (
+        "SELECT id_artista, datos_artista FROM artistas ORDER BY 1;",
+        "SELECT id_disco, titulo, anio_lanzamiento, generos, artistas_ids FROM discos ORDER BY 1;",
+        "SELECT id_venta, detalles_venta FROM ventas ORDER BY 1;",
+    )
+    try:
+        with connection.conexion() as conn, conn.cursor() as cur:
+            cur.execute("""
+                INSERT INTO artistas (datos_artista) VALUES (('Sin', NULL, '')), ((NULL, 'Apellido', NULL));
+                INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids)
+                    VALUES ('SinAnio', NULL, ARRAY['Rock'], ARRAY[1]), (NULL, 2001, NULL, ARRAY[1, NULL]), ('', 2002, '{}', '{}');
+                INSERT INTO ventas (detalles_venta) VALUES (('Sin Fecha', NULL, ARRAY[1, NULL])), ((NULL, '2024-01-01', NULL));
+            """)
+            conn.commit()
+            originales = []
+            for query in consultas_tablas:
+                cur.execute(query)
+                originales.append(cur.fetchall())
+
+        assert exportar.exportar_directorio(str(tmp_path))
+        assert carga_masiva.cargar_directorio(str(tmp_path))
+        with connection.conexion() as conn, conn.cursor() as cur:
+            for query, filas in zip(consultas_tablas, originales):
+                cur.execute(query)
+                assert cur.fetchall() == filas
+    finally:
+        crear_bbdd.crear_estructura()
+
+# --- TESTS DE PARTICIONADO ---
+
+def test_ventas_particionadas_por_mes(bd_sin_aislar):
+    """ Verifica el reparto por meses, la poda de particiones y que las tablas derivadas no cambian al mover ventas. """
+    try:
+        crear_bbdd.crear_estructura(particionada=True)
+        with connection.conexion() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT tableoid::regclass::text FROM ventas WHERE id_venta = 3;")
+            assert cur.fetchone()[0] == "ventas_2024_12"
+
+            cur.execute("EXPLAIN SELECT * FROM ventas WHERE (detalles_venta).sale_date BETWEEN '2024-12-01' AND '2024-12-31';")
+            plan = " ".join(r[0] for r in cur.fetchall())
+            assert "ventas_2024_12" in plan and "ventas_2024_05" not in plan
+
+            # Un mes sin partición cae en la partición por defecto hasta que se crea la suya
+            cur.execute("INSERT INTO ventas (detalles_venta) VALUES (('Cliente Futuro', '2031-07-15', ARRAY[1])) RETURNING tableoid::regclass::text;")
+            assert cur.fetchone()[0] == "ventas_default"
+            conn.commit()
+            cur.close()
+
+        assert crear_bbdd.asegurar_particiones() == 1
+        assert consultas.consulta_cliente('Cliente Futuro') == [('Leavin You',)]
+        ventas = consultas.ventas_entre_fechas(datetime.date(2031, 7, 1), datetime.date(2031, 7, 31))
+        assert [v[1] for v in ventas] == ['Cliente Futuro']
+        assert consultas.resumen_ventas_por_mes(datetime.date(2024, 1, 1), datetime.date(2025, 12, 31)) == [
+            (datetime.date(2024, 5, 1), 1, 2), (datetime.date(2024, 12, 1), 1, 1), (datetime.date(2025, 1, 1), 1, 3)]
+    finally:
+        crear_bbdd.crear_estructura()
+
+# --- TESTS DE CACHÉ ---
+
+def test_cache_aciertos_e_invalidacion_local():
+    """ Verifica que la caché cuenta aciertos/fallos y se invalida al confirmar una transacción. """
+    cache.cache.vaciar()
+    assert 'Rock' in cache.obtener_lista_generos()
+    cache.obtener_lista_generos()
+    assert cache.estadisticas()["aciertos"] == 1
+    assert cache.estadisticas()["fallos"] == 1
+
+    transacciones.insertar_artista_y_disco('Cache', 'Test', 'España', 'Disco Cache', 2026, ['GeneroCache'])
+    assert 'GeneroCache' in cache.obtener_lista_generos()
+    assert cache.estadisticas()["invalidaciones"] >= 1
+
+def test_cache_expulsion_lru():
+    """ Verifica que la caché no supera su tamaño máximo y expulsa lo menos usado. """
+    pequena = cache.CacheTTL(max_entradas=2)
+    for clave in ("a", "b", "a", "c"):
+        pequena.obtener((clave,), ("discos",), lambda: [clave])
+    assert pequena.estadisticas()["expulsiones"] == 1
+    assert pequena.obtener(("a",), ("discos",), lambda: ["nuevo"]) == ["a"]
+
+def test_cache_no_guarda_valores_invalidados_durante_el_calculo():
+    """ Verifica que un valor calculado antes de una invalidación de su tabla no se queda en la caché. """
+    pequena = cache.CacheTTL()
+
+    def calcular_viejo():
+        pequena.invalidar('ventas')
+        return ['viejo']
+
+    assert pequena.obtener(("clientes",), ("ventas",), calcular_viejo) == ['viejo']
+    assert pequena.obtener(("clientes",), ("ventas",), lambda: ['nuevo']) == ['nuevo']
+    # Una invalidación de otra tabla no afecta
+    pequena.obtener(("generos",), ("discos",), lambda: (pequena.invalidar('ventas'), ['g'])[1])
+    assert pequena.obtener(("generos",), ("discos",), lambda: ['otro']) == ['g']
+
+def test_cache_invalidada_por_notify(bd_sin_aislar):
+    """ Verifica que un cambio hecho fuera de transacciones llega por NOTIFY e invalida la caché. """
+    escucha = cache.iniciar_escucha()
+    assert escucha.escuchando.wait(5)
+    cache.obtener_lista_clientes()
+
+    with connection.conexion() as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO ventas (detalles_venta) VALUES (('Cliente Notify', '2025-02-01', ARRAY[1]));")
+        conn.commit()
+        cur.close()
+
+    limite = time.monotonic() + 5
+    while 'Cliente Notify' not in cache.obtener_lista_clientes() and time.monotonic() < limite:
+        time.sleep(0.05)
+    cache.detener_escucha()
+    assert 'Cliente Notify' in cache.obtener_lista_clientes()
+
+def test_catalogo_en_memoria():
+    """ Verifica que el catálogo en memoria responde igual que la BD y recoge los commits al momento. """
+    try:
+        assert catalogo.activar()
+        recargas, incrementales = catalogo.catalogo.recargas, catalogo.catalogo.incrementales
+        for genero in ('Rock', 'Pop', 'No Existe'):
+            assert sorted(catalogo.consulta_generos(genero)) == sorted(consultas.consulta_generos(genero))
+        for titulo in ('Leavin You', 'Carmesí'):
+            assert sorted(catalogo.consulta_colaboradores(titulo)) == sorted(consultas.consulta_colaboradores(titulo))
+
+        transacciones.insertar_artista_y_disco('Memo', 'Ria', 'España', 'Disco en RAM', 2026, ['GeneroRAM', 'Rock'])
+        assert catalogo.consulta_generos('GeneroRAM') == [('Disco en RAM', 2026)]
+        assert catalogo.consulta_colaboradores('Disco en RAM') == [('Memo', 'Ria')]
+        assert sorted(catalogo.consulta_generos('Rock')) == sorted(consultas.consulta_generos('Rock'))
+        # Un aviso por tabla ('artistas' y 'discos'), sin recargar el catálogo entero
+        assert catalogo.catalogo.incrementales == incrementales + 2
+        assert catalogo.catalogo.recargas == recargas
+    finally:
+        catalogo.desactivar()
+
+def test_catalogo_se_recarga_tras_reiniciar_datos(bd_sin_aislar):
+    """ Verifica que tras 'reiniciar_datos' (los IDs vuelven a empezar) el catálogo no sirve discos borrados. """
+    try:
+        assert catalogo.activar()
+        transacciones.insertar_artista_y_disco('Ana', 'Vieja', 'España', 'Viejo', 2020, ['Zeta'])
+        assert catalogo.consulta_generos('Zeta') == [('Viejo', 2020)]
+
+        crear_bbdd.reiniciar_datos()
+        transacciones.insertar_artista_y_disco('Nico', 'Nuevo', 'España', 'Nuevo', 2021, ['Zeta'])
+        assert catalogo.consulta_generos('Zeta') == [('Nuevo', 2021)]
+        assert catalogo.consulta_colaboradores('Nuevo') == [('Nico', 'Nuevo')]
+    finally:
+        catalogo.desactivar()
+
+@pytest.mark.parametrize("tabla", [None, "discos"])
+def test_catalogo_descarta_recarga_con_avisos_intermedios(monkeypatch, tabla):
+    """ Verifica que una recarga durante la que llega un aviso (reinicio o alta) no guarda lo leído antes. """
+    cat = catalogo.CatalogoMemoria()
+    filas_originales = catalogo._filas
+
+    def filas_con_aviso(conn, query, params):
+        cat.actualizar(tabla)
+        yield from filas_originales(conn, query, params)
+
+    monkeypatch.setattr(catalogo, "_filas", filas_con_aviso)
+    assert cat.recargar() is False
+    assert cat.estadisticas()["discos"] == 0 and cat.recargas == 0
+
+    monkeypatch.setattr(catalogo, "_filas", filas_originales)
+    assert cat.recargar() is True
+    assert cat.consulta_generos('Rock') == consultas.consulta_generos('Rock')
+
+def test_catalogo_actualiza_sin_bloquear_lecturas(monkeypatch):
+    """ Verifica que mientras se leen las filas nuevas otros hilos pueden consultar el catálogo. """
+    cat = catalogo.CatalogoMemoria()
+    assert cat.recargar()
+    filas_originales = catalogo._filas
+    lecturas, bloqueadas = [], []
+
+    def filas_comprobando_bloqueo(conn, query, params):
+        lector = threading.Thread(target=lambda: lecturas.append(cat.consulta_generos('Rock')), daemon=True)
+        lector.start()
+        lector.join(timeout=5)
+        bloqueadas.append(lector.is_alive())
+        yield from filas_originales(conn, query, params)
+
+    monkeypatch.setattr(catalogo, "_filas", filas_comprobando_bloqueo)
+    transacciones.insertar_artista_y_disco('Sin', 'Bloqueo', 'España', 'Disco Libre', 2026, ['GeneroLibre'])
+    cat.actualizar('discos')
+    assert bloqueadas == [False]
+    assert lecturas == [consultas.consulta_generos('Rock')]
+    assert cat.consulta_generos('GeneroLibre') == [('Disco Libre', 2026)]
+    assert cat.incrementales == 1
+
+def test_sesion_menu_precarga(bd_sin_aislar):
+    """ Verifica que la sesión precarga los listados en segundo plano y que luego se sirven desde la caché. """
+    sesion = sesion_menu.SesionMenu()
+    try:
+        cache.cache.vaciar()
+        sesion.precargar_menu(2)
+        assert sesion.precargas == 5
+        assert sesion.pagina(cache.pagina_generos, None, 2) == consultas.pagina_generos(None, 2)
+        assert sesion.pagina(cache.pagina_ventas, None, 2) == consultas.pagina_ventas(None, 2)
+        # Las dos páginas ya las había pedido la precarga: no hay más fallos de caché
+        assert cache.estadisticas()["fallos"] == 5
+
+        # Las precargas terminadas que nadie llega a pedir no se acumulan
+        for despues in range(20):
+            sesion.precargar(cache.pagina_ventas, despues, 2)
+        for pendiente in list(sesion._pendientes.values()):
+            pendiente.result(10)
+        sesion.precargar(cache.pagina_clientes, 'A', 2)
+        assert list(sesion._pendientes) == [(cache.pagina_clientes, 'A', 2)]
+    finally:
+        sesion.cerrar()
+
+# --- TESTS DE LA CAPA ASÍNCRONA ---
+
+def test_consultas_async_concurrentes(bd_sin_aislar):
+    """ Verifica que muchas consultas concurrentes comparten un pool pequeño y dan el mismo resultado. """
+    async def escenario():
+        pool = consultas_async.obtener_pool(maxconn=3)
+        resultados = await asyncio.gather(*(consultas_async.consulta_generos('Rock') for _ in range(30)))
+        disco = await consultas_async.buscar_disco_por_id(2)
+        compras = await consultas_async.consulta_cliente('José Joselito')
+        abiertas = len(pool._libres)
+        await consultas_async.cerrar_pool()
+        return resultados, disco, compras, abiertas
+
+    resultados, disco, compras, abiertas = asyncio.run(escenario())
+    assert all(r == consultas.consulta_generos('Rock') for r in resultados)
+    assert disco == consultas.buscar_disco_por_id(2)
+    assert compras == consultas.consulta_cliente('José Joselito') != []
+    assert abiertas <= 3
+
+def test_pool_async_no_retiene_bucles_cerrados():
+    """ Verifica que los pools de bucles de eventos ya cerrados no los mantienen vivos. """
+    async def usar_pool():
+        await asyncio.gather(*(consultas_async.consulta_generos('Rock') for _ in range(10)))
+        return weakref.ref(asyncio.get_running_loop())
+
+    bucles = [asyncio.run(usar_pool()) for _ in range(3)]
+    gc.collect()
+    assert all(bucle() is None for bucle in bucles[:-1])
+    assert len(consultas_async._pools) == 1
+
+def test_transacciones_async_y_timeout(bd_sin_aislar):
+    """ Verifica las escrituras asíncronas y que una consulta lenta se corta por timeout. """
+    version = consultas.obtener_venta(1)[4]
+
+    async def escenario():
+        ok = await consultas_async.insertar_artista_y_disco('Async', 'Test', 'España', 'Disco Async', 2026, ['Async'])
+        no_existe = await consultas_async.eliminar_venta(999999)
+        editada = await consultas_async.actualizar_discos_venta(1, [3], version=version)
+        obsoleta = await consultas_async.actualizar_discos_venta(1, [5], version=version)
+        inicio = time.monotonic()
+        lenta = await consultas_async._consultar("SELECT pg_sleep(5);", None, "dormir", 0.2)
+        duracion = time.monotonic() - inicio
+        await consultas_async.cerrar_pool()
+        return ok, no_existe, editada, obsoleta, lenta, duracion
+
+    ok, no_existe, editada, obsoleta, lenta, duracion = asyncio.run(escenario())
+    assert ok is True and no_existe is False
+    # Igual que la versión síncrona: cada edición sube la versión y una obsoleta se rechaza
+    assert editada is True and obsoleta is False
+    assert consultas.obtener_venta(1)[3:] == ([3], version + 1)
+    assert consultas.consulta_colaboradores('Disco Async') == [('Async', 'Test')]
+    assert lenta == [] and duracion < 2
+
+def test_cancelacion_async_no_bloquea_el_bucle():
+    """ Verifica que la cancelación de una consulta (bloqueante en libpq) no detiene el resto de corrutinas. """
+    class ConexionLenta:
+        def cancel(self):
+            time.sleep(0.3)
+
+    async def escenario():
+        pool = consultas_async.PoolAsync(maxconn=1)
+        latidos = 0
+
+        async def latir():
+            nonlocal latidos
+            while True:
+                await asyncio.sleep(0.01)
+                latidos += 1
+
+        latido = asyncio.ensure_future(latir())
+        await pool._cancelar(ConexionLenta())
+        latido.cancel()
+        return latidos
+
+    assert asyncio.run(escenario()) >= 10
+
+# --- TESTS DEL BENCHMARK ---
+
+def test_benchmark_percentiles_y_regresiones():
+    """ Verifica el cálculo de percentiles y la detección de regresiones entre informes. """
+    muestras = [i / 1000 for i in range(1, 101)]
+    assert benchmark.percentil(muestras, 50) == 0.05
+    assert benchmark.percentil(muestras, 99) == 0.099
+
+    base = {"resultados": {"1000": {"consulta_generos": {"p95_ms": 1.0}, "consulta_cliente": {"p95_ms": 1.0}}}}
+    actual = {"resultados": {"1000": {"consulta_generos": {"p95_ms": 1.1}, "consulta_cliente": {"p95_ms": 1.5}}}}
+    assert benchmark.comparar(actual, base, umbral=0.2) == [("1000", "consulta_cliente", 1.0, 1.5)]
+
+# --- TESTS DE INSTRUMENTACIÓN ---
+
+def test_metricas_por_consulta_y_log_de_lentas(tmp_path):
+    """ Verifica que se registran latencia, filas y checkout por consulta y el log de consultas lentas. """
+    # La primera llamada en una conexión también envía el PREPARE: se hace antes de medir
+    consultas.consulta_generos('Rock')
+    instrumentacion.reiniciar()
+    # 'configurar_log_lentas' cierra los manejadores que haya: se apartan antes para
+    # devolver el log tal como estaba
+    log = instrumentacion.log_lentas
+    umbral_previo = instrumentacion.UMBRAL_LENTA_MS
+    previos, nivel_previo, propagar_previo = list(log.handlers), log.level, log.propagate
+    for manejador in previos:
+        log.removeHandler(manejador)
+    ruta_log = tmp_path / "lentas.log"
+    instrumentacion.configurar_log_lentas(str(ruta_log), umbral_ms=0)
+    try:
+        consultas.consulta_generos('Rock')
+        consultas.consulta_generos('Pop')
+        list(consultas.iterar_discos())
+    finally:
+        for manejador in list(log.handlers):
+            log.removeHandler(manejador)
+            manejador.close()
+        for manejador in previos:
+            log.addHandler(manejador)
+        log.setLevel(nivel_previo)
+        log.propagate = propagar_previo
+        instrumentacion.UMBRAL_LENTA_MS = umbral_previo
+
+    metricas = instrumentacion.resumen()
+    assert metricas["consulta_generos"]["ejecucion"]["n"] == 2
+    assert metricas["consulta_generos"]["filas"] == 5
+    assert metricas["consulta_generos"]["checkout"]["n"] == 2
+    assert metricas["iterar_discos"]["checkout"]["n"] == 1
+    assert "consulta_generos" in ruta_log.read_text(encoding="utf-8")
@@ -1,6 +1,42 @@
 import psycopg2
-from connection import get_connection
+from psycopg2.extras import execute_values
+from connection import conexion
+from instrumentacion import medido
 
+# Registros que se envían en cada sentencia INSERT multi-fila de las cargas por lotes
+TAM_LOTE_POR_DEFECTO = 500
+
+# Funciones a las que se avisa, con el nombre de cada tabla modificada, tras un COMMIT
+_oyentes_commit = []
+
+def registrar_oyente_commit(oyente):
+    """ 
+    Registra una función que se llamará con el nombre de cada tabla modificada
+    cuando una de las transacciones de este módulo se confirme, o con None
+    cuando los datos se han reemplazado por completo (ver 'notificar_reinicio').
+    
+    Args:
+        oyente (callable): Función que recibe el nombre de la tabla (o None).
+    """
+    if oyente not in _oyentes_commit:
+        _oyentes_commit.append(oyente)
+
+def notificar_commit(*tablas):
+    """ Avisa a los oyentes registrados de que se han confirmado cambios en 'tablas'. """
+    for tabla in tablas:
+        for oyente in _oyentes_commit:
+            oyente(tabla)
+
+def notificar_reinicio():
+    """ 
+    Avisa a los oyentes de que cualquier tabla puede haber cambiado de cualquier forma
+    (TRUNCATE, recreación de la estructura, cargas masivas, reparaciones): las copias
+    locales de los datos deben descartarse enteras.
+    """
+    for oyente in _oyentes_commit:
+        oyente(None)
+
+@medido
 def insertar_artista_y_disco(nombre, apellido, nacionalidad, titulo, anio, generos):
     """ 
     Inserta un artista y su disco en una sola operación atómica. 
@@ -17,38 +53,156 @@ def insertar_artista_y_disco(nombre, apellido, nacionalidad, titulo, anio, gener
     Returns:
         bool: True si la transacción se guardó (COMMIT), False si falló (ROLLBACK).
     """
-    conn = get_connection()
     try:
-        cur = conn.cursor()
+        with conexion() as conn:
+            cur = conn.cursor()
 
-        query_artista = """
-            INSERT INTO artistas (datos_artista) 
-            VALUES ((%s, %s, %s)) RETURNING id_artista;
-        """
-        cur.execute(query_artista, (nombre, apellido, nacionalidad))
-        id_nuevo_artista = cur.fetchone()[0]
+            query_artista = """
+                INSERT INTO artistas (datos_artista) 
+                VALUES ((%s, %s, %s)) RETURNING id_artista;
+            """
+            cur.execute(query_artista, (nombre, apellido, nacionalidad))
+            id_nuevo_artista = cur.fetchone()[0]
 
-        query_disco = """
-            INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) 
-            VALUES (%s, %s, %s, %s);
-        """
+            query_disco = """
+                INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) 
+                VALUES (%s, %s, %s, %s);
+            """
 
-        cur.execute(query_disco, (titulo, anio, generos, [id_nuevo_artista]))
+            cur.execute(query_disco, (titulo, anio, generos, [id_nuevo_artista]))
 
-        conn.commit()
-        cur.close()
-        return True
+            conn.commit()
+            cur.close()
+            notificar_commit("artistas", "discos")
+            return True
         
     except (Exception, psycopg2.DatabaseError) as error:
+        # Al salir del 'with' la conexión vuelve al pool y se deshace lo pendiente
         print(f"ERROR EN TRANSACCIÓN: {error}. Ejecutando ROLLBACK...")
-        if conn:
-            conn.rollback()
         return False
+
+@medido
+def insertar_artistas_y_discos(registros, tam_lote=TAM_LOTE_POR_DEFECTO):
+    """ 
+    Inserta muchos artistas, cada uno con su disco, en una sola transacción atómica.
+    
+    Los IDs de los artistas se reservan de antemano con nextval, de modo que cada
+    disco sabe qué ID poner en 'artistas_ids' sin depender del orden de RETURNING.
+    Después se insertan artistas y discos con INSERT multi-fila de 'tam_lote' registros.
+    Si cualquier lote falla se deshace todo (ROLLBACK).
+    
+    Args:
+        registros (list): Tuplas (nombre, apellido, nacionalidad, titulo, anio, generos),
+            en el mismo orden que los argumentos de 'insertar_artista_y_disco'.
+        tam_lote (int): Número de registros por sentencia INSERT.
         
-    finally:
-        if conn:
-            conn.close()
+    Returns:
+        bool: True si la transacción se guardó (COMMIT), False si falló (ROLLBACK).
+    """
+    registros = list(registros)
+    if not registros:
+        return True
+
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+
+            for inicio in range(0, len(registros), tam_lote):
+                lote = registros[inicio:inicio + tam_lote]
+
+                cur.execute(
+                    "SELECT nextval(pg_get_serial_sequence('artistas', 'id_artista')) FROM generate_series(1, %s);",
+                    (len(lote),)
+                )
+                ids = [fila[0] for fila in cur.fetchall()]
+
+                execute_values(
+                    cur,
+                    "INSERT INTO artistas (id_artista, datos_artista) VALUES %s;",
+                    [(id_artista, r[0], r[1], r[2]) for id_artista, r in zip(ids, lote)],
+                    template="(%s, ROW(%s, %s, %s))",
+                    page_size=tam_lote
+                )
+                execute_values(
+                    cur,
+                    "INSERT INTO discos (titulo, anio_lanzamiento, generos, artistas_ids) VALUES %s;",
+                    [(r[3], r[4], list(r[5]), [id_artista]) for id_artista, r in zip(ids, lote)],
+                    template="(%s, %s, %s::TEXT[], %s::INTEGER[])",
+                    page_size=tam_lote
+                )
+
+            conn.commit()
+            cur.close()
+            notificar_commit("artistas", "discos")
+            return True
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        # Al salir del 'with' la conexión vuelve al pool y se deshacen todos los lotes
+        print(f"ERROR EN TRANSACCIÓN POR LOTES: {error}. Ejecutando ROLLBACK...")
+        return False
+
+def registrar_venta(cliente, fecha, ids_discos):
+    """ 
+    Registra una venta nueva.
+    
+    Args:
+        cliente (str): Nombre del cliente.
+        fecha (date|str): Fecha de la venta (None para la fecha actual).
+        ids_discos (list): IDs de los discos comprados.
+        
+    Returns:
+        int: ID de la venta creada, o None si hubo ROLLBACK.
+    """
+    ids = registrar_ventas([(cliente, fecha, ids_discos)])
+    return ids[0] if ids else None
 
+@medido
+def registrar_ventas(ventas, tam_lote=TAM_LOTE_POR_DEFECTO):
+    """ 
+    Registra muchas ventas en una sola transacción (un único COMMIT).
+    
+    Como en 'insertar_artistas_y_discos', los IDs se reservan antes con nextval y se
+    insertan explícitamente, así cada venta sabe su ID sin depender del orden de
+    RETURNING en un INSERT multi-fila.
+    
+    Args:
+        ventas (list): Tuplas (cliente, fecha, ids_discos), como en 'registrar_venta'.
+        tam_lote (int): Número de ventas por sentencia INSERT.
+        
+    Returns:
+        list: IDs de las ventas en el mismo orden, o lista vacía si hubo ROLLBACK.
+    """
+    ventas = list(ventas)
+    if not ventas:
+        return []
+
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(
+                "SELECT nextval(pg_get_serial_sequence('ventas', 'id_venta')) FROM generate_series(1, %s);",
+                (len(ventas),)
+            )
+            ids = [fila[0] for fila in cur.fetchall()]
+
+            execute_values(
+                cur,
+                "INSERT INTO ventas (id_venta, detalles_venta) VALUES %s;",
+                [(id_venta, v[0], v[1], list(v[2])) for id_venta, v in zip(ids, ventas)],
+                template="(%s, ROW(%s, coalesce(%s::DATE, current_date), %s::INTEGER[]))",
+                page_size=tam_lote
+            )
+
+            conn.commit()
+            cur.close()
+            notificar_commit("ventas")
+            return ids
+
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"❌ Error al registrar ventas: {error}")
+        return []
+
+@medido
 def rollback_duplicado():
     """ 
     Fuerza un error de clave duplicada para demostrar el ROLLBACK.
@@ -61,74 +215,165 @@ def rollback_duplicado():
     Returns:
         str: Resultado de la prueba.
     """
-    conn = get_connection()
     try:
-        cur = conn.cursor()
+        with conexion() as conn:
+            cur = conn.cursor()
         
-        # Este insert es válido y se queda en espera del commit
-        print("Insertando artista 'Fantasma'...")
-        cur.execute(
-            "INSERT INTO artistas (datos_artista) VALUES ((%s, %s, %s));",
-            ('Artista', 'Fantasma', 'Probablemente Colombiano')
-        )
+            # Este insert es válido y se queda en espera del commit
+            print("Insertando artista 'Fantasma'...")
+            cur.execute(
+                "INSERT INTO artistas (datos_artista) VALUES ((%s, %s, %s));",
+                ('Artista', 'Fantasma', 'Probablemente Colombiano')
+            )
         
-        # Forzamos el error: Intentamos insertar manualmente el ID 1, que ya está ocupado
-        print("Forzando error: Intentando duplicar el ID 1...")
-        cur.execute(
-            "INSERT INTO artistas (id_artista, datos_artista) VALUES (1, (%s, %s, %s));",
-            ('Error', 'Duplicado', 'N/A')
-        )
+            # Forzamos el error: Intentamos insertar manualmente el ID 1, que ya está ocupado
+            print("Forzando error: Intentando duplicar el ID 1...")
+            cur.execute(
+                "INSERT INTO artistas (id_artista, datos_artista) VALUES (1, (%s, %s, %s));",
+                ('Error', 'Duplicado', 'N/A')
+            )
         
-        conn.commit()
-        return "Error: La base de datos permitió un ID duplicado."
+            conn.commit()
+            return "Error: La base de datos permitió un ID duplicado."
         
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"¡VIOLACIÓN DE CLAVE PRIMARIA!: {error}")
-        # Al fallar aquí, el artista 'Fantasma' del Paso 1 se borra de la memoria
-        if conn:
-            conn.rollback()
-
+        # Al fallar aquí, la conexión vuelve al pool con ROLLBACK y el artista 'Fantasma' del Paso 1 se descarta
         return "ROLLBACK EXITOSO: El 'Artista Fantasma' no se guardó."
-        
-    finally:
-        if conn:
-            conn.close()
 
-def actualizar_discos_venta(id_venta, nuevos_ids_discos):
+@medido
+def actualizar_discos_venta(id_venta, nuevos_ids_discos, version=None):
     """ 
     Actualiza la lista de canciones (array de IDs) de un pedido existente.
     
     Args:
         id_venta (int): ID del pedido a modificar.
         nuevos_ids_discos (list): Nueva lista de IDs de discos.
+        version (int): Versión del pedido leída antes de editarlo. Si se indica y otro
+            usuario lo ha modificado entretanto, no se cambia nada (bloqueo optimista).
         
     Returns:
         bool: True si se realizó el COMMIT, False si hubo ROLLBACK.
     """
-    conn = get_connection()
     try:
-        cur = conn.cursor()
-        query = """
-            UPDATE ventas 
-            SET detalles_venta.discos_comprados = %s 
-            WHERE id_venta = %s;
-        """
-        cur.execute(query, (nuevos_ids_discos, id_venta))
-        
-        if cur.rowcount == 0:
-            conn.rollback()
-            return False
-
-        conn.commit()
-        cur.close()
-        return True
+        with conexion() as conn:
+            cur = conn.cursor()
+            query = """
+                UPDATE ventas 
+                SET detalles_venta.discos_comprados = %s, version = version + 1
+                WHERE id_venta = %s
+            """
+            params = [nuevos_ids_discos, id_venta]
+            if version is not None:
+                query += " AND version = %s"
+                params.append(version)
+            cur.execute(query, params)
+        
+            if cur.rowcount == 0:
+                if version is not None:
+                    print(f"⚠️  La venta {id_venta} no existe o la ha modificado otro usuario.")
+                conn.rollback()
+                return False
+
+            conn.commit()
+            cur.close()
+            notificar_commit("ventas")
+            return True
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"❌ Error en la actualización de discos: {error}")
-        if conn: conn.rollback()
         return False
-    finally:
-        if conn: conn.close()
 
+@medido
+def editar_ventas(ediciones):
+    """ 
+    Aplica muchas ediciones de pedidos en una sola sentencia UPDATE.
+    
+    Cada edición quita discos del pedido (todas sus apariciones, como array_remove)
+    y añade otros al final (como array_append). Las ediciones viajan como arrays
+    paralelos que se desanidan con unnest, y el nuevo array se calcula en el SET a
+    partir de la fila vigente: si otra transacción confirmó un cambio mientras
+    tanto, PostgreSQL reevalúa la fila y ningún cambio se pierde.
+    
+    Con 'version' la edición solo se aplica si el pedido sigue en esa versión, sin
+    mantener bloqueos mientras el usuario decide. PostgreSQL sigue escribiendo una
+    versión nueva de la fila entera en cada UPDATE (MVCC): el ahorro está en las
+    idas y vueltas y en no reenviar el array completo.
+    
+    Args:
+        ediciones (list): Tuplas (id_venta, ids_a_anadir, ids_a_quitar) o
+            (id_venta, ids_a_anadir, ids_a_quitar, version). Las ediciones de un
+            mismo pedido se aplican en el orden de la lista y se comprueba la
+            primera versión indicada.
+        
+    Returns:
+        list: IDs de las ventas modificadas (las que faltan no existen o cambiaron
+            de versión). Lista vacía si hubo un error.
+    """
+    # Las ediciones de cada pedido se combinan en una sola, en orden: lo que quita una
+    # edición también se lleva lo que añadieron las anteriores a ella
+    pedidos = {}
+    for edicion in ediciones:
+        id_venta, a_anadir, a_quitar = edicion[:3]
+        pedido = pedidos.setdefault(id_venta, {"anadir": [], "quitar": set(), "version": None})
+        quitar = set(a_quitar)
+        pedido["anadir"] = [x for x in pedido["anadir"] if x not in quitar] + list(a_anadir)
+        pedido["quitar"] |= quitar
+        if pedido["version"] is None and len(edicion) > 3:
+            pedido["version"] = edicion[3]
+
+    ventas, discos, anadir, orden = [], [], [], []
+    for id_venta, pedido in pedidos.items():
+        for id_disco in pedido["quitar"]:
+            ventas.append(id_venta); discos.append(id_disco); anadir.append(False); orden.append(len(orden))
+        for id_disco in pedido["anadir"]:
+            ventas.append(id_venta); discos.append(id_disco); anadir.append(True); orden.append(len(orden))
+    if not ventas:
+        return []
+
+    query = """
+        UPDATE ventas v
+        SET detalles_venta.discos_comprados = ARRAY(
+                SELECT x FROM unnest((v.detalles_venta).discos_comprados) WITH ORDINALITY AS u(x, n)
+                WHERE x IS NULL OR x <> ALL(e.quitar)
+                ORDER BY n
+            ) || e.anadir,
+            version = v.version + 1
+        FROM (
+            SELECT c.id_venta,
+                coalesce(array_agg(c.id_disco ORDER BY c.orden) FILTER (WHERE c.anadir), '{}') AS anadir,
+                coalesce(array_agg(c.id_disco) FILTER (WHERE NOT c.anadir), '{}') AS quitar
+            FROM unnest(%s::INTEGER[], %s::INTEGER[], %s::BOOLEAN[], %s::INTEGER[]) AS c(id_venta, id_disco, anadir, orden)
+            GROUP BY c.id_venta
+        ) e
+        LEFT JOIN unnest(%s::INTEGER[], %s::INTEGER[]) AS esperada(id_venta, version) ON esperada.id_venta = e.id_venta
+        WHERE v.id_venta = e.id_venta
+          AND (esperada.version IS NULL OR v.version = esperada.version)
+        RETURNING v.id_venta;
+    """
+    try:
+        with conexion() as conn:
+            cur = conn.cursor()
+            cur.execute(query, (ventas, discos, anadir, orden,
+                                list(pedidos), [p["version"] for p in pedidos.values()]))
+            modificadas = sorted(fila[0] for fila in cur.fetchall())
+            conn.commit()
+            cur.close()
+            if modificadas:
+                notificar_commit("ventas")
+            return modificadas
+    except (Exception, psycopg2.DatabaseError) as error:
+        print(f"❌ Error en la edición de pedidos: {error}")
+        return []
+
+def anadir_discos_venta(id_venta, ids_discos, version=None):
+    """ Añade discos al final de un pedido sin reenviar el resto. Devuelve True si se modificó. """
+    return editar_ventas([(id_venta, ids_discos, (), version)]) == [id_venta]
+
+def quitar_discos_venta(id_venta, ids_discos, version=None):
+    """ Quita de un pedido todas las apariciones de esos discos. Devuelve True si se modificó. """
+    return editar_ventas([(id_venta, (), ids_discos, version)]) == [id_venta]
+
+@medido
 def eliminar_venta(id_venta):
     """ 
     Elimina un pedido de la base de datos de forma atómica.
@@ -139,30 +384,26 @@ def eliminar_venta(id_venta):
     Returns:
         bool: True si la eliminación fue exitosa, False en caso contrario.
     """
-    conn = get_connection()
     try:
-        cur = conn.cursor()
+        with conexion() as conn:
+            cur = conn.cursor()
         
-        query = "DELETE FROM ventas WHERE id_venta = %s;"
-        cur.execute(query, (id_venta,))
+            query = "DELETE FROM ventas WHERE id_venta = %s;"
+            cur.execute(query, (id_venta,))
         
-        if cur.rowcount == 0:
-            print(f"⚠️  No existe la venta con ID {id_venta}.")
-            conn.rollback()
-            return False
+            if cur.rowcount == 0:
+                print(f"⚠️  No existe la venta con ID {id_venta}.")
+                conn.rollback()
+                return False
 
-        conn.commit()
-        cur.close()
-        return True
+            conn.commit()
+            cur.close()
+            notificar_commit("ventas")
+            return True
         
     except (Exception, psycopg2.DatabaseError) as error:
         print(f"❌ Error al eliminar: {error}")
-        if conn:
-            conn.rollback()
         return False
-    finally:
-        if conn:
-            conn.close()
 
 if __name__ == "__main__":
     print("--- TRANSACCIÓN EXITOSA: MICROTDH ---")